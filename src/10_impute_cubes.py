@@ -0,0 +1,38 @@
+# %% Imports
+import rioxarray
+
+from functions.cube_utils import na_seadec_cube, open_cube, write_cube
+
+# %% Define the paths to get and save the cubes
+data_path = "data/processed/{}_ndvi_temperature.nc"
+save_path = "data/processed/{}_ndvi_temperature_filled.nc"
+
+# %% Define the keys to get the cubes and the variables to interpolate
+lagoons = ["mallorquin", "totumo", "virgen"]
+variables = ["NDVI", "Surface Temperature"]
+
+# Size of the spatial chunks processed in parallel
+chunks = {"latitude": 128, "longitude": 128}
+
+# %% For loop throught the lagoons to interpolate their cubes
+for lagoon in lagoons:
+    # Open the NetCDF data lazily
+    data = open_cube(data_path.format(lagoon))
+
+    # Resample to monthly data to get a regular time series in every pixel
+    data = data[variables].resample(time="MS").mean()
+
+    # Interpolate the NaN values of every pixel with na_seadec
+    for variable in variables:
+        data[variable] = na_seadec_cube(data[variable], chunks=chunks)
+
+    # Define the CRS and the spatial dims to save it
+    data = data.rio.write_crs("EPSG:4326")
+    data = data.rio.set_spatial_dims(x_dim="longitude", y_dim="latitude")
+
+    # Define some attributes
+    data.attrs["description"] = "NDVI and Surface Temperature interpolated by pixel with na_seadec"
+    data.attrs["Surface Temperature units"] = "°C"
+
+    # Compute and save data as a chunked and compressed NetCDF file
+    write_cube(data, save_path.format(lagoon))
@@ -0,0 +1,57 @@
+# %% Imports
+import numpy as np
+import pandas as pd
+
+import xarray
+import rioxarray
+
+from functions.cube_utils import lagged_correlation_map, open_cube
+from functions.storage import read_table
+
+# %% Define the paths
+data_path = "data/processed/hydrological_spectral_mean_data"
+cube_path = "data/processed/{}_ndvi_temperature_filled.nc"
+save_path = "data/processed/{}_ndvi_correlation_maps.nc"
+
+# %% Define the keys to iterate and the parameters
+lagoons = ["mallorquin", "totumo", "virgen"]
+nlags = 24                                  # Lags to evaluate
+
+# Size of the spatial chunks processed in parallel
+chunks = {"latitude": 128, "longitude": 128}
+
+# %% For loop throught the lagoons to correlate their NDVI pixels with
+# the drivers
+for lagoon in lagoons:
+    # Read the drivers of the lagoon, if the lagoon isn't Mallorquín, we
+    # don't have Discharge
+    subset = read_table(data_path, [lagoon]).set_index("Time")
+
+    if lagoon == "mallorquin":
+        drivers = subset[["Precipitation", "Discharge"]]
+    else:
+        drivers = subset[["Precipitation"]]
+
+    # Read the NDVI interpolated by pixel, resample it to month end to match
+    # the time of the drivers and subset the same time span
+    ndvi = open_cube(cube_path.format(lagoon))["NDVI"]
+    ndvi = ndvi.resample(time="M").mean()
+    ndvi = ndvi.sel(time=drivers.index)
+
+    # Correlate every pixel with every driver
+    maps = []
+    for driver in drivers.columns:
+        m = lagged_correlation_map(ndvi, drivers[driver], nlags=nlags, chunks=chunks)
+        maps.append(m.rename({v: f"{driver} {v}" for v in m.data_vars}))
+
+    maps = xarray.merge(maps)
+
+    # Define the CRS and the spatial dims to save it
+    maps = maps.rio.write_crs("EPSG:4326")
+    maps = maps.rio.set_spatial_dims(x_dim="longitude", y_dim="latitude")
+
+    # Define some attributes
+    maps.attrs["description"] = f"Lag of the maximum correlation between the detrended NDVI by pixel and the drivers, from 0 to {nlags} months"
+
+    # Compute and save the maps as a NetCDF file
+    maps.to_netcdf(save_path.format(lagoon))
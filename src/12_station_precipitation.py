@@ -0,0 +1,86 @@
+# %% Imports
+import os
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+from functions.ideam import read_ideam_stations
+from functions.stations import station_weights, weighted_series
+from functions.stat_utils import na_seadec_batch
+from functions.storage import write_table
+
+# %% Define the time limits and the data paths
+t0 = np.datetime64("2001-01-01")
+tf = np.datetime64("2022-01-01")
+
+stations_path = "appendix/gauge_stations/stations_of_interest.shp"
+series_path = "data/raw/stations/{}.csv"
+forests_path = "data/shapefile/mangrove_forests.shp"
+cache_dir = "data/processed/cache"
+save_path = "data/processed/station_precipitation"
+
+# %% Define the parameters
+method = "idw"          # Weights of the stations, IDW or Area (Thiessen)
+min_valid = 0.5         # Minimum fraction of months with data of a station
+
+# %% Read the stations selected by A3_select_stations.py and the forests
+stations = gpd.read_file(stations_path)
+stations["CODIGO"] = stations.CODIGO.astype(str)
+
+forests = gpd.read_file(forests_path).to_crs(stations.crs)
+forests = forests.set_index("key").geometry
+
+# Keep the stations with their series downloaded in the stations folder,
+# one CSV by station named with its code
+available = stations.CODIGO.map(lambda code: os.path.isfile(series_path.format(code)))
+
+for code in stations.CODIGO[~available].unique():
+    print(f"{code}: there isn't series in {series_path.format(code)}")
+
+stations = stations[available]
+
+# %% Read all series in parallel as monthly mean precipitation, like the
+# Precipitation of 4_make_dataframes.py, so the months with missing days
+# aren't underestimated
+codes = stations.CODIGO.unique()
+data = read_ideam_stations(
+    {code: series_path.format(code) for code in codes}, how="mean", cache_dir=cache_dir
+)
+
+# Keep the months of the timespan, also the months without data
+time = pd.date_range(t0, tf, freq=pd.offsets.MonthEnd(), inclusive="left")
+data = data.reindex(time)
+data.index.name = "Time"
+
+# Drop the stations without enough data in the timespan
+valid = data.notna().mean() >= min_valid
+print(f"{valid.sum()} of {len(valid)} stations with at least {min_valid:.0%} of data")
+
+data = data.loc[:, valid]
+stations = stations[stations.CODIGO.isin(data.columns)]
+
+# %% Interpolate the NaN values of all stations at once with na_seadec
+data = na_seadec_batch(data)
+
+# %% Weighted mean precipitation of the stations of every forest
+weights = station_weights(stations, forests, method=method)
+precipitation = weighted_series(data, weights)
+
+# Convert to a long dataframe with the number of stations by lagoon
+precipitation = precipitation.melt(
+    var_name="Lagoon", value_name="Precipitation", ignore_index=False
+).reset_index()
+
+counts = (weights > 0).sum()
+precipitation["Stations"] = precipitation.Lagoon.map(counts)
+
+# Drop the lagoons without stations
+precipitation = precipitation[precipitation.Stations > 0]
+precipitation = precipitation.sort_values(["Lagoon", "Time"]).reset_index(drop=True)
+
+# %% View final dataframe
+print(precipitation)
+
+# %% Save final dataframe partitioned by lagoon, and as CSV
+write_table(precipitation, save_path)
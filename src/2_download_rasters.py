@@ -2,8 +2,10 @@
 import ee
 import geemap
 
-from statgis.landsat_functions import landsat_scaler, landsat_cloud_mask
-from functions.gee_processing import renamer7, renamer8, calc_ndvi
+from functions.gee_processing import (
+    landsat_processor, monthly_composites, stack_composites, USED_BANDS
+)
+from functions.gee_export import export_images, is_valid_raster, split_stack
 
 ee.Initialize()
 
@@ -18,56 +20,72 @@ forests = ee.FeatureCollection("projects/ee-sebnarvaez-mangroves/assets/forests"
 # %% Define the keys to iterate the forests
 keys = ["mallorquin", "totumo", "virgen"]
 
-# %% Iterate the forests to download image by forests and date
+# %% Define the bands to export and the years of the composites
+# Only the Surface Temperature and the NDVI are used by the analysis. Use
+# ALL_BANDS to also export the blue, green, red, NIR and SWIR1 bands, so
+# 3_process_rasters.py could calculate other indices, or add the indices to
+# calculate them in Earth Engine, e.g. USED_BANDS + ["EVI", "NDMI"]
+bands = USED_BANDS
+years = range(1996, 2022)
+
+# %% Define the export parameters
+manifest_path = "data/raster/manifest.json"     # Status of the exports
+stack_path = "data/raster/stacks/{}_{}.tif"     # Temporal yearly stacks
+image_path = "data/raster/{}/{:04d}-{:02d}-01.tif"
+max_workers = 4                                 # Concurrent exports
+retries = 3                                     # Retries by stack
+
+# %% Define the function to export the stack of one year of one forest
+def export_stack(task: tuple[ee.Image, ee.Geometry, list[str]], filename: str) -> None:
+    img, roi, filenames = task
+
+    # Download the stack with the 12 monthly composites
+    geemap.ee_export_image(
+        img, filename=filename, scale=30, region=roi, unmask_value=-3e5
+    )
+
+    # Split the stack into one image by month, with the names of the bands
+    split_stack(filename, filenames, names=bands)
+
+# %% Iterate the forests to define the stacks by forests and year
+# Dictionary with the path of the stack as key and the stack, the
+# forest and the path of the monthly images as value
+tasks = {}
+
 for key in keys:
     # Extract the forest of interest
     roi = forests.filter(ee.Filter.eq("key", key)).first().geometry()
     
     # Filter images that intersect with the forest and interest and
-    # scale them, mask their clouds, rename their bands and calculate their NDVI
-    l5 = L5.filterBounds(roi).map(landsat_scaler).map(landsat_cloud_mask).map(renamer7).map(calc_ndvi)
-    l7 = L7.filterBounds(roi).map(landsat_scaler).map(landsat_cloud_mask).map(renamer7).map(calc_ndvi)
-    l8 = L8.filterBounds(roi).map(landsat_scaler).map(landsat_cloud_mask).map(renamer8).map(calc_ndvi)
-
-    # For loop to iterate throught years
-    for i in range(1996, 2022):
-        # For loop to iterate throught months
-        for j in range(1, 13):
-            # If the image is from before 1999 use Landsat 5, filter them by the
-            # year and the month, calculate the mean and set the date
-            if i < 1999:
-                img = (
-                    l5.filter(ee.Filter.calendarRange(i, i, "year"))
-                      .filter(ee.Filter.calendarRange(j, j, "month"))
-                      .mean()
-                      .set("date", f"01-{j:02d}-{i:04d}")
-                )
-            
-            # If the images are from 1999 to 2014 use Landsat 7 and perform the
-            # same process
-            elif i < 2014:
-                img = (
-                    l7.filter(ee.Filter.calendarRange(i, i, "year"))
-                      .filter(ee.Filter.calendarRange(j, j, "month"))
-                      .mean()
-                      .set("date", f"01-{j:02d}-{i:04d}")
-                )
-
-            # If the images are from after 2014 use Landsat 8 and perform the
-            # same process
-            else:
-                img = (
-                    l8.filter(ee.Filter.calendarRange(i, i, "year"))
-                      .filter(ee.Filter.calendarRange(j, j, "month"))
-                      .mean()
-                      .set("date", f"01-{j:02d}-{i:04d}")
-                )
-
-            # Define the save path of the image
-            filename = f"data/raster/{key}/{i:04d}-{j:02d}-01.tif"
-
-            # Report and save the image
-            print(f"{key}: image {j:02d}-{i:04d}")
-            geemap.ee_export_image(
-                img, filename=filename, scale=30, region=roi, unmask_value=-3e5
-            )
\ No newline at end of file
+    # scale them, mask their clouds, select their bands and calculate their
+    # NDVI in one mapped step
+    l5 = L5.filterBounds(roi).map(landsat_processor("L5", bands))
+    l7 = L7.filterBounds(roi).map(landsat_processor("L7", bands))
+    l8 = L8.filterBounds(roi).map(landsat_processor("L8", bands))
+
+    # Each collection only have the years of its sensor (Landsat 5 before
+    # 1999, Landsat 7 from 1999 to 2013 and Landsat 8 after 2013), so
+    # merge them and calculate all the monthly means in one pass
+    composites = monthly_composites(
+        l5.merge(l7).merge(l8), f"{years[0]}-01-01", f"{years[-1] + 1}-01-01", bands
+    )
+
+    # Stack the composites by year to download 12 months in one request
+    for i in years:
+        stack = stack_composites(composites.filter(ee.Filter.calendarRange(i, i, "year")))
+        filenames = [image_path.format(key, i, j) for j in range(1, 13)]
+
+        tasks[stack_path.format(key, i)] = (stack, roi, filenames)
+
+# %% Export the stacks concurrently, skipping the years already downloaded
+# and retrying the failed ones. If the run is interrupted, run this cell again
+manifest = export_images(
+    tasks,
+    export_stack,
+    manifest_path,
+    max_workers=max_workers,
+    retries=retries,
+    validator=lambda filename: all(
+        is_valid_raster(f, names=bands) for f in tasks[filename][2]
+    ),
+)
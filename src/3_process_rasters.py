@@ -4,65 +4,139 @@ import numpy as np
 
 import xarray
 import rioxarray
-import rasterio
+import geopandas as gpd
+
+from functions.raster_processing import read_window_cube, band_names
+from functions.cube_utils import (
+    write_cube, append_cube, cube_times, cube_variables, open_cube, zone_masks
+)
+from functions.quality import quality_index, write_quality_index
+from functions.spectral_indices import spectral_indices, index_bands
 
 # %% Define the paths to get and save the images
 path = "data/raster/{}/"
 save_path = "data/processed/{}_{}"
+forests_path = "data/shapefile/mangrove_forests.shp"
+
+# %% Define the reading parameters
+nodata = -3e5                               # Unmask value of the exports
+max_workers = 8                             # Images decoded at the same time
+dtype = "int16"                             # Type to save the cubes, float32 or int16
+
+# Extra spectral indices to add to the cubes, e.g. ["EVI", "NDWI"]. They are
+# read from the images exported with them, else they are calculated with the
+# reflectance bands of the images exported with those bands (see bands in
+# 2_download_rasters.py). The cubes saved without them must be removed to
+# rebuild them
+indices = []
 
 # %% Define the keys to get the images
 lagoons = ["mallorquin", "totumo", "virgen"]
 
+# %% Read the bounds of the forests in the CRS of the images
+forests = gpd.read_file(forests_path).to_crs("EPSG:4326").set_index("key")
+
 # %% For loop throught the keys to get the images
 for lagoon in lagoons:
     path_images = path.format(lagoon)       # Define the path of the images
-    images = os.listdir(path_images)        # Search all images in the earlier defined path
 
-    # For loop throught the images
-    for image in images:
-        path_image = path_images + image    # Define the image path
+    save_file = save_path.format(lagoon, "ndvi_temperature.nc")
+    quality_file = save_path.format(lagoon, "quality.nc")
+
+    # Check that the cube saved before has the same variables, before read
+    # the new images, the new indices need to rebuild it
+    variables = ["NDVI", "Surface Temperature"] + indices
+    if os.path.isfile(save_file) and set(cube_variables(save_file)) != set(variables):
+        raise ValueError(
+            f"{save_file} has the variables {cube_variables(save_file)} instead of "
+            f"{variables}, remove it to rebuild it with these variables"
+        )
+
+    # Forest of the lagoon to calculate the quality index of the images
+    roi = forests.loc[[lagoon]].geometry
+
+    # Calculate the quality index of the cubes saved before the index
+    # existed, only once
+    if os.path.isfile(save_file) and not os.path.isfile(quality_file):
+        # Close the cube before append the new images to it
+        with open_cube(save_file) as cube:
+            mask = zone_masks(cube, roi, all_touched=False).sel(zone=lagoon)
+            write_quality_index(quality_index(cube, mask), quality_file)
+
+    # Search all images in the earlier defined path sorted by date
+    images = sorted(f for f in os.listdir(path_images) if f.endswith(".tif"))
+
+    # If the cube already exists, only process the images that aren't in it
+    if os.path.isfile(save_file):
+        processed = cube_times(save_file)
+        images = [
+            image for image in images
+            if not np.isin(np.datetime64(image[:-4], "ns"), processed)
+        ]
+
+        if len(images) == 0:
+            print(f"{lagoon}: the cube is up to date")
+            continue
+
+        print(f"{lagoon}: appending {len(images)} new images")
+
+    # Read the indices exported with the images and calculate the rest with
+    # their reflectance bands
+    names = band_names(path_images + images[0])
+    exported = [index for index in indices if index in names]
+    calculated = [index for index in indices if index not in names]
+
+    missing = [band for band in index_bands(calculated) if band not in names]
+    if missing:
+        raise ValueError(
+            f"the images of {lagoon} haven't the indices {calculated} or the bands "
+            f"{missing} to calculate them, export them with 2_download_rasters.py"
+        )
+
+    # Read the Surface Temperature and the NDVI of the window of the forest
+    # of all images into float32 (time, lat, lon) cubes, the bands are found
+    # by name so the images could have all the bands or only these two.
+    # While the images are decoded, the temperature is scaled from Kelvin to
+    # Celsius, the value chosen to nan (-300000) is masked, and the
+    # temperatures lower than 10°C and the NDVI outliers are masked
+    cubes, lims = read_window_cube(
+        [path_images + image for image in images],
+        ["TEMPERATURE", "NDVI"] + exported + index_bands(calculated),
+        bounds=forests.loc[lagoon].geometry.bounds,
+        nodata=nodata,
+        offsets={"TEMPERATURE": -273.15},
+        valid_ranges={
+            "TEMPERATURE": (10.0, None),
+            **{index: (-1.5, 1.5) for index in ["NDVI"] + exported},
+        },
+        max_workers=max_workers,
+    )
+    temp = cubes["TEMPERATURE"]
+    ndvi = cubes["NDVI"]
 
-        # Open the image with rasterio
-        with rasterio.open(path_image, "r") as src:
-            # Get the limits of the images to define the coordinates
-            lims = src.bounds
+    # Calculate the other indices with the reflectance of the images, with
+    # the same expressions used in Earth Engine, and mask their outliers
+    # like in the NDVI
+    extra = spectral_indices(cubes, calculated)
 
-            # If the images if the first of all, define a new array with
-            # the Surface temperature and another with the NDVI
-            if image == images[0]:
-                temp = src.read(5)
-                ndvi = src.read(6)
+    for value in extra.values():
+        value[(value < -1.5) | (value > 1.5)] = np.nan
 
-            # Else, concat the new array to the previously created
-            else:
-                temp = np.dstack([temp, src.read(5)])
-                ndvi = np.dstack([ndvi, src.read(6)])
+    extra.update({index: cubes[index] for index in exported})
+    extra = {index: extra[index] for index in indices}
 
     # With the date in the path of the image define the time dimension
     t = np.array([ti[:-4] for ti in images], dtype="datetime64")
     
-    # With the boinds of the imiages define the longitude and the 
-    # latitude dimensions
-    x = np.linspace(lims[0], lims[2], ndvi.shape[1])
-    y = np.flip(np.linspace(lims[1], lims[3], ndvi.shape[0]))
-
-    # Scale all temperature from Kelvin to Celsius
-    temp -= 273.15
-
-    # Mask NDVI data using the value chosen to nan (-300000) and all
-    # outliers from NDVI
-    ndvi_mask = ((ndvi == -3e5) | (ndvi > 1.5) | (ndvi < -1.5))
-    
-    # Mask temperature based on hide al temperature lowers than 10°C
-    temp_mask = (temp < 10.0)
-
-    ndvi[ndvi_mask] = np.nan
-    temp[temp_mask] = np.nan
+    # With the bounds of the window define the longitude and the latitude
+    # dimensions
+    x = np.linspace(lims[0], lims[2], ndvi.shape[2])
+    y = np.flip(np.linspace(lims[1], lims[3], ndvi.shape[1]))
 
     # Create NDVI DataArray
     ndvi = xarray.DataArray(
         data=ndvi,
-        dims=("latitude", "longitude", "time"),
+        dims=("time", "latitude", "longitude"),
         coords={"longitude": x, "latitude": y, "time": t},
         name="NDVI",
     )
@@ -70,16 +144,26 @@ for lagoon in lagoons:
     # Create Surface Temperature DataArray
     temp = xarray.DataArray(
         data=temp,
-        dims=("latitude", "longitude", "time"),
+        dims=("time", "latitude", "longitude"),
         coords={"longitude": x, "latitude": y, "time": t},
         name="Surface Temperature",
     )
 
+    # Create the DataArrays of the extra indices
+    extra = [
+        xarray.DataArray(
+            data=value,
+            dims=("time", "latitude", "longitude"),
+            coords={"longitude": x, "latitude": y, "time": t},
+            name=index,
+        )
+        for index, value in extra.items()
+    ]
+
     # Merge NDVI and Temperature DataArrays to save on one Dataset
-    data = xarray.merge([ndvi, temp])
+    data = xarray.merge([ndvi, temp] + extra)
 
-    # Transpose and define the CRS and the spatial dims to save it
-    data = data.transpose("time", "latitude", "longitude")
+    # Define the CRS and the spatial dims to save it
     data = data.rio.write_crs("EPSG:4326")
     data = data.rio.set_spatial_dims(x_dim="longitude", y_dim="latitude")
 
@@ -87,5 +171,16 @@ for lagoon in lagoons:
     data.attrs["description"] = "NDVI and Surface Temperature extracted from LANDSAT SR images from 1996 to 2021"
     data.attrs["Surface Temperature units"] = "°C"
 
-    # Save data as a NetCDF file
-    data.to_netcdf(save_path.format(lagoon, "ndvi_temperature.nc"))
+    # Append the new images to the cube (with its type) or save data as a
+    # chunked and compressed NetCDF file packed in int16
+    if os.path.isfile(save_file):
+        append_cube(data, save_file)
+    else:
+        write_cube(data, save_file, dtype=dtype)
+
+    # Calculate the valid pixels inside the forest by image and by pixel,
+    # the cloud fraction and the sensor of the new images, with the same
+    # mask used by 4_make_dataframes.py, and add them to the quality index
+    # of the lagoon once they are in the cube
+    mask = zone_masks(data, roi, all_touched=False).sel(zone=lagoon)
+    write_quality_index(quality_index(data, mask), quality_file)
@@ -1,4 +1,6 @@
 # %% Imports
+import os
+
 import numpy as np
 import pandas as pd
 import geopandas as gpd
@@ -6,7 +8,11 @@ import geopandas as gpd
 import xarray
 import rioxarray
 
-from functions.stat_utils import na_seadec
+from functions.stat_utils import na_seadec_batch, set_decomposition_cache
+from functions.cube_utils import open_cube, zone_masks, cached_zonal_statistics
+from functions.storage import read_table, write_table
+from functions.ideam import read_ideam_series
+from functions.quality import read_quality_index, MIN_COVERAGE
 
 # %% Define the time limits and the data paths
 t0 = np.datetime64("2001-01-01")
@@ -15,52 +21,81 @@ tf = np.datetime64("2022-01-01")
 meteorological_path = "data/raw/{}_raw_data.csv"
 discharge_path = "data/raw/magdalena_river_discharge_data.csv"
 spectral_path = "data/processed/{}_ndvi_temperature.nc"
+quality_path = "data/processed/{}_quality.nc"
 forests_path = "data/shapefile/mangrove_forests.shp"
 soi_path = "data/processed/simple_soi.csv"
+save_path = "data/processed/hydrological_spectral_mean_data"
+cache_dir = "data/processed/cache"
+stations_path = "data/processed/station_precipitation"
+decompositions_path = "data/processed/cache/decompositions"
+
+# Save the decompositions of na_seadec on disk, so they are reused by the
+# next runs
+set_decomposition_cache(cache_dir=decompositions_path)
 
 # %% Define the key to iterate raw and processed data
 lagoons = ["mallorquin", "totumo", "virgen"]
 cities = ["barranquilla", "totumo", "cartagena"]
 
-# %% Read total precipitation and mean discharge
-hydro_data = []
+# %% Read total precipitation
+precipitation = []
 
 # For loop to iterate throught cities and lagoons to load the precipitation data
 for city, lagoon in zip(cities, lagoons):
-    # Load precipitation data, dates are in the 17 column
-    df = pd.read_csv(meteorological_path.format(city), parse_dates=[16], index_col=16)
-    df = df[["Valor"]]                          # Subset the column with the data
-    df = df.resample("m").mean()                # Resample data to monthly mean
+    # Load only the dates and the values of the precipitation data as
+    # monthly mean, cached by the content of the file
+    df = read_ideam_series(
+        meteorological_path.format(city), how="mean", name="Precipitation",
+        cache_dir=cache_dir,
+    ).to_frame()
 
-    df.columns = ["Precipitation"]              # Rename column
-    df.index.name = "Time"                      # Rename index column
     df["Lagoon"] = lagoon                       # Define a new column with the lagoon
 
-    # If there are NaN values in precipitation, interpolate it with na_seadec
-    if df.Precipitation.isna().sum() > 0:
-        df.Precipitation = na_seadec(df.Precipitation) 
+    # Append new data to the list
+    precipitation.append(df)
+
+# Interpolate the NaN values of the precipitation of all cities at once
+# with na_seadec, every lagoon as its own series
+precipitation = na_seadec_batch(
+    pd.concat(precipitation), ["Precipitation"], groupby="Lagoon"
+)
+
+# %% Replace the precipitation of the lagoons with the weighted precipitation
+# of all their stations, if it was calculated with 12_station_precipitation.py
+if os.path.isdir(stations_path):
+    weighted = read_table(stations_path, columns=["Time", "Lagoon", "Precipitation"])
+    weighted = weighted.set_index("Time")
+
+    print(f"Precipitation of {', '.join(weighted.Lagoon.unique())} from {stations_path}")
+
+    precipitation = pd.concat([
+        precipitation[~precipitation.Lagoon.isin(weighted.Lagoon)], weighted
+    ])
 
-    # If the city is Barranquilla we have to load the mean river discharge of
-    # Magdalena river
+# %% Read mean discharge of Magdalena river
+# Load only the dates and the values of the mean discharge data as monthly
+# mean, cached by the content of the file
+discharge = read_ideam_series(
+    discharge_path, how="mean", name="Discharge", cache_dir=cache_dir
+).to_frame()
+
+# If there are NaN values interpolate it with na_seadec
+discharge = na_seadec_batch(discharge, ["Discharge"])
+
+# %% Merge total precipitation and mean discharge
+hydro_data = []
+
+for city, lagoon in zip(cities, lagoons):
+    df = precipitation[precipitation.Lagoon == lagoon]
+
+    # If the city is Barranquilla merge the precipitation with the mean
+    # discharge of Magdalena river
     if city == "barranquilla":
-        # Load mean discharge data, dates are in the column 17
-        df2 = pd.read_csv(discharge_path, parse_dates=[16], index_col=16)
-        df2 = df2[["Valor"]]                # Subset the data
-        df2 = df2.resample("m").mean()      # Resample to monthly mean
-        
-        df2.columns = ["Discharge"]         # Rename column
-        df2.index.name = "Time"             # Rename index column
-        
-        # If there are NaN values interpolate it with na_seadec
-        if df2.Discharge.isna().sum() > 0:
-            df2.Discharge = na_seadec(df2.Discharge)
-
-        # Merge precipitation and discharge data
-        df = df.merge(df2, left_index=True, right_index=True)
+        df = df.merge(discharge, left_index=True, right_index=True)
 
     # Else, define the discharge as NaN
     else:
-        df["Discharge"] = np.nan
+        df = df.assign(Discharge=np.nan)
 
     # Append new data to the list
     hydro_data.append(df)
@@ -78,42 +113,50 @@ forests = gpd.read_file(forests_path)       # Load the forest to clip the images
 
 # For loop throught lagoons to get the NDVI and Temperature data
 for lagoon in lagoons: 
-    # Read the NetCDF data
-    data = xarray.open_dataset(spectral_path.format(lagoon), decode_coords="all")
+    # Open the NetCDF data lazily
+    data = open_cube(spectral_path.format(lagoon))
     
-    # Define the forest of interest to clip the data
-    roi = forests[forests.key == lagoon].geometry
-
-    # Clip the dataset to forest of interest, all touched False implies that only
-    # conserve the pixels completely overlaped by the forest
-    data = data.rio.clip(roi, all_touched=False)
-
-    # Reduce the DataSet to a DataFrame and resample it to monthly mean data
-    # Calculate the mean NDVI, Surface Temperature and the pixel count
+    # Rasterize the forest of interest, all touched False implies that only
+    # conserve the pixels with their center inside the forest
+    roi = forests[forests.key == lagoon].set_index("key").geometry
+    masks = zone_masks(data, roi, all_touched=False)
+
+    # Calculate the mean NDVI and Surface Temperature inside the forest with
+    # one masked reduction by variable, only for the images that aren't in
+    # the statistics of the previous runs
+    stats = cached_zonal_statistics(
+        data, masks, ["NDVI", "Surface Temperature"], cache_dir=cache_dir
+    ).xs(lagoon, level="zone")
+
+    # Look up the count of valid pixels inside the forest in the quality
+    # index saved with the cube
+    quality = read_quality_index(quality_path.format(lagoon))
+
+    # Subset the statistics and resample them to monthly mean data
     df = pd.DataFrame({
-        "NDVI": data["NDVI"].mean(dim=["latitude", "longitude"]).to_series(), 
-        "Temperature": data["Surface Temperature"].mean(dim=["latitude", "longitude"]).to_series(),
-        "Count": data["NDVI"].count(dim=["latitude", "longitude"]).to_series()
+        "NDVI": stats["NDVI mean"], 
+        "Temperature": stats["Surface Temperature mean"],
+        "Count": quality["valid_count"].to_series(),
     }).resample("m").mean()
 
     # Pass the first and second entries because they have NaN
     df = df.iloc[2:,:]
 
-    # Set the NaN values in pixel count to 0 and calculate the pixel percentage
+    # Set the NaN values in pixel count to 0 and calculate the pixel
+    # percentage relative to the month with most valid pixels
     df.Count[df.Count.isna()] = 0
     df["PixelPercentage"] = df.Count/df.Count.max()*100
     df = df.drop("Count", axis=1)           # Then, drop the Count column
 
     # Create a mask that hide al values where the pixel percentegae is lower than
     # 10%
-    mask = df.PixelPercentage < 10.00
+    mask = df.PixelPercentage < MIN_COVERAGE
 
     df["NDVI"][mask] = np.nan
     df["Temperature"][mask] = np.nan
 
-    # Interpolate NaN values in NDVI and Temperature
-    df.NDVI = na_seadec(df.NDVI)
-    df.Temperature = na_seadec(df.Temperature)
+    # Interpolate NaN values in NDVI and Temperature at once
+    df = na_seadec_batch(df, ["NDVI", "Temperature"])
 
     df["Lagoon"] = lagoon                   # Define the Lagoon column
     df.index.name = "Time"                  # Rename index column
@@ -145,5 +188,5 @@ data = data.merge(soi_data, how="left", on="Time")
 # %% View final dataframe
 print(data)
 
-# %% Save final dataframe
-data.to_csv("data/processed/hydrological_spectral_mean_data.csv")
+# %% Save final dataframe partitioned by lagoon, and as CSV
+write_table(data, save_path)
@@ -2,14 +2,12 @@
 import numpy as np
 import pandas as pd
 
-from functions.stat_utils import plot_ts_components, detrend_variables
-
-# %% Imports for plots and define some parameters
-import matplotlib.pyplot as plt
-
-# Load custom style
-plt.style.use("src/style.mplstyle")
+from functions.stat_utils import detrend_variables, set_decomposition_cache
+from functions.plot_utils import plot_ts_components
+from functions.storage import read_table, write_table
+from functions.rendering import render_figures
 
+# %% Define some parameters
 # Define custom titles
 titles = {
     "Precipitation": "Total Precipitation [mm]",
@@ -25,18 +23,34 @@ lagoons = ["mallorquin", "totumo", "virgen"]
 variables = [t for t in titles.keys()]
 
 # %% Define constants
-data_path = "data/processed/hydrological_spectral_mean_data.csv"
-save_path = "data/processed/detrended_hydrological_spectral_mean_data.csv"
+data_path = "data/processed/hydrological_spectral_mean_data"
+save_path = "data/processed/detrended_hydrological_spectral_mean_data"
 save_images_path = "images/{}_{}_time_series_components.{}"
+manifest_path = "data/processed/cache/render_5_detrend_data.json"
+decompositions_path = "data/processed/cache/decompositions"
+
+# Save the decompositions on disk, so they are reused by the next runs
+set_decomposition_cache(cache_dir=decompositions_path)
+
+# %% Detrended data
+# Read the data of all lagoons
+DATA = read_table(data_path, lagoons).reset_index(drop=True)
+
+# Detrend the variables of interest of all lagoons at once, every lagoon as
+# its own series. If the lagoon isn't Mallorquín, it hasn't Discharge and
+# it is kept as NaN. It is done before the plots, so the plots reuse the
+# decompositions of the same series, also in the forked processes
+DAT2 = detrend_variables(DATA, variables, groupby="Lagoon")
 
-# %% Load data
-DATA = pd.read_csv(data_path, parse_dates=[1], index_col=0)
+# Save detrended data partitioned by lagoon, and as CSV
+write_table(DAT2, save_path)
 
-# Plot TS Components
-figs = []
+# %% Plot TS Components
+jobs = {}
 
-for lagoon in lagoons:
-    subset = DATA[DATA.Lagoon == lagoon].copy().set_index("Time", drop=True)
+for i, lagoon in enumerate(lagoons):
+    # Read only the data of the lagoon
+    subset = read_table(data_path, [lagoon]).set_index("Time", drop=True)
     enso = subset.ENSO.values
 
     subset = subset[variables]
@@ -46,36 +60,9 @@ for lagoon in lagoons:
     else:
         fs = (7, 4)
 
-    figs.append(plot_ts_components(subset, fs, enso, titles=titles))
-
-# %% Show plots
-# plt.show()
-
-# %% Save plots
-for i, (lagoon, fig) in enumerate(zip(lagoons, figs)):
-    fig.savefig(save_images_path.format(i+1, lagoon, "svg"))
-
-# %% Detrended data
-# List to store the detrended dataframes
-DAT2 = []
-
-# Iterate throught lagoons to subset data
-for lagoon in lagoons:
-    # Subset data by lagoon
-    subset = DATA[DATA.Lagoon == lagoon].copy().set_index("Time", drop=True)    
-    
-    # Detrend variables of interest from subset dataframe: If 
-    # the lagoon isn't Mallorquín, we don't need Discharge
-    if lagoon == "mallorquin":
-        subset = detrend_variables(subset, variables)
-    else:
-        subset = detrend_variables(subset, [variables[i] for i in [0, 2, 3]])
-    
-    # Save subset dataframe into the list
-    DAT2.append(subset)
-
-# Merge all dataframes by lagoon
-DAT2 = pd.concat(DAT2).reset_index()
+    jobs[save_images_path.format(i+1, lagoon, "svg")] = (
+        plot_ts_components, (subset, fs, enso), {"titles": titles}
+    )
 
-# Save detrended data
-DAT2.to_csv(save_path)
\ No newline at end of file
+# %% Save plots, only the plots that changed are plotted again
+render_figures(jobs, manifest_path)
\ No newline at end of file
@@ -2,15 +2,12 @@
 import numpy as np
 import pandas as pd 
 
-from statsmodels.tsa.stattools import acf, ccf
-from functions.stat_utils import plot_acf_ccf
-
-# %% Imports for plots and define some paremeters
-import matplotlib.pyplot as plt
-
-# Load custom style
-plt.style.use("src/style.mplstyle")
+from functions.stat_utils import acf_table, ccf_table, max_correlation_lags
+from functions.plot_utils import plot_acf_ccf
+from functions.storage import read_table
+from functions.rendering import render_figures
 
+# %% Define some paremeters
 # Define the titles of the variables
 titles = {
     "Precipitation": "Total Precipitation [mm]",
@@ -23,82 +20,77 @@ titles = {
 lagoons = ["mallorquin", "totumo", "virgen"]
 
 # %% Define paths
-data_path = "data/processed/detrended_hydrological_spectral_mean_data.csv"
-save_images_path = "images/{}_{}_{}cf_plot.{}"
+data_path = "data/processed/detrended_hydrological_spectral_mean_data"
 save_images_path = "images/{}_{}_{}cf_plot.{}"
+manifest_path = "data/processed/cache/render_6_acf_and_ccf.json"
 
 # %% Load data
-DATA = pd.read_csv(data_path, parse_dates=[1], index_col=0)
+DATA = read_table(data_path)
 
-# %% Lists and dictionary to store date
-acf_figs = []                               # To save the acf plots
-ccf_figs = []                               # To save the ccf plots
-ccfs = {}                                   # To save the CCF data
+# %% Define the variables of every lagoon
+nlags = 24                                  # Lags to calculate
 
-# %% Plot the ACF and CCF of all variables by lagoon
-# For loop to plot and calculate ACF and CCF by lagoon
-for lagoon in lagoons:
-    # Subset data based on lagoon
-    subset = DATA[DATA.Lagoon == lagoon].copy()
-    
-    # Calculate some parameters for the plots
-    N = subset.shape[0]
-    nlags = 24
-    confi = 1.96/np.sqrt(N)
+all_vars = {}                               # All variables by lagoon
+pairs = {}                                  # (dependant, independant) pairs by lagoon
 
+for lagoon in lagoons:
     # Get the variables names
-    all_vars = subset.columns[2:-3]
+    variables = DATA.columns[2:-3]
 
     # If lagoon is Totumo and La Virgen we have to remove discharge from
     # the variables
     if lagoon in ("totumo", "virgen"):
         # Slice to remove discharge
-        all_vars = all_vars[[0, 2, 3]]
+        variables = variables[[0, 2, 3]]
         
-        i_vars = all_vars[[0, 2]]           # Get independant variables
-        d_vars = all_vars[[1]]              # Get dependant variables 
+        i_vars = variables[[0, 2]]          # Get independant variables
+        d_vars = variables[[1]]             # Get dependant variables 
     
     else:
-        i_vars = all_vars[[0, 1, 3]]        # Get independant variables
-        d_vars = all_vars[[2]]              # Get dependant variables 
+        i_vars = variables[[0, 1, 3]]       # Get independant variables
+        d_vars = variables[[2]]             # Get dependant variables 
+
+    all_vars[lagoon] = list(variables)
+    pairs[lagoon] = [(d, i) for d in d_vars for i in i_vars]
+
+# %% Calculate the ACF and CCF of all lagoons in one pass
+acfs = acf_table(DATA, all_vars, nlags, groupby="Lagoon")
+ccfs = ccf_table(DATA, pairs, nlags, groupby="Lagoon")
+
+# %% Plot the ACF and CCF of all variables by lagoon
+jobs = {}                                   # Figures to save by path
 
-    # Dictionary to save ACF data by variable
+i = 4
+for lagoon in lagoons:
+    # Calculate the confidence interval for the plots
+    N = (DATA.Lagoon == lagoon).sum()
+    confi = 1.96/np.sqrt(N)
+
+    # Dictionaries with the ACF and CCF data by variable
     acf_data = {
-        var: acf(subset[var], nlags=nlags) \
-        for var in all_vars
+        var: df.Correlation.values \
+        for var, df in acfs[acfs.Lagoon == lagoon].groupby("Pair", sort=False)
     }
 
-    # Dictionary to save CCF data by variable
     ccf_data = {
-        f"{d} ~ {i}": ccf(subset[d], subset[i])[:nlags+1] \
-        for d in d_vars for i in i_vars
+        pair: df.Correlation.values \
+        for pair, df in ccfs[ccfs.Lagoon == lagoon].groupby("Pair", sort=False)
     }
-    
-    # Also save the CCF data in another dictionary
-    ccfs[lagoon] = ccf_data
 
-    # Save the plots in their respective list
-    acf_figs.append(plot_acf_ccf(acf_data, confi, [-1.2, 1.2], titles))
-    ccf_figs.append(plot_acf_ccf(ccf_data, confi, [-0.7, 0.7]))
-    
-# %% Show figures
-# plt.show()
-
-# %% Save figures
-i = 4
-for lagoon, afig, cfig in zip(lagoons, acf_figs, ccf_figs):
-    afig.savefig(save_images_path.format(i, lagoon, "a", "svg"))
-    cfig.savefig(save_images_path.format(i+1, lagoon, "c", "svg"))
+    # Define the plots with their paths
+    jobs[save_images_path.format(i, lagoon, "a", "svg")] = (
+        plot_acf_ccf, (acf_data, confi, [-1.2, 1.2], titles)
+    )
+    jobs[save_images_path.format(i+1, lagoon, "c", "svg")] = (
+        plot_acf_ccf, (ccf_data, confi, [-0.7, 0.7])
+    )
     i += 2
 
-# %% Show where is the maximum correlation by lagoon
-for lagoon in lagoons:
-    data = ccfs[lagoon]
-    keys = [t for t in data.keys()]
+# %% Save figures, only the figures that changed are plotted again
+render_figures(jobs, manifest_path)
 
-    for k in keys:
-        x = data[k]
-        m = np.max(np.abs(x))
-        p = np.where(np.abs(x) == m)[0][0]
+# %% Show where is the maximum correlation by lagoon
+summary = max_correlation_lags(ccfs)
 
-        print(f"{lagoon.capitalize()}: {k} maximum correlation in lag={p} {m:0.3f}")
\ No newline at end of file
+for lagoon, k, p, m in summary[["Lagoon", "Pair", "Lag", "Correlation"]].values:
+    print(f"{lagoon.capitalize()}: {k} maximum correlation in lag={p} {abs(m):0.3f}")
@@ -2,27 +2,26 @@
 import numpy as np 
 import pandas as pd
 
-from functions.stat_utils import plot_corr_matrix
-
-# %% Imports for plots and define some parameters
-import matplotlib.pyplot as plt
-
-# Load custom style
-plt.style.use("src/style.mplstyle")
+from functions.plot_utils import plot_corr_matrix
+from functions.storage import read_table, write_table
+from functions.rendering import render_figures
+from functions.quality import MIN_COVERAGE
 
+# %% Define some parameters
 # Keys to iterate
 lagoons = ["mallorquin", "totumo", "virgen"]
 variables = ["Precipitation", "Discharge", "Temperature", "NDVI"]
 save_keys = ["original", "rolled", "interpolated_removed"]
 
 # %% Define paths
-data_path = "data/processed/detrended_hydrological_spectral_mean_data.csv"
-save_path = "data/processed/lm_data_{}_interpolations.csv"
+data_path = "data/processed/detrended_hydrological_spectral_mean_data"
+save_path = "data/processed/lm_data_{}_interpolations"
 
 save_images_path = "images/{}_corr_matrix_{}.{}"
+manifest_path = "data/processed/cache/render_7_prepare_lm_data.json"
 
 # %% Read data
-DATA = pd.read_csv(data_path, parse_dates=[1], index_col=0)
+DATA = read_table(data_path)
 
 # Calculate the moving average of five to reduce the noise on SOI
 DATA.SOI = DATA.SOI.rolling(window=5, min_periods=1, center=True).mean()
@@ -57,7 +56,7 @@ DAT2 = pd.concat(DAT2)
 DAT3 = DAT2.copy()
 
 # Mask to get the values that Pixel Percentage is greater than 10%
-mask = DAT3.PixelPercentage >= 10.0
+mask = DAT3.PixelPercentage >= MIN_COVERAGE
 
 # Remove values that don't accomplish the condition
 DAT3 = DAT3[mask]
@@ -68,34 +67,30 @@ print("rolled", DAT2.shape)
 print("Interpolated removed", DAT3.shape)
 
 # %% Correlation plot
-# List to store all figures
-figs = []
+# Figures to save by path
+jobs = {}
 
 # Iterate over the dataframes to plot the correlation matrix
-for data in [DATA, DAT2, DAT3]:
+for i, (data, key) in enumerate(zip([DATA, DAT2, DAT3], save_keys)):
     # Subset data for plot
     subset = data[data.Lagoon == "mallorquin"].copy()
     
-    # Plot corr matrix
-    fig = plot_corr_matrix(
-        data=subset,
-        variables=variables,
-        half=True,
-        hide_insignificants=True,
-        show_labels=True,
-        show_colorbar=False,
+    # Define the corr matrix plot
+    jobs[save_images_path.format(i+10, key, "svg")] = (
+        plot_corr_matrix, (),
+        dict(
+            data=subset,
+            variables=variables,
+            half=True,
+            hide_insignificants=True,
+            show_labels=True,
+            show_colorbar=False,
+        ),
     )
 
-    # Store the figs
-    figs.append(fig)
-
-# %% Show figure
-# plt.show()
-
-# %% Save figures
-for i, (fig, key) in enumerate(zip(figs, save_keys)):
-    fig.savefig(save_images_path.format(i+10, key, "svg"))
+# %% Save figures, only the figures that changed are plotted again
+render_figures(jobs, manifest_path)
 
-# %% Save dataframes
+# %% Save dataframes partitioned by lagoon, and as CSV
 for key, data in zip(["with", "without"], [DAT2, DAT3]):
-    data.to_csv(save_path.format(key))
\ No newline at end of file
+    write_table(data, save_path.format(key))
\ No newline at end of file
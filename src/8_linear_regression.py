@@ -2,6 +2,8 @@
 import pandas as pd
 import statsmodels.formula.api as smf
 
+from functions.storage import read_table
+
 # %% Imports for plots and define some paremeters
 import matplotlib.pyplot as plt
 from matplotlib.gridspec import GridSpec
@@ -29,12 +31,12 @@ titles = {
 variables = ["Precipitation", "Discharge", "Temperature", "SOI"]
 
 # %% Define paths
-data_path = "data/processed/lm_data_without_interpolations.csv"
+data_path = "data/processed/lm_data_without_interpolations"
 save_images_path = "images/{}_linear_model_scatterplots.{}"
 save_models_path = "models/{}_model.{}"
 
 # %% load data 
-DATA = pd.read_csv(data_path, parse_dates=[1], index_col=0)
+DATA = read_table(data_path)
 
 # %% Explor variables
 # Create figure and axes
@@ -2,6 +2,9 @@
 import numpy as np
 import pandas as pd 
 
+from functions.storage import read_table
+from functions.quality import MIN_COVERAGE
+
 import matplotlib.pyplot as plt
 
 # %% Define plot options and color palettes
@@ -12,36 +15,41 @@ colors = [colors.colors[i,:] for i in range(3)]
 binary_cmap = plt.cm.get_cmap("bwr_r", 2)
 
 # %% Load final dataframe
-data = pd.read_csv(
-    "data/processed/hydrological_spectral_mean_data.csv",
-    parse_dates=[1],
-    index_col=0
-)
+data = read_table("data/processed/hydrological_spectral_mean_data")
 
 # %% Define constants
 save_path = "appendix/gaps/{}.svg"
 
 lagoons = data.Lagoon.unique()
 years = np.arange(data.Time.min().year, data.Time.max().year+1)
-months = np.arange(data.Time.min().month, data.Time.max().month+1)
+months = np.arange(1, 13)
+
+# All the months of the years, to plot the missing months as without data
+time = pd.date_range(
+    f"{years[0]}-01-01", f"{years[-1]}-12-31", freq=pd.offsets.MonthEnd()
+)
+
+# %% Find the months with enough valid pixels of every lagoon with the
+# PixelPercentage of 4_make_dataframes.py, 1 if the month is valid else 0
+valids = {
+    lagoon: (
+        data[data.Lagoon == lagoon].set_index("Time").PixelPercentage >= MIN_COVERAGE
+    ).astype(float)
+    for lagoon in lagoons
+}
 
 # %% Plot available image per month
 fig, axs = plt.subplots(
     figsize=(4, 5), nrows=3, ncols=1, sharex=True, sharey=True
 )
 
-# Find pixel percentage per lagoon
+# Plot the valid months per lagoon
 for i, (ax, lagoon) in enumerate(zip(axs, lagoons)):
-    percentage = data.PixelPercentage[data.Lagoon == lagoon].copy().values
-    
-    # Based on pixel percentage determines which months have valid and which haven't
-    valids = np.ones_like(percentage)
-    valids[percentage < 10] = 0
-
     # Reshape valids to plot like like an image
-    valids = valids.reshape([years.shape[0], months.shape[0]]).T
+    valid = valids[lagoon].reindex(time, fill_value=0).values
+    valid = valid.reshape([years.shape[0], months.shape[0]]).T
 
-    im = ax.pcolormesh(years, months, valids, cmap=binary_cmap, edgecolors="w")
+    im = ax.pcolormesh(years, months, valid, cmap=binary_cmap, edgecolors="w")
     ax.set_title(lagoon.capitalize())
 
     # Add colorbar
@@ -94,17 +102,11 @@ plt.savefig(save_path.format("pixel_percentage_distribution"))
 # %% Report the percentage of available data
 report = "{}: has {:0.2f} of total ({:0.0f} from {:0.0f})"
 
-# Find pixel percentage per lagoon
+# Count the valid months per lagoon
 for lagoon in lagoons:
-    percentage = data.PixelPercentage[data.Lagoon == lagoon].copy().values
-
-    # Based on pixel percentage determines which months have valid and which haven't
-    valids = np.ones_like(percentage)
-    valids[percentage < 10] = 0
-
     # Calculate de sum to get the number of good images
-    ti = valids.shape[0]
-    gi = valids.sum()
+    ti = valids[lagoon].shape[0]
+    gi = valids[lagoon].sum()
     gp = gi/ti * 100
 
     print(report.format(lagoon, gp, gi, ti))
\ No newline at end of file
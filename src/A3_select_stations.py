@@ -1,6 +1,8 @@
 # %% Imports
 import geopandas as gpd
 
+from functions.stations import load_station_catalogue, stations_within
+
 # %% Define parameters
 # CRS to reproject all dataframes
 EPSG = 32618
@@ -16,25 +18,22 @@ unused_vars = [
 forests_path = "data/shapefile/mangrove_forests.shp"
 stations_path = "data/shapefile/CNE_IDEAM.shp"
 save_path = "appendix/gauge_stations/stations_of_interest.shp"
+cache_dir = "data/processed/cache"
 
-# %% Read and reproject forests and stations
+# %% Read and reproject forests and stations, the reprojected stations are
+# cached and indexed once
 forests = gpd.read_file(forests_path).to_crs(epsg=EPSG)
-stations = gpd.read_file(stations_path).to_crs(epsg=EPSG)
+catalogue = load_station_catalogue(stations_path, epsg=EPSG, cache_dir=cache_dir)
 
 # %% Subset stations
-buffers = forests.copy()                    # Copy the data from the forest
-buffers.geometry = buffers.buffer(6000)     # Replace its geometry with a buffer of 6 km
-buffers = buffers[["key", "geometry"]]      # Get only the key (Forest) and geomtry
-
-# Spatial join to filter the stations and add thier respective forest
-stations = stations.sjoin(buffers, how="inner")
-
-# Get only Climatical, Pluviometrical and Synaptical stations
-categories_of_interest = (stations.CATEGORIA == "PM") | \
-    (stations.CATEGORIA == "CP") | (stations.CATEGORIA == "SP")
-
-# Get stations from the categories of interest
-stations = stations[categories_of_interest]
+# Find the Climatical, Pluviometrical and Synaptical stations within 6 km
+# of every forest, with their respective forest
+stations = stations_within(
+    catalogue,
+    forests.set_index("key").geometry,
+    distance=6000,
+    categories=["PM", "CP", "SP"],
+)
 
 # Drop unused variables
 stations = stations.drop(unused_vars, axis=1)
@@ -0,0 +1,771 @@
+# %% Imports
+import os
+import glob
+import uuid
+import warnings
+import hashlib
+
+import netCDF4
+import numpy as np
+import pandas as pd
+import xarray
+import rioxarray
+import geopandas as gpd
+from rasterio.features import geometry_mask
+from scipy.special import stdtr
+
+from functions.stat_utils import na_seadec_batch, batch_ccf, moving_average_trend
+from functions.spectral_indices import SPECTRAL_INDICES
+
+# %% Typing imports
+from typing import Sequence
+
+# %% Constants
+# Chunks to read the cubes, all the time steps of spatial tiles
+READ_CHUNKS = {"time": -1, "latitude": 256, "longitude": 256}
+
+# Chunks to write the cubes, long time series of small spatial tiles
+WRITE_CHUNKS = {"time": 128, "latitude": 64, "longitude": 64}
+
+# Scale factor and offset of the variables saved as int16, the spectral
+# indices (e.g. the NDVI) in [-3.27, 3.27] and the Surface Temperature in
+# [-25, 105] °C
+INT16_SCALING = {
+    **{index: (0.0001, 0.0) for index in SPECTRAL_INDICES},
+    "Surface Temperature": (0.002, 40.0),
+}
+
+# Value of the missing data of the variables saved as int16
+INT16_FILL_VALUE = -32768
+
+# Rasterized zones already calculated, by grid and geometries
+_ZONE_MASKS = {}
+
+# %% Functions
+def open_cube(path: str, chunks: dict[str, int] | None = None) -> xarray.Dataset:
+    """
+    Function to open a processed NetCDF cube lazily, with dask chunks.
+
+    Parameters
+    ----------
+    path : str
+        Path of the NetCDF file.
+
+    chunks : dict[str, int] | None = None
+        Chunks of the dimensions, if it is not defined READ_CHUNKS will be
+        used.
+
+    Returns
+    -------
+    data : xarray.Dataset
+        Dataset with dask arrays, the reductions over it are computed out
+        of core chunk by chunk.
+    """
+    if chunks is None:
+        chunks = READ_CHUNKS
+
+    return xarray.open_dataset(path, decode_coords="all", chunks=chunks)
+
+
+def cube_encoding(variable: xarray.DataArray, dtype: str) -> dict:
+    """
+    Function to define the encoding to save a variable of a cube as float32
+    or as int16 packed with a scale factor and an offset.
+
+    Parameters
+    ----------
+    variable : xarray.DataArray
+        Variable to save, the NaN are the missing data.
+
+    dtype : str
+        Float32 or Int16. With Int16 the variable is packed with its scale
+        factor and offset in INT16_SCALING, or with its range if it isn't
+        there, and the NaN are saved as INT16_FILL_VALUE.
+
+    Returns
+    -------
+    encoding : dict
+        Encoding of the variable, with the dtype, the _FillValue and, with
+        Int16, the scale_factor and the add_offset.
+    """
+    dtype = dtype.lower()
+
+    if dtype == "float32":
+        return {"dtype": "float32", "_FillValue": np.float32(np.nan)}
+
+    if dtype != "int16":
+        raise ValueError(f"dtype must be float32 or int16, not {dtype}")
+
+    low, high = float(variable.min()), float(variable.max())
+
+    if variable.name in INT16_SCALING:
+        scale, offset = INT16_SCALING[variable.name]
+    elif np.isfinite(low) and high > low:
+        scale, offset = (high - low) / (2 * 32766), (high + low) / 2
+    else:
+        # Constant variables or without data
+        scale, offset = 1.0, (low if np.isfinite(low) else 0.0)
+
+    # Check that the values fit in the int16 with the scale and the offset,
+    # the lowest int16 is kept for the missing data
+    if low < offset - 32767 * scale or high > offset + 32767 * scale:
+        raise ValueError(
+            f"the values of {variable.name} in [{low}, {high}] don't fit in int16 "
+            f"with scale_factor={scale} and add_offset={offset}"
+        )
+
+    return {
+        "dtype": "int16",
+        "scale_factor": scale,
+        "add_offset": offset,
+        "_FillValue": INT16_FILL_VALUE,
+    }
+
+
+def write_cube(
+    data: xarray.Dataset,
+    path: str,
+    chunks: dict[str, int] | None = None,
+    complevel: int = 4,
+    dtype: str | None = None,
+) -> None:
+    """
+    Function to save a (time, lat, lon) cube as a chunked and compressed
+    NetCDF file. The time is saved as an unlimited dimension, so new time
+    steps could be added with append_cube().
+
+    Every saved cube gets a new identifier in its cube_id attribute, kept
+    by append_cube(), so the results cached from a cube, e.g. by
+    cached_zonal_statistics(), are discarded when the cube is rebuilt.
+
+    Parameters
+    ----------
+    data : xarray.Dataset
+        Dataset with the (time, latitude, longitude) variables.
+
+    path : str
+        Path of the NetCDF file.
+
+    chunks : dict[str, int] | None = None
+        Chunks of the dimensions in the file, if it is not defined
+        WRITE_CHUNKS will be used.
+
+    complevel : int = 4
+        Level of the zlib compression, from 1 to 9.
+
+    dtype : str | None = None
+        Float32 or Int16, type to save the (time, latitude, longitude)
+        variables, see cube_encoding(). The readers, e.g. open_cube(),
+        decode them to floats with NaN. If it is not defined the variables
+        keep their type.
+    """
+    if chunks is None:
+        chunks = WRITE_CHUNKS
+
+    # Update the encoding of a copy, to keep the rest of the encoding of
+    # the variables, e.g. the grid mapping of the CRS
+    data = data.copy()
+    data.attrs["cube_id"] = uuid.uuid4().hex
+
+    for name, variable in data.data_vars.items():
+        # Only chunk the variables with all the dimensions of the chunks
+        if not set(chunks).issubset(variable.dims):
+            continue
+
+        variable.encoding.update({
+            "zlib": True,
+            "complevel": complevel,
+            "chunksizes": tuple(
+                min(chunks.get(dim, size), size)
+                for dim, size in zip(variable.dims, variable.shape)
+            ),
+        })
+
+        # Replace the type of the variable, also the packing of the file
+        # it was read from
+        if dtype is not None:
+            for key in ("dtype", "scale_factor", "add_offset", "_FillValue", "missing_value"):
+                variable.encoding.pop(key, None)
+
+            variable.encoding.update(cube_encoding(variable, dtype))
+
+    unlimited_dims = ["time"] if "time" in data.dims else None
+
+    data.to_netcdf(path, unlimited_dims=unlimited_dims)
+
+
+def cube_times(path: str) -> np.ndarray:
+    """
+    Function to get the time steps of a NetCDF cube without read its data.
+
+    Parameters
+    ----------
+    path : str
+        Path of the NetCDF file.
+
+    Returns
+    -------
+    times : numpy.ndarray
+        Array with the time steps as datetime64.
+    """
+    with xarray.open_dataset(path) as data:
+        return data["time"].values
+
+
+def cube_variables(path: str) -> list[str]:
+    """
+    Function to get the (time, lat, lon) variables of a NetCDF cube without
+    read its data.
+
+    Parameters
+    ----------
+    path : str
+        Path of the NetCDF file.
+
+    Returns
+    -------
+    variables : list[str]
+        Names of the variables with the time dimension.
+    """
+    with xarray.open_dataset(path) as data:
+        return [name for name, variable in data.data_vars.items() if "time" in variable.dims]
+
+
+def append_cube(data: xarray.Dataset, path: str) -> None:
+    """
+    Function to append new time steps to a NetCDF cube saved with
+    write_cube(), without rewrite the data already saved.
+
+    Parameters
+    ----------
+    data : xarray.Dataset
+        Dataset with the same variables and grid than the cube, and time
+        steps later than the last one of the cube.
+
+    path : str
+        Path of the NetCDF file.
+    """
+    times = pd.to_datetime(data["time"].values)
+
+    # Check the variables before write anything, the new variables, e.g. a
+    # new spectral index, need to rebuild the cube
+    variables = [name for name, variable in data.data_vars.items() if "time" in variable.dims]
+    saved = cube_variables(path)
+
+    if set(variables) != set(saved):
+        raise ValueError(
+            f"the variables of data {variables} don't match the ones of {path} {saved}, "
+            "remove the file to rebuild it"
+        )
+
+    # Only later time steps could be appended, the rest needs to rebuild
+    # the cube
+    if times.min() <= cube_times(path).max():
+        raise ValueError(
+            f"the time steps of data must be later than the last one of {path}, "
+            "remove the file to rebuild it"
+        )
+
+    # Check that the new time steps have the same grid, e.g. the cubes saved
+    # with the whole images can't be extended with the window of the forest
+    with xarray.open_dataset(path) as cube:
+        for dim in data.dims:
+            if dim == "time":
+                continue
+
+            if (
+                dim not in cube.dims
+                or cube.sizes[dim] != data.sizes[dim]
+                or not np.allclose(cube[dim].values, data[dim].values, rtol=0, atol=1e-6)
+            ):
+                raise ValueError(
+                    f"the {dim} of data doesn't match the one of {path}, "
+                    "remove the file to rebuild it"
+                )
+
+    with netCDF4.Dataset(path, "a") as nc:
+        unlimited = nc.dimensions["time"].isunlimited()
+
+        if unlimited:
+            # Add the new time steps with the units of the file
+            time = nc.variables["time"]
+            n = len(time)
+            calendar = getattr(time, "calendar", "standard")
+            time[n:] = netCDF4.date2num(times.to_pydatetime(), time.units, calendar)
+
+            # Write the new time steps of every variable at the end
+            for name, variable in data.data_vars.items():
+                if "time" not in variable.dims:
+                    continue
+
+                # The NaN are masked and replaced by the _FillValue, so the
+                # packed variables save them as their _FillValue without
+                # cast the NaN to integers
+                target = nc.variables[name]
+                fill_value = getattr(target, "_FillValue", 0)
+                target[n:] = np.ma.fix_invalid(
+                    variable.transpose(*target.dimensions).values, fill_value=fill_value
+                )
+
+    # The cubes saved before with a fixed time dimension are rewritten
+    # once with all the time steps
+    if not unlimited:
+        with xarray.open_dataset(path, decode_coords="all") as cube:
+            cube = cube.load()
+
+        write_cube(xarray.concat([cube, data], dim="time"), path)
+
+
+def na_seadec_cube(
+    data: xarray.DataArray,
+    period: int = 12,
+    model: str = "additive",
+    min_valid: float = 0.1,
+    chunks: dict[str, int] | None = None,
+) -> xarray.DataArray:
+    """
+    Function to interpolate the NaN values of every pixel time series of a
+    (time, lat, lon) cube with the na_seadec algorithm.
+
+    The pixels of every spatial chunk are interpolated together with
+    na_seadec_batch(), and the chunks are processed in parallel with dask.
+
+    Parameters
+    ----------
+    data : xarray.DataArray
+        Cube with a regular monthly time dimension.
+
+    period : int = 12
+        Period of the seasonality.
+
+    model : str = "additive"
+        Additive or Multiplicative. The kind of model to decompose the
+        time series.
+
+    min_valid : float = 0.1
+        Minimum fraction of valid values of a pixel to interpolate it, the
+        pixels with less valid values are kept as NaN.
+
+    chunks : dict[str, int] | None = None
+        Size of the spatial chunks, e.g. {"latitude": 128, "longitude": 128}.
+        The time is always kept in one chunk. If it is not defined and the
+        cube isn't chunked, it is processed in one chunk.
+
+    Returns
+    -------
+    data : xarray.DataArray
+        Cube with the NaN values interpolated.
+    """
+    # The interpolation needs the full time series of every pixel
+    if chunks is not None:
+        data = data.chunk({**chunks, "time": -1})
+    elif data.chunks is not None:
+        data = data.chunk({"time": -1})
+
+    def interpolate(values: np.ndarray) -> np.ndarray:
+        # Reshape the chunk to (time, pixels), time is the last dimension
+        shape = values.shape
+        values = values.reshape(-1, shape[-1]).T
+
+        # Only interpolate the pixels with enough valid values
+        valid = np.isfinite(values).mean(axis=0) >= min_valid
+        filled = np.full(values.shape, np.nan)
+
+        if valid.any():
+            filled[:, valid] = na_seadec_batch(
+                values[:, valid], period=period, model=model, cache=False
+            )
+
+        return filled.T.reshape(shape)
+
+    filled = xarray.apply_ufunc(
+        interpolate,
+        data,
+        input_core_dims=[["time"]],
+        output_core_dims=[["time"]],
+        dask="parallelized",
+        output_dtypes=[np.float64],
+    )
+
+    return filled.transpose(*data.dims)
+
+
+def lagged_correlation_map(
+    data: xarray.DataArray,
+    driver: pd.Series | np.ndarray,
+    nlags: int = 24,
+    detrend: bool = True,
+    period: int = 12,
+    alpha: float = 0.05,
+    chunks: dict[str, int] | None = None,
+) -> xarray.Dataset:
+    """
+    Function to calculate the cross-correlation of every pixel time series
+    of a (time, lat, lon) cube with a driver series, e.g. the precipitation,
+    and get the lag with the maximum absolute correlation of every pixel.
+
+    The correlation at lag k is between the pixel at time t + k and the
+    driver at time t, like in ccf_table(). The pixels of every spatial chunk
+    are correlated together and the chunks are processed in parallel with
+    dask.
+
+    Parameters
+    ----------
+    data : xarray.DataArray
+        Cube without NaN values in the pixels of interest, e.g. interpolated
+        with na_seadec_cube(). The pixels with NaN values get NaN.
+
+    driver : pd.Series | numpy.ndarray
+        Driver series with the same time steps than the cube.
+
+    nlags : int = 24
+        Number of lags to evaluate.
+
+    detrend : bool = True
+        If True, remove the moving average trend of the pixels and the
+        driver before correlate them.
+
+    period : int = 12
+        Period of the moving average trend.
+
+    alpha : float = 0.05
+        Significance level of the correlation.
+
+    chunks : dict[str, int] | None = None
+        Size of the spatial chunks, e.g. {"latitude": 128, "longitude": 128}.
+        The time is always kept in one chunk.
+
+    Returns
+    -------
+    maps : xarray.Dataset
+        Dataset with the maximum correlation, its lag, its p-value and if
+        it is significant in every pixel.
+    """
+    driver = np.asarray(driver, dtype=float)
+
+    if driver.shape[0] != data.sizes["time"]:
+        raise ValueError("driver must have the same length than the time of data")
+
+    if detrend:
+        driver = driver - moving_average_trend(driver[:, None], period)[:, 0]
+
+    # The correlation needs the full time series of every pixel
+    if chunks is not None:
+        data = data.chunk({**chunks, "time": -1})
+    elif data.chunks is not None:
+        data = data.chunk({"time": -1})
+
+    n = driver.shape[0]
+
+    def correlate(values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Reshape the chunk to (time, pixels), time is the last dimension
+        shape = values.shape[:-1]
+        values = values.reshape(-1, n).T
+
+        if detrend:
+            values = values - moving_average_trend(values, period)
+
+        # Correlate all pixels with the driver at all lags
+        ccf = batch_ccf(values, driver[:, None], nlags)
+
+        # Find the lag with the maximum absolute correlation
+        valid = np.isfinite(ccf).all(axis=0)
+        lag = np.argmax(np.where(np.isfinite(ccf), np.abs(ccf), -1.0), axis=0)
+        corr = np.where(valid, ccf[lag, np.arange(ccf.shape[1])], np.nan)
+
+        # Get the p-value with the two-sided t distribution, using the
+        # overlapped observations at the lag
+        dof = n - lag - 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = corr * np.sqrt(dof / (1.0 - corr**2))
+        pvalue = 2 * stdtr(dof, -np.abs(t))
+
+        lag = np.where(valid, lag, -1)
+
+        return corr.reshape(shape), lag.reshape(shape), pvalue.reshape(shape)
+
+    corr, lag, pvalue = xarray.apply_ufunc(
+        correlate,
+        data,
+        input_core_dims=[["time"]],
+        output_core_dims=[[], [], []],
+        dask="parallelized",
+        output_dtypes=[np.float64, np.int64, np.float64],
+    )
+
+    maps = xarray.Dataset({
+        "Correlation": corr,
+        "Lag": lag,
+        "p-value": pvalue,
+        "Significant": pvalue <= alpha,
+    })
+
+    maps["Lag"].attrs["units"] = "months"
+    maps["Lag"].attrs["description"] = "-1 in the pixels without data"
+
+    return maps
+
+
+def zone_masks(
+    data: xarray.Dataset | xarray.DataArray,
+    zones: gpd.GeoSeries,
+    all_touched: bool = False,
+    cache_dir: str | None = None,
+) -> xarray.DataArray:
+    """
+    Function to rasterize polygons, e.g. the mangrove forests, into boolean
+    masks aligned to the grid of a cube.
+
+    The masks are calculated once by grid and polygons and kept in memory,
+    and optionally saved on disk to reuse them in the next runs.
+
+    Parameters
+    ----------
+    data : xarray.Dataset | xarray.DataArray
+        Cube with the grid of interest and its CRS.
+
+    zones : geopandas.GeoSeries
+        Polygons of the zones, the index is used as the name of the zones.
+
+    all_touched : bool = False
+        If False, only the pixels with their center inside the polygon are
+        in the mask, like in rio.clip(). If True all pixels touched by
+        the polygon are in the mask.
+
+    cache_dir : str | None = None
+        Folder to save the masks, if it is not defined the masks are only
+        kept in memory.
+
+    Returns
+    -------
+    masks : xarray.DataArray
+        Boolean array with shape (zone, latitude, longitude).
+    """
+    # Reproject the zones to the CRS of the cube
+    crs = data.rio.crs
+    if zones.crs is not None and crs is not None:
+        zones = zones.to_crs(crs)
+
+    y_dim, x_dim = data.rio.y_dim, data.rio.x_dim
+    shape = (data.sizes[y_dim], data.sizes[x_dim])
+    transform = data.rio.transform()
+
+    # Define the key of the masks with the grid and the polygons
+    key = hashlib.sha1()
+    key.update(repr((shape, tuple(transform), all_touched)).encode())
+    for name, geometry in zones.items():
+        key.update(str(name).encode())
+        key.update(geometry.wkb)
+    key = key.hexdigest()
+
+    path = None if cache_dir is None else os.path.join(cache_dir, f"{key}.npy")
+
+    # Rasterize the zones if they are not already calculated
+    if key not in _ZONE_MASKS:
+        if path is not None and os.path.isfile(path):
+            _ZONE_MASKS[key] = np.load(path)
+        else:
+            _ZONE_MASKS[key] = np.stack([
+                ~geometry_mask([geometry], shape, transform, all_touched=all_touched)
+                for geometry in zones.values
+            ])
+
+            if path is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.save(path, _ZONE_MASKS[key])
+
+    return xarray.DataArray(
+        _ZONE_MASKS[key],
+        dims=("zone", y_dim, x_dim),
+        coords={"zone": zones.index.values, y_dim: data[y_dim], x_dim: data[x_dim]},
+    )
+
+
+def zonal_statistics(
+    data: xarray.DataArray,
+    masks: xarray.DataArray,
+    percentiles: Sequence[float] = (),
+) -> xarray.Dataset:
+    """
+    Function to calculate the mean, count, standard deviation and
+    percentiles of the pixels of every zone at every time step, with one
+    masked reduction of the cube.
+
+    Parameters
+    ----------
+    data : xarray.DataArray
+        Cube with shape (time, lat, lon), could be a dask array.
+
+    masks : xarray.DataArray
+        Boolean masks of the zones, e.g. from zone_masks().
+
+    percentiles : Sequence[float] = ()
+        Percentiles to calculate, from 0 to 100.
+
+    Returns
+    -------
+    stats : xarray.Dataset
+        Dataset with the statistics with shape (time, zone). The count is
+        the number of valid pixels.
+    """
+    y_dim, x_dim = masks.dims[1:]
+
+    # The reduction needs the full grid of every time step
+    if data.chunks is not None:
+        data = data.chunk({y_dim: -1, x_dim: -1, "time": "auto"})
+
+    weights = masks.values.reshape(masks.shape[0], -1).T.astype(float)
+    pixels = [np.flatnonzero(w) for w in weights.T]
+    names = ["mean", "count", "std"] + [f"p{q:g}" for q in percentiles]
+
+    def reduce(values: np.ndarray) -> np.ndarray:
+        # Reshape the chunk to (time, pixels)
+        shape = values.shape[:-2]
+        values = values.reshape(-1, weights.shape[0])
+        valid = np.isfinite(values)
+        x = np.where(valid, values, 0.0)
+
+        # Sums of the valid pixels of every zone
+        count = valid @ weights
+        total = x @ weights
+        squares = (x**2) @ weights
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = total / count
+            std = np.sqrt(np.maximum(squares / count - mean**2, 0.0))
+
+        stats = [mean, count, std]
+
+        # The percentiles only use the pixels of every zone
+        if len(percentiles) > 0:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                zones = [
+                    np.nanpercentile(values[:, p], percentiles, axis=1).T
+                    for p in pixels
+                ]
+            stats += [np.stack([z[:, i] for z in zones], axis=1) for i in range(len(percentiles))]
+
+        return np.stack(stats, axis=-2).reshape(*shape, len(names), weights.shape[1])
+
+    stats = xarray.apply_ufunc(
+        reduce,
+        data,
+        input_core_dims=[[y_dim, x_dim]],
+        output_core_dims=[["statistic", "zone"]],
+        dask="parallelized",
+        output_dtypes=[np.float64],
+        dask_gufunc_kwargs={"output_sizes": {"statistic": len(names), "zone": weights.shape[1]}},
+    )
+
+    stats = stats.assign_coords(statistic=names, zone=masks.zone.values)
+
+    return stats.to_dataset(dim="statistic")
+
+
+def cached_zonal_statistics(
+    data: xarray.Dataset,
+    masks: xarray.DataArray,
+    variables: Sequence[str],
+    cache_dir: str | None = None,
+    percentiles: Sequence[float] = (),
+) -> pd.DataFrame:
+    """
+    Function to calculate the zonal statistics of some variables of a cube,
+    only for the time steps that aren't in the statistics of a previous
+    run, e.g. after append new images with append_cube().
+
+    The statistics are saved as a CSV file in the cache folder, with a key
+    defined by the masks and the identifier of the cube that write_cube()
+    saves in its cube_id attribute, so a rebuilt cube or new masks
+    calculate all statistics again and remove the previous file. The cubes
+    without identifier, e.g. created in memory, are identified by the
+    content of all their time steps.
+
+    Parameters
+    ----------
+    data : xarray.Dataset
+        Cube with shape (time, lat, lon), could have dask arrays.
+
+    masks : xarray.DataArray
+        Boolean masks of the zones, e.g. from zone_masks().
+
+    variables : Sequence[str]
+        Variables of the cube to reduce.
+
+    cache_dir : str | None = None
+        Folder to save the statistics, if it is not defined all the time
+        steps are reduced.
+
+    percentiles : Sequence[float] = ()
+        Percentiles to calculate, from 0 to 100.
+
+    Returns
+    -------
+    stats : pd.DataFrame
+        DataFrame with the time and the zone as index and the statistics of
+        every variable as columns, e.g. "NDVI mean".
+    """
+    def reduce(subset: xarray.Dataset) -> pd.DataFrame:
+        # Calculate the statistics and reshape them to (time, zone) rows
+        stats = []
+        for variable in variables:
+            stats.append(
+                zonal_statistics(subset[variable], masks, percentiles)
+                .reset_coords(drop=True)
+                .to_dataframe()
+                .add_prefix(f"{variable} ")
+            )
+
+        return pd.concat(stats, axis=1).reorder_levels(["time", "zone"])
+
+    if cache_dir is None:
+        return reduce(data)
+
+    # Define the name of the statistics with the variables and the zones,
+    # and their version with the masks and the cube
+    name = hashlib.sha1()
+    name.update(repr((list(variables), list(percentiles))).encode())
+    name.update(np.asarray(masks.zone.values, dtype=str).tobytes())
+    name = name.hexdigest()
+
+    version = hashlib.sha1()
+    version.update(masks.values.tobytes())
+    if "cube_id" in data.attrs:
+        version.update(str(data.attrs["cube_id"]).encode())
+    else:
+        version.update(np.asarray(data["time"].values).tobytes())
+        for variable in variables:
+            version.update(np.ascontiguousarray(data[variable].values).tobytes())
+    version = version.hexdigest()
+
+    path = os.path.join(cache_dir, f"zonal_statistics_{name}_{version}.csv")
+
+    # Load the statistics of the previous runs
+    if os.path.isfile(path):
+        cached = pd.read_csv(path, index_col=[0, 1], parse_dates=[0])
+    else:
+        cached = None
+
+    # Only reduce the time steps that aren't in the cache
+    times = data["time"].values
+    if cached is not None:
+        times = times[~np.isin(times, cached.index.get_level_values("time").values)]
+
+    if len(times) == 0:
+        stats = cached
+    else:
+        stats = reduce(data.sel(time=times))
+        if cached is not None:
+            stats = pd.concat([cached, stats])
+
+        os.makedirs(cache_dir, exist_ok=True)
+        stats.to_csv(path)
+
+        # Remove the statistics of the previous versions
+        for old_path in glob.glob(os.path.join(cache_dir, f"zonal_statistics_{name}_*.csv")):
+            if old_path != path:
+                os.remove(old_path)
+
+    # Keep the time steps of the cube in order
+    return stats.loc[data["time"].values].sort_index()
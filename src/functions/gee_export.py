@@ -0,0 +1,521 @@
+# %% Imports
+import io
+import os
+import json
+import time
+import hashlib
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import rasterio
+import matplotlib.image as mpimg
+from matplotlib.figure import Figure
+from rasterio.errors import RasterioError
+
+# %% Typing imports
+from typing import Any, Callable, Sequence
+
+# %% Constants
+# First bytes of every PNG file
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# %% Functions
+def is_valid_raster(
+    filename: str, count: int | None = None, names: Sequence[str] | None = None
+) -> bool:
+    """
+    Function to check if a downloaded image exists and could be opened.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the image.
+
+    count : int | None = None
+        Number of bands that the image must have. If it is not defined
+        the number of bands is not checked.
+
+    names : Sequence[str] | None = None
+        Names of the bands that the image must have, in the descriptions of
+        its bands. The images without descriptions must have one band by
+        name. If it is not defined the names are not checked, so the images
+        downloaded with more bands are also valid.
+
+    Returns
+    -------
+    valid : bool
+        True if the image exists, is not empty and could be opened.
+    """
+    # Missing or empty files are invalid
+    if not os.path.isfile(filename) or os.path.getsize(filename) == 0:
+        return False
+
+    # Try to open the image to read its header
+    try:
+        with rasterio.open(filename, "r") as src:
+            if count is not None and src.count != count:
+                return False
+
+            if names is not None:
+                if all(src.descriptions):
+                    return set(names).issubset(src.descriptions)
+                return src.count == len(names)
+
+            return True
+    except RasterioError:
+        return False
+
+
+def load_manifest(manifest_path: str) -> dict[str, dict]:
+    """
+    Function to load the manifest of a previous export run.
+
+    Parameters
+    ----------
+    manifest_path : str
+        Path of the JSON manifest.
+
+    Returns
+    -------
+    manifest : dict[str, dict]
+        Dictionary with the status of every exported file, empty if the
+        manifest doesn't exist.
+    """
+    if not os.path.isfile(manifest_path):
+        return {}
+
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict[str, dict], manifest_path: str) -> None:
+    """
+    Function to save the manifest of an export run. The manifest is written
+    to a temporary file and then moved, so an interrupted run never leaves
+    a corrupted manifest.
+
+    Parameters
+    ----------
+    manifest : dict[str, dict]
+        Dictionary with the status of every exported file.
+
+    manifest_path : str
+        Path of the JSON manifest.
+    """
+    tmp_path = manifest_path + ".tmp"
+
+    # Create the folder of the manifest if it doesn't exist
+    folder = os.path.dirname(manifest_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    os.replace(tmp_path, manifest_path)
+
+
+def export_images(
+    tasks: dict[str, Any],
+    export_fn: Callable[[Any, str], None],
+    manifest_path: str,
+    max_workers: int = 4,
+    retries: int = 3,
+    backoff: float = 2.0,
+    validator: Callable[[str], bool] = is_valid_raster,
+    retry_failed: bool = True,
+) -> dict[str, dict]:
+    """
+    Function to run exports concurrently, retrying the failed ones and
+    skipping the files that were already downloaded.
+
+    The status of every file is written to a manifest after each export,
+    so an interrupted run could be resumed calling the function again.
+
+    Parameters
+    ----------
+    tasks : dict[str, Any]
+        Dictionary with the path of the file to save as key and the object
+        to export (e.g. an ee.Image) as value.
+
+    export_fn : Callable[[Any, str], None]
+        Function that receives the object to export and the path of the file
+        and saves it, e.g. a wrapper of geemap.ee_export_image. A stand-in
+        could be used to run the scheduler offline.
+
+    manifest_path : str
+        Path of the JSON manifest with the status of the exports.
+
+    max_workers : int = 4
+        Maximum number of concurrent exports.
+
+    retries : int = 3
+        Number of retries of a failed export.
+
+    backoff : float = 2.0
+        Base of the exponential waiting time in seconds between retries.
+
+    validator : Callable[[str], bool] = is_valid_raster
+        Function to check if a file was downloaded correctly.
+
+    retry_failed : bool = True
+        If False, skip the files that failed in a previous run.
+
+    Returns
+    -------
+    manifest : dict[str, dict]
+        Dictionary with the status of every file.
+    """
+    # Load the manifest of the previous runs
+    manifest = load_manifest(manifest_path)
+    lock = threading.Lock()
+
+    def update(filename: str, status: str, attempts: int, error: str | None = None):
+        # Record the status of the file and save the manifest
+        with lock:
+            manifest[filename] = {"status": status, "attempts": attempts, "error": error}
+            save_manifest(manifest, manifest_path)
+
+    def run(filename: str, obj: Any) -> str:
+        error = None
+
+        # Try to export the file until it is valid or the retries are over
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                time.sleep(backoff**attempt)
+
+            try:
+                export_fn(obj, filename)
+            except Exception as e:
+                error = repr(e)
+            else:
+                # Some exporters don't raise errors, so check the file
+                if validator(filename):
+                    update(filename, "done", attempt + 1)
+                    return "done"
+                error = "invalid file"
+
+        update(filename, "failed", retries + 1, error)
+        return "failed"
+
+    # Find the files that must be exported
+    pending = {}
+    for filename, obj in tasks.items():
+        if validator(filename):
+            if manifest.get(filename, {}).get("status") != "done":
+                manifest[filename] = {"status": "done", "attempts": 0, "error": None}
+            continue
+
+        if not retry_failed and manifest.get(filename, {}).get("status") == "failed":
+            continue
+
+        pending[filename] = obj
+
+    save_manifest(manifest, manifest_path)
+
+    # Create the folders of the files
+    for folder in {os.path.dirname(filename) for filename in pending}:
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    # Run the exports with a bounded number of workers
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(run, filename, obj): filename
+            for filename, obj in pending.items()
+        }
+
+        for future in as_completed(futures):
+            print(f"{futures[future]}: {future.result()}")
+
+    return manifest
+
+
+def split_stack(
+    stack_path: str,
+    filenames: list[str],
+    names: Sequence[str] | None = None,
+    remove: bool = True,
+) -> None:
+    """
+    Function to split a multi-band stack of composites, e.g. exported from
+    stack_composites(), into one image by composite.
+
+    Parameters
+    ----------
+    stack_path : str
+        Path of the stack, with the bands of every composite one after the
+        other.
+
+    filenames : list[str]
+        Paths of the images to save, in the same order than the composites
+        in the stack.
+
+    names : Sequence[str] | None = None
+        Names of the bands of every composite, e.g. the bands passed to
+        landsat_processor(). They are saved as the descriptions of the
+        bands, so the readers find the bands by name. If it is not defined
+        the descriptions of the stack are kept, if it has them.
+
+    remove : bool = True
+        If True, remove the stack after split it.
+    """
+    with rasterio.open(stack_path, "r") as src:
+        # Get the number of bands by composite
+        if src.count % len(filenames) != 0:
+            raise ValueError(
+                f"{stack_path} has {src.count} bands, that can't be split in "
+                f"{len(filenames)} images"
+            )
+
+        count = src.count // len(filenames)
+
+        if names is not None and len(names) != count:
+            raise ValueError(
+                f"{stack_path} has {count} bands by image, but {len(names)} names "
+                f"were given: {list(names)}"
+            )
+
+        profile = src.profile.copy()
+        profile.update(count=count)
+
+        # Write the bands of every composite in its own image
+        for i, filename in enumerate(filenames):
+            folder = os.path.dirname(filename)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+
+            indexes = list(range(i * count + 1, (i + 1) * count + 1))
+
+            with rasterio.open(filename, "w", **profile) as dst:
+                dst.write(src.read(indexes))
+
+                # Save the band names, or keep the ones of the stack without
+                # the composite prefix
+                descriptions = [src.descriptions[j - 1] for j in indexes]
+                if names is not None:
+                    dst.descriptions = tuple(names)
+                elif all(descriptions):
+                    dst.descriptions = tuple(d.split("_", 1)[-1] for d in descriptions)
+
+    if remove:
+        os.remove(stack_path)
+
+
+def is_valid_png(filename: str) -> bool:
+    """
+    Function to check if a saved thumbnail exists and is a PNG.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the thumbnail.
+
+    Returns
+    -------
+    valid : bool
+        True if the file exists and starts with the PNG signature.
+    """
+    if not os.path.isfile(filename) or os.path.getsize(filename) == 0:
+        return False
+
+    with open(filename, "rb") as f:
+        return f.read(len(PNG_SIGNATURE)) == PNG_SIGNATURE
+
+
+def fetch_thumbnail(
+    img: Any, region: Sequence[float], vis_params: dict, dimensions: int = 768
+) -> bytes:
+    """
+    Function to download the PNG thumbnail of an ee.Image in one request.
+
+    Parameters
+    ----------
+    img : ee.Image
+        Image to download.
+
+    region : Sequence[float]
+        Limits of the thumbnail as [E, S, W, N], like cartoee.
+
+    vis_params : dict
+        Visualization parameters, e.g. {"bands": [...], "min": 0, "max": 1}.
+
+    dimensions : int = 768
+        Size of the largest side of the thumbnail in pixels.
+
+    Returns
+    -------
+    data : bytes
+        Content of the PNG.
+    """
+    # Define the region as a polygon from its limits
+    east, south, west, north = region
+    west, east = sorted([west, east])
+    south, north = sorted([south, north])
+
+    url = img.getThumbURL({
+        **vis_params,
+        "region": [[west, south], [east, south], [east, north], [west, north]],
+        "dimensions": dimensions,
+        "format": "png",
+    })
+
+    with urllib.request.urlopen(url, timeout=300) as response:
+        return response.read()
+
+
+def save_thumbnail(
+    data: bytes, filename: str, title: str, region: Sequence[float]
+) -> None:
+    """
+    Function to plot a downloaded thumbnail with its coordinates and title
+    and save it as PNG.
+
+    The figure is created without pyplot, so many thumbnails could be saved
+    at the same time from different threads.
+
+    Parameters
+    ----------
+    data : bytes
+        Content of the PNG, e.g. from fetch_thumbnail().
+
+    filename : str
+        Path of the figure.
+
+    title : str
+        Title of the figure.
+
+    region : Sequence[float]
+        Limits of the thumbnail as [E, S, W, N].
+    """
+    image = mpimg.imread(io.BytesIO(data), format="png")
+
+    east, south, west, north = region
+    west, east = sorted([west, east])
+    south, north = sorted([south, north])
+
+    # Plot the thumbnail in its coordinates
+    fig = Figure()
+    ax = fig.add_subplot()
+
+    ax.imshow(image, extent=[west, east, south, north])
+    ax.set_title(title, fontsize=12)
+    ax.set_xlabel("Longitude")
+    ax.set_ylabel("Latitude")
+
+    # Save in a temporal file and then move it, so an interrupted run never
+    # leaves a broken figure
+    tmp_path = filename + ".tmp"
+    fig.savefig(tmp_path, format="png")
+    os.replace(tmp_path, filename)
+
+
+def export_thumbnails(
+    images: dict[tuple[str, str], Any],
+    regions: dict[str, Sequence[float]],
+    vis_params: dict,
+    path: str,
+    manifest_path: str,
+    cache_dir: str | None = None,
+    fetch_fn: Callable[[Any, Sequence[float], dict], bytes] = fetch_thumbnail,
+    max_workers: int = 8,
+    retries: int = 3,
+    backoff: float = 2.0,
+) -> dict[str, dict]:
+    """
+    Function to download and plot the thumbnails of many images
+    concurrently with export_images(), skipping the figures that were
+    already saved.
+
+    The downloaded thumbnails are saved by (key, date) in cache_dir, so the
+    figures could be plotted again, e.g. with another title, without
+    download them again.
+
+    Parameters
+    ----------
+    images : dict[tuple[str, str], Any]
+        Dictionary with the key of the region and the date as key and the
+        image (e.g. an ee.Image) as value.
+
+    regions : dict[str, Sequence[float]]
+        Limits of every region as [E, S, W, N].
+
+    vis_params : dict
+        Visualization parameters of the thumbnails.
+
+    path : str
+        Path of the figures to format with the key and the date, e.g.
+        "appendix/all_images/{} {}.png".
+
+    manifest_path : str
+        Path of the JSON manifest with the status of the figures.
+
+    cache_dir : str | None = None
+        Folder to save the downloaded thumbnails, if it is not defined the
+        thumbnails are not saved.
+
+    fetch_fn : Callable[[Any, Sequence[float], dict], bytes] = fetch_thumbnail
+        Function that receives the image, the region and the visualization
+        parameters and returns the PNG. A stand-in could be used to run the
+        thumbnails offline.
+
+    max_workers : int = 8
+        Maximum number of concurrent downloads.
+
+    retries : int = 3
+        Number of retries of a failed download.
+
+    backoff : float = 2.0
+        Base of the exponential waiting time in seconds between retries.
+
+    Returns
+    -------
+    manifest : dict[str, dict]
+        Dictionary with the status of every figure.
+    """
+    # The thumbnails downloaded with other visualization parameters are not
+    # used
+    vis_key = hashlib.sha1(json.dumps(vis_params, sort_keys=True).encode()).hexdigest()[:8]
+
+    def export_fn(task: tuple[str, str, Any], filename: str) -> None:
+        key, date, img = task
+
+        cache_path = None
+        if cache_dir is not None:
+            cache_path = os.path.join(cache_dir, f"{key}_{date}_{vis_key}.png")
+
+        # Read the thumbnail if it was already downloaded, else download it
+        if cache_path is not None and is_valid_png(cache_path):
+            with open(cache_path, "rb") as f:
+                data = f.read()
+        else:
+            data = fetch_fn(img, regions[key], vis_params)
+
+            # Earth Engine could answer with an error page, it isn't saved
+            # so the download is retried
+            if not data.startswith(PNG_SIGNATURE):
+                raise ValueError(f"the thumbnail of {key} {date} isn't a PNG")
+
+            if cache_path is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(cache_path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(cache_path + ".tmp", cache_path)
+
+        save_thumbnail(data, filename, f"{key} {date}", regions[key])
+
+    tasks = {
+        path.format(key, date): (key, date, img)
+        for (key, date), img in images.items()
+    }
+
+    return export_images(
+        tasks,
+        export_fn,
+        manifest_path,
+        max_workers=max_workers,
+        retries=retries,
+        backoff=backoff,
+        validator=is_valid_png,
+    )
@@ -1,5 +1,25 @@
 import ee
 
+from typing import Callable, Sequence
+
+from functions.spectral_indices import SPECTRAL_INDICES, index_bands
+
+# Original names of the bands of interest of the Landsat Collection 2
+# Level 2 images by sensor
+LANDSAT_BANDS = {
+    "L5": {"BLUE": "SR_B1", "GREEN": "SR_B2", "RED": "SR_B3", "NIR": "SR_B4", "SWIR1": "SR_B5", "TEMPERATURE": "ST_B6"},
+    "L7": {"BLUE": "SR_B1", "GREEN": "SR_B2", "RED": "SR_B3", "NIR": "SR_B4", "SWIR1": "SR_B5", "TEMPERATURE": "ST_B6"},
+    "L8": {"BLUE": "SR_B2", "GREEN": "SR_B3", "RED": "SR_B4", "NIR": "SR_B5", "SWIR1": "SR_B6", "TEMPERATURE": "ST_B10"},
+}
+
+# Surface reflectance bands
+OPTICAL_BANDS = ["BLUE", "GREEN", "RED", "NIR", "SWIR1"]
+
+# The bands exported by default, and the bands used by the analysis. Any
+# optical band and any index of SPECTRAL_INDICES could also be exported
+ALL_BANDS = ["BLUE", "GREEN", "RED", "NIR", "SWIR1", "TEMPERATURE", "NDVI"]
+USED_BANDS = ["TEMPERATURE", "NDVI"]
+
 def renamer7(img: ee.Image) -> ee.Image:
     """
     Function to extract the Landsat 5 and 7 bands of interest and rename it
@@ -62,13 +82,217 @@ def calc_ndvi(img: ee.Image) -> ee.Image:
     img : ee.Image
         Image with NDVI calculated.
     """
-    # Define the NDVI formula
-    f = "(b('NIR')-b('RED'))/(b('NIR')+b('RED'))"
-    
-    # Calculate the NDVI
-    ndvi = img.expression(f).rename("NDVI")
+    return calc_indices(img, ["NDVI"])
+
+def index_image(img: ee.Image, indices: Sequence[str]) -> ee.Image:
+    """
+    Function to calculate spectral indices of one image with their
+    expressions in SPECTRAL_INDICES.
+
+    Parameters
+    ----------
+    img : ee.Image
+        Image with the scaled surface reflectance bands used by the indices,
+        named like in OPTICAL_BANDS.
+
+    indices : Sequence[str]
+        Names of the indices, e.g. ["NDVI", "EVI", "NDMI"].
+
+    Returns
+    -------
+    img : ee.Image
+        Image with one band by index, in the same order.
+    """
+    # Define the bands of the expressions once for all indices
+    bands = {band: img.select(band) for band in index_bands(indices)}
+
+    return ee.Image.cat([
+        img.expression(SPECTRAL_INDICES[index], bands).rename(index)
+        for index in indices
+    ])
+
+def calc_indices(img: ee.Image, indices: Sequence[str]) -> ee.Image:
+    """
+    Function to add spectral indices to one image in one addBands, e.g. to
+    map it over an image collection.
+
+    Parameters
+    ----------
+    img : ee.Image
+        Image with the scaled surface reflectance bands used by the indices,
+        named like in OPTICAL_BANDS.
+
+    indices : Sequence[str]
+        Names of the indices, e.g. ["NDVI", "EVI", "NDMI"].
+
+    Returns
+    -------
+    img : ee.Image
+        Image with the indices added.
+    """
+    return img.addBands(index_image(img, indices))
+
+def landsat_processor(
+    sensor: str, bands: Sequence[str] = ALL_BANDS, cloud_mask: bool = True
+) -> Callable[[ee.Image], ee.Image]:
+    """
+    Function to define the processing of the Landsat Collection 2 Level 2
+    images in one mapped step: scale the reflectance and the temperature,
+    mask the clouds and their shadows, select and rename the bands of
+    interest and calculate the spectral indices.
+
+    It replaces map(landsat_scaler).map(landsat_cloud_mask).map(renamer)
+    .map(calc_ndvi), only the original bands needed by the bands of interest
+    are scaled.
+
+    Parameters
+    ----------
+    sensor : str
+        L5, L7 or L8.
+
+    bands : Sequence[str] = ALL_BANDS
+        Bands of interest in their order, from OPTICAL_BANDS, TEMPERATURE
+        or the indices of SPECTRAL_INDICES. E.g. USED_BANDS to only export
+        the temperature and the NDVI, or USED_BANDS + ["EVI", "NDMI"]. Pass
+        the same bands as names to split_stack(), so the exported images
+        keep the names of their bands.
+
+    cloud_mask : bool = True
+        If True, mask the pixels with clouds or cloud shadows in the
+        QA_PIXEL band.
+
+    Returns
+    -------
+    process : Callable[[ee.Image], ee.Image]
+        Function to map over the image collection of the sensor.
+    """
+    names = LANDSAT_BANDS[sensor.upper()]
+
+    unknown = [
+        band for band in bands
+        if band not in OPTICAL_BANDS + ["TEMPERATURE"] and band not in SPECTRAL_INDICES
+    ]
+    if unknown:
+        raise ValueError(
+            f"unknown bands {unknown}, the bands must be in {OPTICAL_BANDS}, "
+            f"TEMPERATURE or {list(SPECTRAL_INDICES)}"
+        )
+
+    # Indices to calculate and optical bands to scale, also the bands
+    # needed by the indices
+    indices = [band for band in bands if band in SPECTRAL_INDICES]
+    needed = set(bands) | set(index_bands(indices))
+    optical = [band for band in OPTICAL_BANDS if band in needed]
+
+    def process(img: ee.Image) -> ee.Image:
+        img = ee.Image(img)
+        layers = []
+
+        # Scale the surface reflectance
+        if optical:
+            reflectance = (
+                img.select([names[band] for band in optical], optical)
+                   .multiply(0.0000275)
+                   .add(-0.2)
+            )
+            layers.append(reflectance)
+
+        # Scale the surface temperature to Kelvin
+        if "TEMPERATURE" in bands:
+            temperature = (
+                img.select([names["TEMPERATURE"]], ["TEMPERATURE"])
+                   .multiply(0.00341802)
+                   .add(149.0)
+            )
+            layers.append(temperature)
+
+        # Calculate all the indices with the scaled reflectance
+        if indices:
+            layers.append(index_image(reflectance, indices))
+
+        out = ee.Image.cat(layers).select(list(bands))
+
+        # Mask the clouds (bit 3) and the cloud shadows (bit 4)
+        if cloud_mask:
+            qa = img.select("QA_PIXEL")
+            clear = qa.bitwiseAnd(1 << 3).eq(0).And(qa.bitwiseAnd(1 << 4).eq(0))
+            out = out.updateMask(clear)
+
+        return ee.Image(out.copyProperties(img, img.propertyNames()))
+
+    return process
+
+def monthly_composites(
+    collection: ee.ImageCollection, start: str, end: str, bands: list[str]
+) -> ee.ImageCollection:
+    """
+    Function to calculate the monthly mean composites of an image collection
+    in one mapped pass over the list of months.
+
+    The months without images are filled with a fully masked image with the
+    same bands, so all the composites have the same bands.
+
+    Parameters
+    ----------
+    collection : ee.ImageCollection
+        Collection of interest, e.g. the Landsat 5, 7 and 8 collections
+        merged.
+
+    start : str
+        First month of the composites as "YYYY-MM-01".
 
-    # Add NDVI band to image
-    img = img.addBands(ndvi)
+    end : str
+        Month after the last composite as "YYYY-MM-01".
 
-    return img
\ No newline at end of file
+    bands : list[str]
+        Bands of the composites.
+
+    Returns
+    -------
+    composites : ee.ImageCollection
+        Collection with one image by month with the "date" property as
+        "01-MM-YYYY" and its index as "YYYY-MM-01".
+    """
+    # Define the list of months between the start and the end
+    start = ee.Date(start)
+    n_months = ee.Date(end).difference(start, "month").round()
+    months = ee.List.sequence(0, n_months.subtract(1))
+
+    # Fully masked image to use in the months without images, as float like
+    # the means, so all the bands of the stacks have the same type
+    empty = ee.Image.constant([0] * len(bands)).rename(bands).toFloat().updateMask(0)
+
+    def composite(n: ee.Number) -> ee.Image:
+        # Filter the images of the month
+        date = start.advance(n, "month")
+        images = collection.filterDate(date, date.advance(1, "month")).select(bands)
+
+        # Calculate the mean of the month, or use the empty image
+        img = ee.Image(ee.Algorithms.If(images.size().gt(0), images.mean().toFloat(), empty))
+
+        return img.set({
+            "date": date.format("dd-MM-yyyy"),
+            "system:index": date.format("yyyy-MM-dd"),
+            "system:time_start": date.millis(),
+        })
+
+    return ee.ImageCollection.fromImages(months.map(composite))
+
+
+def stack_composites(composites: ee.ImageCollection) -> ee.Image:
+    """
+    Function to stack a collection of composites in one multi-band image
+    to export it in one download.
+
+    Parameters
+    ----------
+    composites : ee.ImageCollection
+        Collection with the composites, e.g. from monthly_composites().
+
+    Returns
+    -------
+    img : ee.Image
+        Image with the bands of all composites ordered by date and named as
+        "YYYY-MM-01_BAND".
+    """
+    return composites.sort("system:time_start").toBands()
@@ -0,0 +1,180 @@
+# %% Imports
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# %% Constants
+# Columns and date format of the series exported from the IDEAM (DHIME)
+DATE_COLUMN = "Fecha"
+VALUE_COLUMN = "Valor"
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+# %% Functions
+def hash_file(path: str) -> str:
+    """
+    Function to get the SHA-1 hash of the content of a file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+
+    Returns
+    -------
+    digest : str
+        Hash of the file.
+    """
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def read_ideam_series(
+    path: str,
+    how: str = "mean",
+    name: str = VALUE_COLUMN,
+    chunksize: int = 100_000,
+    cache_dir: str | None = None,
+) -> pd.Series:
+    """
+    Function to read a series exported from the IDEAM and aggregate it to
+    monthly data.
+
+    Only the date and the value columns are read, in chunks that are
+    aggregated while they are read, so the size of the file doesn't matter.
+    The months without valid values are NaN.
+
+    Parameters
+    ----------
+    path : str
+        Path of the CSV file.
+
+    how : str = "mean"
+        Mean or Sum. The aggregation of the values of every month, e.g. sum
+        for daily precipitation and mean for discharge. For monthly series
+        both are the value of the month.
+
+    name : str = "Valor"
+        Name of the series.
+
+    chunksize : int = 100_000
+        Number of rows by chunk.
+
+    cache_dir : str | None = None
+        Folder to save the monthly series by hash of the file, so an
+        unchanged file is only read once. If it is not defined the file is
+        always read.
+
+    Returns
+    -------
+    series : pd.Series
+        Monthly series with the last day of the month as index.
+    """
+    how = how.lower()
+    if how not in ("mean", "sum"):
+        raise ValueError(f"how must be mean or sum, not {how}")
+
+    # Load the monthly series from the cache if the file didn't change
+    cache_path = None
+    if cache_dir is not None:
+        key = hashlib.sha1(f"{hash_file(path)}-{how}".encode()).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{key}.parquet")
+
+        if os.path.isfile(cache_path):
+            return pd.read_parquet(cache_path).iloc[:, 0].rename(name)
+
+    # Sum the values and count the valid values of every month, chunk by chunk
+    sums, counts = [], []
+
+    chunks = pd.read_csv(
+        path,
+        usecols=[DATE_COLUMN, VALUE_COLUMN],
+        dtype={VALUE_COLUMN: np.float64},
+        chunksize=chunksize,
+    )
+
+    for chunk in chunks:
+        months = pd.to_datetime(chunk[DATE_COLUMN], format=DATE_FORMAT).dt.to_period("M")
+        values = chunk[VALUE_COLUMN]
+
+        sums.append(values.groupby(months).sum())
+        counts.append(values.notna().groupby(months).sum())
+
+    sums = pd.concat(sums).groupby(level=0).sum()
+    counts = pd.concat(counts).groupby(level=0).sum()
+
+    # Fill the months without data between the first and the last one
+    periods = pd.period_range(sums.index.min(), sums.index.max(), freq="M")
+    sums = sums.reindex(periods, fill_value=0.0)
+    counts = counts.reindex(periods, fill_value=0)
+
+    if how == "mean":
+        values = sums / counts.where(counts > 0)
+    else:
+        values = sums.where(counts > 0)
+
+    series = pd.Series(
+        values.values,
+        index=periods.to_timestamp(how="end").normalize(),
+        name=name,
+    )
+    series.index.name = "Time"
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        series.to_frame().to_parquet(cache_path)
+
+    return series
+
+
+def read_ideam_stations(
+    paths: dict[str, str],
+    how: str = "mean",
+    max_workers: int = 8,
+    cache_dir: str | None = None,
+) -> pd.DataFrame:
+    """
+    Function to read the series of many stations exported from the IDEAM in
+    parallel, and aggregate them to monthly data with read_ideam_series().
+
+    Parameters
+    ----------
+    paths : dict[str, str]
+        Dictionary with the code of the stations as keys and the path of
+        their CSV files as values.
+
+    how : str = "mean"
+        Mean or Sum. The aggregation of the values of every month.
+
+    max_workers : int = 8
+        Maximum number of files read at the same time.
+
+    cache_dir : str | None = None
+        Folder to save the monthly series by hash of the file.
+
+    Returns
+    -------
+    data : pd.DataFrame
+        DataFrame with the monthly series of every station as columns, with
+        NaN in the months without data of every station.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            code: executor.submit(
+                read_ideam_series, path, how, str(code), cache_dir=cache_dir
+            )
+            for code, path in paths.items()
+        }
+
+        series = [future.result() for future in futures.values()]
+
+    data = pd.concat(series, axis=1).sort_index()
+    data.index.name = "Time"
+
+    return data
@@ -0,0 +1,279 @@
+# %% Imports
+import os
+import sys
+import glob
+import json
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# %% Typing imports
+from typing import Sequence
+
+# %% Functions
+def expand(patterns: Sequence[str]) -> list[str]:
+    """
+    Function to get the files that match a list of glob patterns.
+
+    Parameters
+    ----------
+    patterns : Sequence[str]
+        Paths or glob patterns.
+
+    Returns
+    -------
+    paths : list[str]
+        Sorted paths of the files.
+    """
+    paths = set()
+    for pattern in patterns:
+        paths.update(p for p in glob.glob(pattern) if os.path.isfile(p))
+
+    return sorted(paths)
+
+
+def hash_file(path: str, cache: dict[str, list] | None = None) -> str:
+    """
+    Function to get the SHA-256 hash of the content of a file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+
+    cache : dict[str, list] | None = None
+        Dictionary with the size, the modification time and the hash of the
+        files already hashed. If the size and the modification time of the
+        file didn't change, the hash in the cache is used.
+
+    Returns
+    -------
+    digest : str
+        Hash of the file.
+    """
+    stat = os.stat(path)
+
+    # Reuse the hash if the file didn't change
+    if cache is not None and path in cache:
+        size, mtime, digest = cache[path]
+        if size == stat.st_size and mtime == stat.st_mtime_ns:
+            return digest
+
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            sha.update(block)
+
+    digest = sha.hexdigest()
+
+    if cache is not None:
+        cache[path] = [stat.st_size, stat.st_mtime_ns, digest]
+
+    return digest
+
+
+def stage_dependencies(stages: dict[str, dict]) -> dict[str, set[str]]:
+    """
+    Function to find the stages that must run before every stage, that is,
+    the stages with an output used as input.
+
+    Parameters
+    ----------
+    stages : dict[str, dict]
+        Dictionary with the stages, see run_pipeline().
+
+    Returns
+    -------
+    dependencies : dict[str, set[str]]
+        Dictionary with the stages that every stage depends on.
+    """
+    return {
+        name: {
+            other for other, o in stages.items()
+            if other != name and set(stage.get("inputs", [])) & set(o.get("outputs", []))
+        }
+        for name, stage in stages.items()
+    }
+
+
+def run_pipeline(
+    stages: dict[str, dict],
+    targets: Sequence[str] | None = None,
+    state_path: str = ".pipeline_state.json",
+    max_workers: int = 2,
+    force: bool = False,
+    dry_run: bool = False,
+) -> dict[str, str]:
+    """
+    Function to run the stages of the pipeline that are out of date.
+
+    A stage is out of date if the content of its script, its arguments or
+    its inputs changed since its last run, or if its outputs are missing or
+    were modified. The stages run as soon as the stages they depend on
+    finished, so the independent stages run concurrently.
+
+    Parameters
+    ----------
+    stages : dict[str, dict]
+        Dictionary with the name of the stages as keys and their definition
+        as values, a dictionary with:
+            - "script": path of the Python script.
+            - "inputs": paths or glob patterns of the inputs.
+            - "outputs": paths or glob patterns of the outputs.
+            - "args": (optional) arguments of the script.
+            - "optional": (optional) if True, only run the stage when it is
+              in the targets, e.g. the downloads from Earth Engine.
+        A stage depends on another if one of its inputs is exactly one of
+        the outputs of the other.
+
+    targets : Sequence[str] | None = None
+        Stages to run with the stages they depend on. If it is not defined,
+        all stages that aren't optional will be run.
+
+    state_path : str = ".pipeline_state.json"
+        Path of the JSON file with the hashes of the last runs.
+
+    max_workers : int = 2
+        Maximum number of stages running at the same time.
+
+    force : bool = False
+        If True, run the target stages even if they are up to date.
+
+    dry_run : bool = False
+        If True, only report the stages that are out of date.
+
+    Returns
+    -------
+    status : dict[str, str]
+        Dictionary with the status of every stage: "done", "up to date",
+        "out of date" (in a dry run), "failed" or "skipped".
+    """
+    dependencies = stage_dependencies(stages)
+
+    # Define the stages to run, the targets and the stages they depend on,
+    # excluding the optional stages that aren't in the targets
+    if targets is None:
+        targets = [name for name, stage in stages.items() if not stage.get("optional")]
+
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name in selected:
+            continue
+        if name not in stages:
+            raise KeyError(f"stage {name} is not defined")
+
+        selected.add(name)
+        pending.extend(
+            d for d in dependencies[name]
+            if d in targets or not stages[d].get("optional")
+        )
+
+    # Load the state of the previous runs
+    state = {"stages": {}, "files": {}}
+    if os.path.isfile(state_path):
+        with open(state_path, "r") as f:
+            state = json.load(f)
+
+    lock = threading.Lock()
+
+    def save_state():
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, state_path)
+
+    def input_hash(stage: dict) -> str:
+        # Hash the script, the arguments and the content of the inputs
+        sha = hashlib.sha256()
+        sha.update(json.dumps(stage.get("args", [])).encode())
+        for path in [stage["script"]] + expand(stage.get("inputs", [])):
+            sha.update(path.encode())
+            sha.update(hash_file(path, state["files"]).encode())
+        return sha.hexdigest()
+
+    def output_hashes(stage: dict) -> dict[str, str] | None:
+        # Hash the outputs, None if some output is missing
+        outputs = {}
+        for pattern in stage.get("outputs", []):
+            paths = expand([pattern])
+            if not paths:
+                return None
+            outputs.update({p: hash_file(p, state["files"]) for p in paths})
+        return outputs
+
+    def run(name: str, stale: bool = False) -> str:
+        stage = stages[name]
+
+        # In a dry run, a stage that depends on a stage out of date is out
+        # of date too
+        if dry_run and stale:
+            return "out of date"
+
+        with lock:
+            inputs = input_hash(stage)
+            outputs = output_hashes(stage)
+            previous = state["stages"].get(name, {})
+
+        # Check if the stage is up to date
+        up_to_date = (
+            previous.get("inputs") == inputs
+            and outputs is not None
+            and previous.get("outputs") == outputs
+        )
+
+        if up_to_date and not (force and name in targets):
+            return "up to date"
+
+        if dry_run:
+            return "out of date"
+
+        # Run the script from the root of the repository
+        print(f"{name}: running {stage['script']}")
+        result = subprocess.run([sys.executable, stage["script"], *stage.get("args", [])])
+
+        if result.returncode != 0:
+            return "failed"
+
+        # Record the hashes of the inputs and the outputs
+        with lock:
+            state["stages"][name] = {
+                "inputs": input_hash(stage),
+                "outputs": output_hashes(stage) or {},
+            }
+            save_state()
+
+        return "done"
+
+    # Run every stage when the stages it depends on finished
+    status = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(status) < len(selected):
+            for name in sorted(selected - set(status) - set(running.values())):
+                deps = dependencies[name] & selected
+
+                # Skip the stages that depend on a failed stage
+                if any(status.get(d) in ("failed", "skipped") for d in deps):
+                    status[name] = "skipped"
+
+                # Run the stages whose dependencies finished
+                elif all(d in status for d in deps):
+                    stale = any(status[d] == "out of date" for d in deps)
+                    running[executor.submit(run, name, stale)] = name
+
+            if not running:
+                if len(status) < len(selected):
+                    raise ValueError("the stages have circular dependencies")
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status[name] = future.result()
+                print(f"{name}: {status[name]}")
+
+    return status
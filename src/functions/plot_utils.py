@@ -0,0 +1,480 @@
+# %% Imports
+import numpy as np
+import pandas as pd
+import xarray
+import geopandas as gpd
+import matplotlib.pyplot as plt
+from matplotlib.gridspec import GridSpec
+from matplotlib.ticker import MultipleLocator, NullLocator
+from matplotlib.dates import YearLocator
+
+from functions.stat_utils import cached_decompose, corr_matrix
+
+# %% Typing imports
+import numpy.typing as npt
+from typing import Sequence
+from matplotlib.figure import Figure
+
+# %% Constants
+# Colormap, limits and label of the colorbars of the maps of statistics
+SPATIAL_PLOT_OPTIONS = {
+    "mean": {
+        "NDVI": ("RdYlGn", 0, 1, "Mean NDVI"),
+        "Surface Temperature": ("Spectral_r", 28, 42, "Mean Surface Temperature [°C]"),
+    },
+    "std": {
+        "NDVI": ("RdYlGn", 0, 0.5, "StD NDVI"),
+        "Surface Temperature": ("Spectral_r", 4.0, 8.0, "StD Surface Temperature [°C]"),
+    },
+}
+
+# %% Functions
+def plot_ts_components(
+    data: pd.DataFrame,
+    figsize: Sequence[float] = (7, 4),
+    ENSO: npt.ArrayLike | None = None,
+    ENSO_keys: Sequence = ["Nina", "Nino"],
+    ENSO_scale: float = 0.05,
+    titles: dict[str, str] | None = None,
+    period: int = 12,
+) -> Figure:
+    """
+    Function to plot the time series components of all variables in a dataframe.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        Dataframe with the variables and time at index
+
+    figsize : Sequence[width, height]
+        Size of the figure.
+
+    ENSO : numpy.ndarray | None = None
+        Array use to plot ENSO phases stripes on time series.
+
+    ENSO_keys : Sequence = ["Nina", "Nino"]
+        ENSO Keys for La Niña ENSO cold phase and EL Niño ENSO warm phase,
+        respectively.
+
+    ENSO_scale : float = 0.05
+        Scale to plot the stripes.
+
+    titles : dict[str, str] | None = None
+        Custom titles for the time series.
+
+    period : int = 12
+        Period of the seasonality.
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        Figure with the TS components.
+
+    """
+    # Dictionary to store decomposed dataframes
+    decomposed_data = {}
+
+    # Like seasonal_decompose(), skip the variables with missing values
+    values = data.to_numpy(dtype=float)
+    valid = [v for j, v in enumerate(data.columns) if np.isfinite(values[:, j]).all()]
+
+    # Extract all the TS components of all variables at once, reusing the
+    # decompositions already calculated, and save them in the dictionary
+    observed = data[valid].to_numpy(dtype=float)
+    trend, seasonal, resid = cached_decompose(observed, period)
+
+    for j, variable in enumerate(valid):
+        decomposed_data[variable] = pd.DataFrame(
+            {
+                "Observed": observed[:, j],
+                "Trend": trend[:, j],
+                "Detrended": observed[:, j] - trend[:, j],
+                "Seasonal": seasonal[:, j],
+                "Anomalies": resid[:, j],
+            },
+            index=data.index,
+        )
+
+    # Get the variables to iterate them
+    variables = [k for k in decomposed_data.keys()]
+
+    # Create the figure and the axes
+    fig, axs = plt.subplots(figsize=figsize, nrows=5, ncols=len(variables), sharex=True)
+
+    # Iterate trought variables to plot them by column
+    for i, variable in enumerate(variables):
+        # Get the components
+        components = decomposed_data[variable].columns
+
+        # Iterate the components to plot the by row
+        for j, component in enumerate(components):
+            x = decomposed_data[variable].index
+            y = decomposed_data[variable][component]
+
+            # Plot ENSO Stripes if ENSO is an array
+            try:
+                ENSO.any()
+            except:
+                continue
+            else:
+                # Plot La Niña ENSO Phase stripes
+                axs[j, i].fill_between(
+                    x,
+                    np.min(y) - ENSO_scale * np.max(y),
+                    np.max(y) + ENSO_scale * np.max(y),
+                    where=ENSO == ENSO_keys[0],
+                    color="blue",
+                    alpha=0.2,
+                )
+
+                # Plot El Niño ENSO Phase stripes
+                axs[j, i].fill_between(
+                    x,
+                    np.min(y) - ENSO_scale * np.max(y),
+                    np.max(y) + ENSO_scale * np.max(y),
+                    where=ENSO == ENSO_keys[1],
+                    color="red",
+                    alpha=0.2,
+                )
+
+            # Plot data
+            axs[j, i].plot(x, y, color="black", lw=0.5)
+
+            # In the first row add the variable title
+            if j == 0:
+                if titles != None:
+                    axs[j, i].set_title(titles[variable], fontsize=8)
+                else:
+                    axs[j, i].set_title(variable, fontsize=8)
+
+            # In the first column add the component in the label
+            if i == 0:
+                axs[j, i].set_ylabel(component)
+
+            # In the last row add the time label
+            if j == 4:
+                axs[j, i].set_xlabel("Time [Y]")
+
+            # Set the x-ticks to multiples of 5 years and the minor ticks to 1 year
+            axs[j, i].xaxis.set_major_locator(YearLocator(5))
+            axs[j, i].xaxis.set_minor_locator(YearLocator(1))
+
+    # Align all the y-labels in the first column
+    fig.align_ylabels(axs[:, 0])
+
+    return fig
+
+
+def plot_acf_ccf(
+    data: dict[str, npt.ArrayLike],
+    ci: float,
+    ylims: Sequence[float] = [-1, 1],
+    titles: dict[str, str] | None = None,
+) -> Figure:
+    """
+    Function to plot ACF and CCF data previously calculated.
+
+    Paramters
+    ---------
+    data : dict[str, numpy.ndarray]
+        Dictinary with autocorrelation or cross-correlation data
+
+    ci : float
+        Confidence interval of correlation.
+
+    ylims :  Sequence[bottom, top] = [-1, 1]
+        Limits of correlation for the plot.
+
+    titles : dict[str, str] | None = None
+        Custom titles for the plots.
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        Figure with the correlations plots.
+
+    """
+    # Get the correlation tests from the data
+    tests = [t for t in data.keys()]
+    # Get how many there are to define the figure dimensions
+    n = len(tests)
+
+    # Show error if ylims is list don't have two elements
+    if len(ylims) != 2:
+        Exception("ylims must have lenght of 2")
+
+    # Create the figure and GridSpec for axes
+    fig = plt.figure()
+    grs = GridSpec(nrows=2, ncols=2, figure=fig)
+
+    # Define the figures axes based on n, where n more than 4 show error
+    match n:
+        case 1:
+            axs = [fig.add_subplot(grs[:, :])]
+            axs[0].set(xlabel="Lags [months]", ylabel="Correlation")
+        case 2:
+            axs = [fig.add_subplot(grs[0, :]), fig.add_subplot(grs[1, :])]
+            axs[0].set(ylabel="Correlation")
+            axs[1].set(xlabel="Lags [months]", ylabel="Correlation")
+        case 3:
+            axs = [
+                fig.add_subplot(grs[0, 0]),
+                fig.add_subplot(grs[1, :]),
+                fig.add_subplot(grs[0, 1]),
+            ]
+            axs[0].set(ylabel="Correlation")
+            axs[1].set(xlabel="Lags [months]", ylabel="Correlation")
+
+        case 4:
+            axs = [
+                fig.add_subplot(grs[0, 0]),
+                fig.add_subplot(grs[1, 0]),
+                fig.add_subplot(grs[0, 1]),
+                fig.add_subplot(grs[1, 1]),
+            ]
+            axs[0].set(ylabel="Correlation")
+            axs[1].set(xlabel="Lags [months]", ylabel="Correlation")
+            axs[3].set(xlabel="Lags [months]")
+
+        case _:
+            Exception("data must have a lenght lower or equal than 4")
+
+    # For loop to plot ACF o CCF by variable
+    for i, (test, ax) in enumerate(zip(tests, axs)):
+        # Plot correlation data as stem
+        ax.stem(data[test], basefmt=" ", markerfmt=" ")
+
+        # Add a line at 0 and the confidence intervals
+        ax.axhline(0, color="black")
+        ax.axhline(ci, color="black", linestyle="--")
+        ax.axhline(-ci, color="black", linestyle="--")
+
+        # If there are custon titles add them to the plot, else
+        # use the  default titles
+        if titles != None:
+            ax.set_title(titles[test], fontsize=8)
+        else:
+            ax.set_title(test, fontsize=8)
+
+        # Set ylims and ticks
+        ax.set_ylim(bottom=ylims[0], top=ylims[1])
+        ax.xaxis.set_major_locator(MultipleLocator(4))
+        ax.xaxis.set_minor_locator(MultipleLocator(1))
+
+    # Share all x and y axis
+    axs[0].get_shared_x_axes().join(*axs)
+    axs[0].get_shared_y_axes().join(*axs)
+
+    return fig
+
+
+def plot_corr_matrix(
+    data: pd.DataFrame,
+    variables: npt.ArrayLike | None = None,
+    half: bool = False,
+    hide_insignificants: bool = False,
+    singificant_threshold: float = 0.05,
+    show_labels: bool = True,
+    show_colorbar: bool = False,
+    palette: str = "Spectral",
+    text_color: str = "black",
+    pairwise_nan: bool = False,
+) -> Figure:
+    """
+    Calculate the pearson correlation matrix of the variables in a dataframe.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Dataframe with the variables to evaluate their correlation.
+
+    variables : ArrayLike | None = None
+        The variables of interest, if it is not defined, all variables in
+        the dataframe will be evaluated.
+
+    half : bool = False
+        If True, only show the corerlation of the first half of the matrix,
+        excluding the repeated correlation.
+
+    hide_insignifcants : bool = False
+        If True, hide all the correlation with a p-value greater than the
+        significant threshold.
+
+    siginificant_threshold : float = 0.05
+        Threshold of significant correlation.
+
+    show_labels : bool = True
+        Show the correlation value.
+
+    show_colorbar : bool = False
+        Show colorbar.
+
+    palette : str = Spectral
+        Color palette for correlation plot.
+
+    text_color : str = black
+        Color of text correlation labels.
+
+    pairwise_nan : bool = False
+        If True, calculate every correlation with the rows where both
+        variables are valid.
+
+    returns
+    -------
+    corr : pd.DataFrame
+        Dataframe with the correlation values.
+
+    """
+
+    # If variables are not defined get all columns from data
+    if variables == None:
+        variables = data.columns
+
+    # Get the number of variables
+    N = len(variables)
+
+    # Reverse variables for plot
+    reverse = variables[::-1]
+
+    # Get the correlation matrix
+    corr = corr_matrix(
+        data, variables, half, hide_insignificants, singificant_threshold, pairwise_nan
+    )
+
+    if show_colorbar:
+        fs = (4, 3)
+    else:
+        fs = (3, 3)
+
+    # Create the figure and the axes
+    fig = plt.figure(figsize=fs)
+    ax1 = plt.subplot(1, 1, 1)
+
+    # Plot matrix with pcolormesh
+    im1 = ax1.pcolormesh(
+        variables, reverse, corr, cmap=palette, edgecolor="w", vmin=-1, vmax=1
+    )
+
+    # Invert y axis
+    ax1.invert_yaxis()
+
+    # Add the colorbar
+    if show_colorbar:
+        cax = ax1.inset_axes([1.04, 0.1, 0.05, 0.8])
+        bar = plt.colorbar(im1, cax=cax, label="Correlation")
+
+    if show_labels:
+        x, y = np.meshgrid(np.arange(N), np.arange(N))
+        x = x.reshape(-1)
+        y = y.reshape(-1)
+        t = corr.values.reshape(-1)
+
+        for xi, yi, ti in zip(x, y, t):
+            if np.isfinite(ti):
+                ax1.text(
+                    xi,
+                    yi,
+                    round(ti, 2),
+                    color=text_color,
+                    size=8,
+                    ha="center",
+                    va="center",
+                )
+
+    # Rotate labels to improve their readability
+    ax1.set_xticklabels(variables, rotation=30)
+    ax1.xaxis.set_minor_locator(NullLocator())
+    ax1.yaxis.set_minor_locator(NullLocator())
+
+    return fig
+
+
+def plot_spatial_statistics(
+    data: xarray.Dataset,
+    boundary: gpd.GeoSeries,
+    statistic: str = "mean",
+    vertical: bool = False,
+    figsize: Sequence[float] = (5, 4),
+) -> Figure:
+    """
+    Function to plot the maps of a statistic over the time, e.g. the mean,
+    of the NDVI and the Surface Temperature of a cube, with the boundary of
+    the forest.
+
+    Parameters
+    ----------
+    data : xarray.Dataset
+        Dataset with the NDVI and the Surface Temperature reduced over the
+        time, e.g. cube.mean(dim="time").
+
+    boundary : geopandas.GeoSeries
+        Boundary of the forest.
+
+    statistic : str = "mean"
+        Mean or Std. The statistic in data, it defines the limits and the
+        labels of the colorbars, see SPATIAL_PLOT_OPTIONS.
+
+    vertical : bool = False
+        If True, plot the maps one over the other, else side by side.
+
+    figsize : Sequence[width, height] = (5, 4)
+        Size of the figure.
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        Figure with the maps.
+    """
+    options = SPATIAL_PLOT_OPTIONS[statistic.lower()]
+
+    # Create figure and axes
+    if vertical:
+        fig, (ax1, ax2) = plt.subplots(
+            figsize=figsize, nrows=2, ncols=1, sharex=True, sharey=True
+        )
+        width = 0.03
+    else:
+        fig, (ax1, ax2) = plt.subplots(
+            figsize=figsize, nrows=1, ncols=2, sharex=True, sharey=True
+        )
+        width = 0.07
+
+    # Add axes for colorbars
+    cax1 = ax1.inset_axes([1.05, 0.05, width, 0.90])
+    cax2 = ax2.inset_axes([1.05, 0.05, width, 0.90])
+
+    # Plot NDVI and Temperature
+    for ax, cax, variable in zip([ax1, ax2], [cax1, cax2], options):
+        cmap, vmin, vmax, _ = options[variable]
+        data[variable].plot(
+            ax=ax, cbar_ax=cax, vmin=vmin, vmax=vmax,
+            extend="neither", cmap=cmap
+        )
+
+    # Hide some labels
+    ax1.set_title("")
+    ax2.set_title("")
+
+    if vertical:
+        ax1.set_xlabel("")
+    else:
+        ax2.set_ylabel("")
+
+    # Add the forest
+    boundary.plot(ax=ax1, color="black", lw=1)
+    boundary.plot(ax=ax2, color="black", lw=1)
+
+    # Edit colorbars labels
+    for cax, variable in zip([cax1, cax2], options):
+        cax.set_ylabel(options[variable][3])
+
+    # Align colorbars labels
+    fig.align_ylabels([cax1, cax2])
+
+    # Set the ticks
+    ax2.yaxis.set_major_locator(MultipleLocator(0.02))
+    ax2.yaxis.set_minor_locator(MultipleLocator(0.01))
+    ax2.xaxis.set_major_locator(MultipleLocator(0.02))
+    ax2.xaxis.set_minor_locator(MultipleLocator(0.01))
+
+    return fig
@@ -0,0 +1,149 @@
+# %% Imports
+import os
+
+import numpy as np
+import pandas as pd
+import xarray
+
+# %% Constants
+# Minimum percentage of valid pixels of a month to use its mean values
+MIN_COVERAGE = 10.0
+
+# Landsat sensor by year, Landsat 5 before 1999, Landsat 7 from 1999 to 2013
+# and Landsat 8 after 2013, like in 2_download_rasters.py
+SENSOR_YEARS = [(1999, "L5"), (2014, "L7"), (np.inf, "L8")]
+
+# Quality indexes already loaded, by path and modification time
+_QUALITY_INDEXES = {}
+
+# %% Functions
+def sensor_names(times: np.ndarray) -> np.ndarray:
+    """
+    Function to get the Landsat sensor of every image by its date.
+
+    Parameters
+    ----------
+    times : numpy.ndarray
+        Dates of the images as datetime64.
+
+    Returns
+    -------
+    sensors : numpy.ndarray
+        Array with the sensor of every date, L5, L7 or L8.
+    """
+    years = pd.DatetimeIndex(times).year.values
+    limits = [limit for limit, _ in SENSOR_YEARS]
+    names = np.array([name for _, name in SENSOR_YEARS])
+
+    return names[np.searchsorted(limits, years, side="right")]
+
+
+def quality_index(
+    data: xarray.Dataset, mask: xarray.DataArray, variable: str = "NDVI"
+) -> xarray.Dataset:
+    """
+    Function to calculate the quality index of a cube inside a zone, e.g.
+    the forest, to save it with the cube.
+
+    Parameters
+    ----------
+    data : xarray.Dataset
+        Cube with the (time, latitude, longitude) variables.
+
+    mask : xarray.DataArray
+        Boolean (latitude, longitude) mask of the zone, e.g. from
+        zone_masks().
+
+    variable : str = "NDVI"
+        Variable to count the valid (not NaN) pixels.
+
+    Returns
+    -------
+    index : xarray.Dataset
+        Dataset with the valid pixels inside the zone (valid_count), the
+        fraction of the zone without data by clouds, shadows or gaps
+        (cloud_fraction) and the sensor of every time step, and the number
+        of valid time steps of every pixel (pixel_count). The number of
+        pixels of the zone is saved in the zone_pixels attribute.
+    """
+    valid = data[variable].notnull()
+    zone_pixels = int(mask.sum())
+
+    # Count the valid pixels inside the zone by time step, and the valid
+    # time steps by pixel
+    valid_count = valid.where(mask, False).sum(dim=mask.dims).astype("int32")
+    pixel_count = valid.sum(dim="time").astype("int32")
+
+    index = xarray.Dataset(
+        {
+            "valid_count": valid_count,
+            "cloud_fraction": 1 - valid_count / max(zone_pixels, 1),
+            "sensor": ("time", sensor_names(data["time"].values)),
+            "pixel_count": pixel_count,
+        },
+    ).compute()
+
+    index = index.drop_vars([c for c in index.coords if c not in index.dims])
+    index.attrs["zone_pixels"] = zone_pixels
+    index.attrs["variable"] = variable
+
+    return index
+
+
+def write_quality_index(index: xarray.Dataset, path: str) -> None:
+    """
+    Function to save a quality index. If the file already exists, the new
+    time steps are added to it, like append_cube() does with the cubes.
+
+    Parameters
+    ----------
+    index : xarray.Dataset
+        Quality index of the new time steps, from quality_index().
+
+    path : str
+        Path of the NetCDF file.
+    """
+    if os.path.isfile(path):
+        saved = read_quality_index(path)
+
+        if np.isin(index["time"].values, saved["time"].values).any():
+            raise ValueError(f"some time steps of index are already in {path}")
+
+        # Add the new time steps and their valid time steps by pixel
+        pixel_count = saved["pixel_count"] + index["pixel_count"]
+        index = xarray.concat(
+            [saved.drop_vars("pixel_count"), index.drop_vars("pixel_count")],
+            dim="time",
+        ).sortby("time")
+        index["pixel_count"] = pixel_count
+        index.attrs = saved.attrs
+
+    # Save in a temporal file and then move it, so an interrupted run never
+    # leaves a corrupted index
+    tmp_path = path + ".tmp"
+    index.to_netcdf(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def read_quality_index(path: str) -> xarray.Dataset:
+    """
+    Function to read a quality index. The index is kept in memory until its
+    file changes, so the next queries don't read it again.
+
+    Parameters
+    ----------
+    path : str
+        Path of the NetCDF file.
+
+    Returns
+    -------
+    index : xarray.Dataset
+        Quality index, see quality_index().
+    """
+    key = (os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+    if key not in _QUALITY_INDEXES:
+        with xarray.open_dataset(path) as index:
+            _QUALITY_INDEXES[key] = index.load()
+
+    return _QUALITY_INDEXES[key]
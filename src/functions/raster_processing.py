@@ -0,0 +1,245 @@
+# %% Imports
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+
+from rasterio.windows import Window, from_bounds
+
+# %% Typing imports
+from typing import Sequence
+from rasterio.coords import BoundingBox
+
+# %% Constants
+# Names of the bands of the images without descriptions by their number of
+# bands, exported with all the bands (before and after SWIR1 was added) or
+# only with the bands used (see ALL_BANDS and USED_BANDS in gee_processing).
+# The images split with names by split_stack() have descriptions
+BAND_LAYOUTS = {
+    7: ["BLUE", "GREEN", "RED", "NIR", "SWIR1", "TEMPERATURE", "NDVI"],
+    6: ["BLUE", "GREEN", "RED", "NIR", "TEMPERATURE", "NDVI"],
+    2: ["TEMPERATURE", "NDVI"],
+}
+
+# %% Functions
+def bounds_window(
+    bounds: Sequence[float], transform: rasterio.Affine, height: int, width: int
+) -> Window:
+    """
+    Function to get the window of whole pixels of an image that covers some
+    bounds, e.g. the bounds of a forest.
+
+    Parameters
+    ----------
+    bounds : Sequence[float]
+        Bounds to cover as (left, bottom, right, top), in the CRS of the
+        image.
+
+    transform : rasterio.Affine
+        Transform of the image.
+
+    height : int
+        Number of rows of the image.
+
+    width : int
+        Number of columns of the image.
+
+    Returns
+    -------
+    window : rasterio.windows.Window
+        Window of the pixels that intersect or touch the bounds, inside
+        the image.
+    """
+    window = from_bounds(*bounds, transform=transform)
+
+    # Expand the window to whole pixels, also the pixels that only touch
+    # the bounds like in the exports of Earth Engine, and clip it to the
+    # image
+    row_start = max(math.floor(window.row_off - 1e-6), 0)
+    col_start = max(math.floor(window.col_off - 1e-6), 0)
+    row_stop = min(math.ceil(window.row_off + window.height + 1e-6), height)
+    col_stop = min(math.ceil(window.col_off + window.width + 1e-6), width)
+
+    if row_stop <= row_start or col_stop <= col_start:
+        raise ValueError(f"The bounds {tuple(bounds)} don't intersect the image")
+
+    return Window.from_slices((row_start, row_stop), (col_start, col_stop))
+
+
+def band_names(path: str) -> list[str]:
+    """
+    Function to get the names of the bands of an image, from the
+    descriptions of its bands or from BAND_LAYOUTS by its number of bands
+    if it hasn't descriptions.
+
+    Parameters
+    ----------
+    path : str
+        Path of the image.
+
+    Returns
+    -------
+    names : list[str]
+        Names of the bands in their order, empty if they are unknown.
+    """
+    with rasterio.open(path, "r") as src:
+        return _band_names(src)
+
+
+def _band_names(src: rasterio.DatasetReader) -> list[str]:
+    """
+    Function to get the names of the bands of an opened image, see
+    band_names().
+    """
+    if all(src.descriptions):
+        return list(src.descriptions)
+
+    return BAND_LAYOUTS.get(src.count, [])
+
+
+def band_indexes(
+    src: rasterio.DatasetReader, bands: Sequence[int | str]
+) -> list[int]:
+    """
+    Function to find the index of some bands of an image by their names,
+    see band_names().
+
+    Parameters
+    ----------
+    src : rasterio.DatasetReader
+        Opened image.
+
+    bands : Sequence[int | str]
+        Names of the bands, e.g. ["TEMPERATURE", "NDVI"]. The integers are
+        used as the index of the band.
+
+    Returns
+    -------
+    indexes : list[int]
+        Index (starting at 1) of the bands.
+    """
+    names = _band_names(src)
+
+    indexes = []
+    for band in bands:
+        if isinstance(band, str):
+            if band not in names:
+                raise ValueError(f"{src.name} hasn't the band {band}")
+            band = names.index(band) + 1
+
+        indexes.append(band)
+
+    return indexes
+
+
+def read_window_cube(
+    paths: Sequence[str],
+    bands: Sequence[int | str],
+    bounds: Sequence[float] | None = None,
+    nodata: float | None = None,
+    offsets: dict[int | str, float] | None = None,
+    valid_ranges: dict[int | str, tuple[float | None, float | None]] | None = None,
+    dtype: str = "float32",
+    max_workers: int = 8,
+) -> tuple[dict[int | str, np.ndarray], BoundingBox]:
+    """
+    Function to read the same bands from the same window of a list of
+    GeoTIFFs into masked (time, lat, lon) cubes.
+
+    The header of the first image is read once to allocate one cube per
+    band with its final size, so the cubes are never copied while they
+    grow. The images are decoded in a pool of threads, every one reading
+    only the window and the bands of interest of its images directly into
+    their time step and masking them in place.
+
+    Parameters
+    ----------
+    paths : Sequence[str]
+        Paths of the images sorted by time. All of them must share the same
+        grid.
+
+    bands : Sequence[int | str]
+        Index (starting at 1) or name of the bands to read. The names are
+        found in every image with band_indexes(), so the images could have
+        different layouts.
+
+    bounds : Sequence[float] | None = None
+        Bounds to read as (left, bottom, right, top) in the CRS of the
+        images, e.g. the bounds of the forest. If it is not defined the
+        whole images are read.
+
+    nodata : float | None = None
+        Value of the masked pixels, e.g. the unmask value of the export. It
+        is replaced by NaN in all bands.
+
+    offsets : dict[int | str, float] | None = None
+        Value to add to some bands, e.g. {"TEMPERATURE": -273.15} to convert
+        a band from Kelvin to Celsius.
+
+    valid_ranges : dict[int | str, tuple[float | None, float | None]] | None = None
+        Minimum and maximum valid values by band, after add the offset. The
+        values outside the range are replaced by NaN, None means no limit.
+
+    dtype : str = "float32"
+        Floating data type of the cubes.
+
+    max_workers : int = 8
+        Maximum number of images decoded at the same time.
+
+    Returns
+    -------
+    cubes : dict[int | str, numpy.ndarray]
+        Dictionary with the cube of each band with shape (time, lat, lon).
+
+    bounds : rasterio.coords.BoundingBox
+        Bounds of the window.
+    """
+    offsets = offsets or {}
+    valid_ranges = valid_ranges or {}
+
+    # Read the header of the first image to define the window and the size
+    # of the cubes
+    with rasterio.open(paths[0], "r") as src:
+        grid = (src.height, src.width)
+
+        if bounds is None:
+            window = Window(0, 0, src.width, src.height)
+        else:
+            window = bounds_window(bounds, src.transform, src.height, src.width)
+
+        lims = BoundingBox(*src.window_bounds(window))
+        shape = (len(paths), int(window.height), int(window.width))
+
+    # Allocate the cubes with their final size
+    cubes = {band: np.empty(shape, dtype=dtype) for band in bands}
+
+    def decode(i: int, path: str) -> None:
+        with rasterio.open(path, "r") as src:
+            # Check that the image has the same grid than the first one
+            if (src.height, src.width) != grid:
+                raise ValueError(f"{path} has a different shape than {paths[0]}")
+
+            for band, index in zip(bands, band_indexes(src, bands)):
+                data = cubes[band][i]
+                src.read(index, window=window, out=data)
+
+                # Mask the pixels without data, add the offset and mask the
+                # values outside the valid range
+                if nodata is not None:
+                    data[data == nodata] = np.nan
+
+                if band in offsets:
+                    data += offsets[band]
+
+                low, high = valid_ranges.get(band, (None, None))
+                if low is not None:
+                    data[data < low] = np.nan
+                if high is not None:
+                    data[data > high] = np.nan
+
+    # Decode the images in parallel, every one in its own time step
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(decode, range(len(paths)), paths))
+
+    return cubes, lims
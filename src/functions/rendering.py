@@ -0,0 +1,301 @@
+# %% Imports
+import os
+import sys
+import json
+import inspect
+import types
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import xarray
+import matplotlib.pyplot as plt
+
+# %% Typing imports
+from typing import Any, Callable
+from matplotlib.figure import Figure
+
+# %% Constants
+# Jobs of the figures to render, set before the pool of processes is forked
+# so the workers inherit them instead of receiving them pickled
+_JOBS = {}
+
+# %% Functions
+def _local_modules(module: types.ModuleType) -> list[types.ModuleType]:
+    """
+    Function to find a module and the modules of the same project it uses,
+    also the ones used by them, e.g. functions.plot_utils and
+    functions.stat_utils. The modules outside the folder of the project,
+    e.g. numpy, are skipped.
+    """
+    # Folder of the project, the one with the top package of the module
+    root = os.path.dirname(os.path.abspath(inspect.getfile(module)))
+    for _ in range(module.__name__.count(".")):
+        root = os.path.dirname(root)
+
+    modules = {}
+    pending = [module]
+
+    while pending:
+        module = pending.pop()
+        if module.__name__ in modules:
+            continue
+
+        modules[module.__name__] = module
+
+        # The modules imported, and the modules of the functions, classes and
+        # objects imported from them
+        for value in list(vars(module).values()):
+            if not isinstance(value, types.ModuleType):
+                value = sys.modules.get(getattr(value, "__module__", None) or "")
+
+            path = getattr(value, "__file__", None)
+            if path is not None and os.path.abspath(path).startswith(root + os.sep):
+                pending.append(value)
+
+    return [modules[name] for name in sorted(modules)]
+
+
+def _hash_value(key: Any, value: Any) -> None:
+    """
+    Function to add the data of an argument of a figure to a hash, with the
+    hash of the values of the pandas objects and the bytes of the arrays, so
+    the hash doesn't depend on the process.
+    """
+    key.update(f"<{type(value).__module__}.{type(value).__qualname__}>".encode())
+
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        if isinstance(value, pd.DataFrame):
+            _hash_value(key, value.columns)
+            key.update(repr(value.dtypes.tolist()).encode())
+        else:
+            key.update(f"{value.name!r} {value.dtype}".encode())
+
+        key.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+
+        if not isinstance(value, pd.Index):
+            _hash_value(key, value.index)
+
+        crs = getattr(value, "crs", None)
+        key.update(repr(crs.to_wkt() if crs is not None else None).encode())
+
+    elif isinstance(value, (xarray.Dataset, xarray.DataArray)):
+        # The variables and the coordinates, with their attributes
+        if isinstance(value, xarray.DataArray):
+            variables = {**value.coords.variables, f"<{value.name}>": value.variable}
+        else:
+            variables = dict(value.variables)
+
+        for name in sorted(variables, key=str):
+            variable = variables[name]
+            key.update(f"{name!r} {variable.dims!r}".encode())
+            _hash_value(key, np.asarray(variable.values))
+            _hash_value(key, variable.attrs)
+
+        _hash_value(key, value.attrs)
+
+    elif isinstance(value, np.ndarray):
+        key.update(f"{value.dtype} {value.shape}".encode())
+
+        if value.dtype.hasobject:
+            _hash_value(key, value.tolist())
+        else:
+            key.update(np.ascontiguousarray(value).tobytes())
+
+    elif isinstance(value, (list, tuple)):
+        key.update(str(len(value)).encode())
+        for item in value:
+            _hash_value(key, item)
+
+    elif isinstance(value, dict):
+        key.update(str(len(value)).encode())
+        for name, item in value.items():
+            _hash_value(key, name)
+            _hash_value(key, item)
+
+    elif isinstance(value, (set, frozenset)):
+        _hash_value(key, sorted(value, key=repr))
+
+    elif isinstance(value, (types.FunctionType, type)):
+        key.update(f"{value.__module__}.{value.__qualname__}".encode())
+
+    else:
+        key.update(repr(value).encode())
+
+
+def figure_key(
+    function: Callable[..., Figure],
+    args: tuple = (),
+    kwargs: dict[str, Any] | None = None,
+    style: str | None = None,
+) -> str:
+    """
+    Function to get the hash of a figure, defined by the plot function, the
+    source code of its module and of the modules of the project it uses, the
+    data of its arguments and the style file.
+
+    Parameters
+    ----------
+    function : Callable[..., Figure]
+        Function that returns the figure.
+
+    args : tuple = ()
+        Positional arguments of the function.
+
+    kwargs : dict[str, Any] | None = None
+        Keyword arguments of the function.
+
+    style : str | None = None
+        Path of the matplotlib style file.
+
+    Returns
+    -------
+    key : str
+        Hash of the figure.
+    """
+    key = hashlib.sha1()
+
+    # The function, the code of its module and of the modules of the
+    # project it uses
+    key.update(f"{function.__module__}.{function.__qualname__}".encode())
+    for module in _local_modules(inspect.getmodule(function)):
+        key.update(module.__name__.encode())
+        key.update(inspect.getsource(module).encode())
+
+    # The data of the figure
+    _hash_value(key, (args, kwargs or {}))
+
+    # The style of the figure
+    if style is not None:
+        with open(style, "rb") as f:
+            key.update(f.read())
+
+    return key.hexdigest()
+
+
+def _render(path: str, style: str | None) -> str:
+    """
+    Function to create a figure of the jobs in a non-interactive backend,
+    save it and close it.
+    """
+    function, args, kwargs = _JOBS[path]
+
+    plt.switch_backend("Agg")
+
+    if style is not None:
+        plt.style.use(style)
+
+    fig = function(*args, **kwargs)
+    fig.savefig(path)
+    plt.close(fig)
+
+    return path
+
+
+def render_figures(
+    jobs: dict[str, tuple],
+    manifest_path: str,
+    style: str | None = "src/style.mplstyle",
+    max_workers: int | None = None,
+    force: bool = False,
+) -> dict[str, str]:
+    """
+    Function to create and save figures in parallel, skipping the figures
+    whose data, style and code didn't change since they were saved.
+
+    The figures are created in a pool of processes forked from the current
+    one, which inherit the data of the figures instead of receiving it
+    pickled. The fork is only safe while the process has no other threads,
+    e.g. the ones of dask after a compute() or of a previous pool, so in
+    that case, and where fork isn't available (e.g. Windows), the figures
+    are created one after another in the current process. Every figure is
+    closed after save it, so only the open figures are kept in memory. To
+    check which figures changed, the data of the arguments of every figure
+    is hashed, see figure_key().
+
+    Parameters
+    ----------
+    jobs : dict[str, tuple]
+        Dictionary with the path of the figure as key and a tuple with the
+        plot function, its positional arguments and (optional) its keyword
+        arguments as value, e.g. {"a.svg": (plot_acf_ccf, (data, ci))}. The
+        function must be importable from a module and return the figure.
+
+    manifest_path : str
+        Path of the JSON file with the hashes of the saved figures.
+
+    style : str | None = "src/style.mplstyle"
+        Path of the matplotlib style file to use in the figures.
+
+    max_workers : int | None = None
+        Maximum number of processes, by default the number of CPUs.
+
+    force : bool = False
+        If True, create all figures even if they didn't change.
+
+    Returns
+    -------
+    status : dict[str, str]
+        Dictionary with the status of every figure, "done" or "up to date".
+    """
+    # Load the hashes of the figures of the previous runs
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+
+    # Find the figures that changed
+    status = {}
+    pending = {}
+    for path, job in jobs.items():
+        function, args, kwargs = (tuple(job) + ({},))[:3]
+        key = figure_key(function, args, kwargs, style)
+
+        if not force and manifest.get(path) == key and os.path.isfile(path):
+            status[path] = "up to date"
+        else:
+            pending[path] = (function, args, kwargs, key)
+
+    # Create the figures in processes forked from this one, with the jobs
+    # in memory, or one after another in this process
+    _JOBS.update({path: job[:3] for path, job in pending.items()})
+
+    try:
+        if (
+            len(pending) > 1
+            and "fork" in multiprocessing.get_all_start_methods()
+            and threading.active_count() == 1
+        ):
+            context = multiprocessing.get_context("fork")
+            workers = min(max_workers or os.cpu_count() or 1, len(pending))
+
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = [executor.submit(_render, path, style) for path in pending]
+
+                for future in as_completed(futures):
+                    status[future.result()] = "done"
+        else:
+            for path in pending:
+                status[_render(path, style)] = "done"
+    finally:
+        _JOBS.clear()
+
+    # Save the hashes of the new figures
+    manifest.update({path: key for path, (*_, key) in pending.items()})
+
+    folder = os.path.dirname(manifest_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+    for path in jobs:
+        print(f"{path}: {status[path]}")
+
+    return status
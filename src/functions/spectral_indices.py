@@ -0,0 +1,129 @@
+# %% Imports
+import ast
+
+import numpy as np
+
+# %% Typing imports
+from typing import Any, Mapping, Sequence
+
+# %% Constants
+# Spectral indices as band algebra of the scaled surface reflectance. The
+# same expressions are evaluated in Earth Engine (see gee_processing) and
+# locally with NumPy, so they only use the bands names, numbers, + - * /
+# ** and parentheses
+SPECTRAL_INDICES = {
+    "NDVI": "(NIR - RED) / (NIR + RED)",
+    "EVI": "2.5 * (NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1)",
+    "NDWI": "(GREEN - NIR) / (GREEN + NIR)",
+    "SAVI": "1.5 * (NIR - RED) / (NIR + RED + 0.5)",
+    "NDMI": "(NIR - SWIR1) / (NIR + SWIR1)",
+}
+
+# Operators allowed in the expressions
+_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.Pow: np.power,
+}
+
+# %% Functions
+def _parse(index: str) -> ast.Expression:
+    """
+    Function to parse the expression of a spectral index.
+    """
+    if index not in SPECTRAL_INDICES:
+        raise ValueError(
+            f"unknown index {index}, the indices must be in {list(SPECTRAL_INDICES)}"
+        )
+
+    return ast.parse(SPECTRAL_INDICES[index], mode="eval")
+
+
+def _evaluate(node: ast.AST, bands: Mapping[str, Any]) -> Any:
+    """
+    Function to evaluate a node of the expression of a spectral index with
+    the bands.
+    """
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body, bands)
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        return _OPERATORS[type(node.op)](
+            _evaluate(node.left, bands), _evaluate(node.right, bands)
+        )
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return np.negative(_evaluate(node.operand, bands))
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+
+    if isinstance(node, ast.Name):
+        return bands[node.id]
+
+    raise ValueError(f"unsupported operation in a spectral index: {ast.unparse(node)}")
+
+
+def index_bands(indices: Sequence[str]) -> list[str]:
+    """
+    Function to get the bands needed to calculate some spectral indices.
+
+    Parameters
+    ----------
+    indices : Sequence[str]
+        Names of the indices, from SPECTRAL_INDICES.
+
+    Returns
+    -------
+    bands : list[str]
+        Names of the bands used by the indices, without repeats.
+    """
+    bands = []
+    for index in indices:
+        for node in ast.walk(_parse(index)):
+            if isinstance(node, ast.Name) and node.id not in bands:
+                bands.append(node.id)
+
+    return bands
+
+
+def spectral_indices(
+    bands: Mapping[str, Any], indices: Sequence[str]
+) -> dict[str, Any]:
+    """
+    Function to calculate spectral indices locally, with the same
+    expressions evaluated in Earth Engine, as vectorized band algebra.
+
+    Parameters
+    ----------
+    bands : Mapping[str, Any]
+        Scaled surface reflectance by band name, as arrays of any shape,
+        e.g. the (time, lat, lon) cubes of read_window_cube() or the
+        variables of a xarray.Dataset.
+
+    indices : Sequence[str]
+        Names of the indices to calculate, from SPECTRAL_INDICES.
+
+    Returns
+    -------
+    indices : dict[str, Any]
+        Dictionary with the array of every index, NaN where its denominator
+        is 0.
+    """
+    missing = [band for band in index_bands(indices) if band not in bands]
+    if missing:
+        raise ValueError(f"the bands {missing} are needed to calculate {list(indices)}")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = {index: _evaluate(_parse(index), bands) for index in indices}
+
+    # Replace the infinite values of the divisions by 0 with NaN
+    for index, value in values.items():
+        if isinstance(value, np.ndarray):
+            value[np.isinf(value)] = np.nan
+        elif hasattr(value, "where"):
+            values[index] = value.where(~np.isinf(value))
+
+    return values
@@ -1,21 +1,28 @@
 # %% Dependencies imports
+import os
+import hashlib
+import warnings
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
-from statsmodels.tsa.seasonal import seasonal_decompose
-from scipy.stats import pearsonr
-import matplotlib.pyplot as plt
-from matplotlib.gridspec import GridSpec
-from matplotlib.ticker import MultipleLocator, NullLocator
-from matplotlib.dates import YearLocator
+from scipy.special import stdtr
 
 # %% Typing imports
 import numpy.typing as npt
 from typing import Sequence
-from matplotlib.figure import Figure
+
+# %% Constants
+# Decompositions already calculated by content of the series, period and
+# model, the least recently used are removed when they exceed the limit
+_DECOMPOSITIONS = OrderedDict()
+_DECOMPOSITIONS_LOCK = threading.Lock()
+_DECOMPOSITIONS_OPTIONS = {"max_bytes": 256 * 2**20, "cache_dir": None, "bytes": 0}
 
 # %% Functions
 def na_seadec(
-    x: pd.Series, method: str = "linear", model: str = "additive"
+    x: pd.Series, method: str = "linear", model: str = "additive", period: int = 12
 ) -> pd.Series:
     """
     Function to interpolate the NaN values in a series but without affect
@@ -45,6 +52,9 @@ def na_seadec(
         function documentation:
         https://www.statsmodels.org/dev/generated/statsmodels.tsa.seasonal.seasonal_decompose.html
 
+    period : int = 12
+        Period of the seasonality.
+
     Returns
     -------
     x : pd.Series
@@ -60,15 +70,16 @@ def na_seadec(
     # Interpolate the original series
     interpolated = x.interpolate(method=method)
 
-    # Decompose the series with seasonal_decompose from statsmodels
-    components = seasonal_decompose(interpolated, model=model, extrapolate_trend="freq")
+    # Decompose the series like seasonal_decompose from statsmodels, reusing
+    # the decomposition if it was already calculated
+    trend, seasonal, resid = cached_decompose(interpolated.to_numpy(), period, model)
 
     # Sum the trend with the residuals to get the series without
     # seasonality
     if model == "additive":
-        ts_no_seasonal = components.trend + components.resid
+        ts_no_seasonal = trend + resid
     else:
-        ts_no_seasonal = components.trend / components.resid
+        ts_no_seasonal = trend / resid
 
     # Restor the NaN values
     ts_no_seasonal[mask] = np.nan
@@ -81,9 +92,9 @@ def na_seadec(
 
     # Add the seasonality to the interpolated data
     if model == "additive":
-        x2 = x2 + components.seasonal
+        x2 = x2 + seasonal
     else:
-        x2 = x2 / components.seasonal
+        x2 = x2 / seasonal
 
     # Fill the NaN with the interpolated data
     x[mask] = x2[mask]
@@ -91,40 +102,559 @@ def na_seadec(
     return x
 
 
+def interpolate_columns(values: np.ndarray) -> np.ndarray:
+    """
+    Function to linearly interpolate the NaN values of every column of a
+    2-D array at once.
+
+    The NaN values before the first valid value or after the last valid
+    value of a column are filled with that value. The columns without valid
+    values are kept as NaN.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Array with shape (time, series) with the NaN values to interpolate.
+
+    Returns
+    -------
+    interpolated : numpy.ndarray
+        Array with the NaN values interpolated.
+    """
+    n, m = values.shape
+    valid = np.isfinite(values)
+    rows = np.arange(n)[:, None]
+    cols = np.arange(m)[None, :]
+
+    # Find the position of the previous and the next valid value
+    before = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    after = np.minimum.accumulate(np.where(valid, rows, n)[::-1], axis=0)[::-1]
+
+    # On the edges use the only valid neighbour
+    before, after = np.where(before < 0, after, before), np.where(after >= n, before, after)
+    before = np.clip(before, 0, n - 1)
+    after = np.clip(after, 0, n - 1)
+
+    # Interpolate between the neighbours
+    span = after - before
+    weight = np.divide(rows - before, span, out=np.zeros((n, m)), where=span > 0)
+
+    return values[before, cols] + weight * (values[after, cols] - values[before, cols])
+
+
+def moving_average_trend(
+    values: np.ndarray, period: int = 12, extrapolate: bool = True
+) -> np.ndarray:
+    """
+    Function to calculate the centered moving average trend of every column
+    of a 2-D array with cumulative sums.
+
+    The filter and the linear extrapolation of the edges are the same of
+    statsmodels.tsa.seasonal.seasonal_decompose() with
+    extrapolate_trend="freq".
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Array with shape (time, series).
+
+    period : int = 12
+        Period of the seasonality.
+
+    extrapolate : bool = True
+        If True, extrapolate the trend in the edges with a linear fit of
+        the closest period points, else keep them as NaN.
+
+    Returns
+    -------
+    trend : numpy.ndarray
+        Array with the trend of every column.
+    """
+    n, m = values.shape
+    half = period // 2
+
+    if n < 2 * period:
+        raise ValueError(f"values must have {2 * period} observations, it has {n}")
+
+    # Cumulative sums of the values and of the NaN values, to know if a
+    # window has NaN values
+    invalid = ~np.isfinite(values)
+    csum = np.zeros((n + 1, m))
+    cnan = np.zeros((n + 1, m))
+    np.cumsum(np.where(invalid, 0.0, values), axis=0, out=csum[1:])
+    np.cumsum(invalid, axis=0, out=cnan[1:])
+
+    # Sums of all windows with length period
+    sums = csum[period:] - csum[:-period]
+    nans = cnan[period:] - cnan[:-period]
+
+    # With an even period the filter has weights of 0.5 in the edges, that
+    # is the mean of two consecutive windows
+    if period % 2 == 0:
+        ma = (sums[:-1] + sums[1:]) / (2 * period)
+        nans = nans[:-1] + nans[1:]
+    else:
+        ma = sums / period
+
+    ma[nans > 0] = np.nan
+
+    trend = np.full((n, m), np.nan)
+    trend[half : half + ma.shape[0]] = ma
+
+    if not extrapolate:
+        return trend
+
+    # Extrapolate the edges with a least squares line of the closest
+    # period points to the edges
+    front = half
+    back = half + ma.shape[0] - 1
+
+    def linear_fit(start: int, stop: int) -> tuple[np.ndarray, np.ndarray]:
+        x = np.arange(start, stop)[:, None]
+        y = trend[start:stop]
+        xm = x.mean()
+        slope = ((x - xm) * (y - y.mean(axis=0))).sum(axis=0) / ((x - xm) ** 2).sum()
+        return slope, y.mean(axis=0) - slope * xm
+
+    slope, intercept = linear_fit(front, min(front + period, back))
+    trend[:front] = np.arange(0, front)[:, None] * slope + intercept
+
+    slope, intercept = linear_fit(max(front, back - period), back)
+    trend[back + 1 :] = np.arange(back + 1, n)[:, None] * slope + intercept
+
+    return trend
+
+
+def decompose_columns(
+    values: np.ndarray, period: int = 12, model: str = "additive"
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Function to decompose every column of a 2-D array at once, with the
+    same algorithm of statsmodels.tsa.seasonal.seasonal_decompose() with
+    extrapolate_trend="freq".
+
+    The NaN values are not interpolated, so the columns with NaN values get
+    NaN in their components.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Array with shape (time, series).
+
+    period : int = 12
+        Period of the seasonality.
+
+    model : str = "additive"
+        Additive or Multiplicative. The kind of model to decompose the
+        time series.
+
+    Returns
+    -------
+    trend : numpy.ndarray
+        Trend of every column.
+
+    seasonal : numpy.ndarray
+        Seasonal component of every column.
+
+    resid : numpy.ndarray
+        Residuals of every column.
+    """
+    n, m = values.shape
+
+    # Get the trend and remove it
+    trend = moving_average_trend(values, period)
+
+    if model == "additive":
+        detrended = values - trend
+    else:
+        detrended = values / trend
+
+    # Mean of every period phase, padding the series to complete periods
+    padded = np.full((-(-n // period) * period, m), np.nan)
+    padded[:n] = detrended
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        averages = np.nanmean(padded.reshape(-1, period, m), axis=0)
+
+    # Center the seasonal indexes and repeat them over the time
+    if model == "additive":
+        averages -= averages.mean(axis=0)
+    else:
+        averages /= averages.mean(axis=0)
+
+    seasonal = np.tile(averages, (n // period + 1, 1))[:n]
+
+    if model == "additive":
+        resid = detrended - seasonal
+    else:
+        resid = values / seasonal / trend
+
+    return trend, seasonal, resid
+
+
+def set_decomposition_cache(
+    max_bytes: int | None = None, cache_dir: str | None = None
+) -> None:
+    """
+    Function to define the limits of the cache of decompositions used by
+    cached_decompose().
+
+    Parameters
+    ----------
+    max_bytes : int | None = None
+        Maximum memory of the decompositions kept in memory, by default
+        256 MB. The least recently used are removed first. If it is not
+        defined, the limit is not changed.
+
+    cache_dir : str | None = None
+        Folder to also save the decompositions on disk, so they are reused
+        by other runs. If it is not defined they are only kept in memory.
+    """
+    with _DECOMPOSITIONS_LOCK:
+        if max_bytes is not None:
+            _DECOMPOSITIONS_OPTIONS["max_bytes"] = max_bytes
+        _DECOMPOSITIONS_OPTIONS["cache_dir"] = cache_dir
+        _evict_decompositions()
+
+
+def clear_decomposition_cache() -> None:
+    """
+    Function to remove all the decompositions kept in memory.
+    """
+    with _DECOMPOSITIONS_LOCK:
+        _DECOMPOSITIONS.clear()
+        _DECOMPOSITIONS_OPTIONS["bytes"] = 0
+
+
+def _evict_decompositions() -> None:
+    """
+    Function to remove the least recently used decompositions until they
+    fit in the memory limit.
+    """
+    while _DECOMPOSITIONS and _DECOMPOSITIONS_OPTIONS["bytes"] > _DECOMPOSITIONS_OPTIONS["max_bytes"]:
+        _, components = _DECOMPOSITIONS.popitem(last=False)
+        _DECOMPOSITIONS_OPTIONS["bytes"] -= components.nbytes
+
+
+def cached_decompose(
+    values: np.ndarray, period: int = 12, model: str = "additive"
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Function to decompose every column of a 2-D array like
+    decompose_columns(), reusing the decompositions of the columns already
+    decomposed.
+
+    Every column is identified by the hash of its values, the period and the
+    model, so the same series decomposed by different functions, e.g. by
+    plot_ts_components() and detrend_variables(), is only decomposed once.
+    The columns not found are decomposed together.
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Array with shape (time, series) or (time,).
+
+    period : int = 12
+        Period of the seasonality.
+
+    model : str = "additive"
+        Additive or Multiplicative. The kind of model to decompose the
+        time series.
+
+    Returns
+    -------
+    trend : numpy.ndarray
+        Trend of every column.
+
+    seasonal : numpy.ndarray
+        Seasonal component of every column.
+
+    resid : numpy.ndarray
+        Residuals of every column.
+    """
+    values = np.asarray(values, dtype=float)
+
+    if values.ndim == 1:
+        return tuple(c[:, 0] for c in cached_decompose(values[:, None], period, model))
+
+    n, m = values.shape
+    cache_dir = _DECOMPOSITIONS_OPTIONS["cache_dir"]
+
+    # Define the key of every column
+    keys = []
+    for j in range(m):
+        key = hashlib.sha1(np.ascontiguousarray(values[:, j]).tobytes())
+        key.update(f"{n}-{period}-{model}".encode())
+        keys.append(key.hexdigest())
+
+    # Components with shape (3, time, series)
+    components = np.empty((3, n, m))
+    missing = []
+
+    with _DECOMPOSITIONS_LOCK:
+        for j, key in enumerate(keys):
+            if key in _DECOMPOSITIONS:
+                _DECOMPOSITIONS.move_to_end(key)
+                components[:, :, j] = _DECOMPOSITIONS[key]
+            else:
+                missing.append(j)
+
+    # Look for the missing columns on disk
+    found = []
+    if cache_dir is not None:
+        for j in missing:
+            path = os.path.join(cache_dir, f"{keys[j]}.npy")
+            if os.path.isfile(path):
+                components[:, :, j] = np.load(path)
+                found.append(j)
+
+        missing = sorted(set(missing) - set(found))
+
+    # Decompose the missing columns together
+    if missing:
+        components[:, :, missing] = decompose_columns(values[:, missing], period, model)
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            for j in missing:
+                # Save them atomically, the forked processes could save the
+                # same decomposition at the same time
+                path = os.path.join(cache_dir, f"{keys[j]}.npy")
+                with open(f"{path}.{os.getpid()}.tmp", "wb") as f:
+                    np.save(f, components[:, :, j])
+                os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+    # Keep the new decompositions in memory
+    with _DECOMPOSITIONS_LOCK:
+        for j in missing + found:
+            if keys[j] not in _DECOMPOSITIONS:
+                _DECOMPOSITIONS[keys[j]] = components[:, :, j].copy()
+                _DECOMPOSITIONS_OPTIONS["bytes"] += _DECOMPOSITIONS[keys[j]].nbytes
+        _evict_decompositions()
+
+    return components[0], components[1], components[2]
+
+
+def na_seadec_batch(
+    data: pd.DataFrame | np.ndarray,
+    columns: Sequence[str] | None = None,
+    groupby: str | None = None,
+    period: int = 12,
+    model: str = "additive",
+    cache: bool = True,
+) -> pd.DataFrame | np.ndarray:
+    """
+    Function to interpolate the NaN values of many series at once with the
+    same algorithm of na_seadec() and linear interpolation.
+
+    All the series with the same length are decomposed and interpolated
+    together in NumPy, column by column.
+
+    Parameters
+    ----------
+    data : pd.DataFrame | numpy.ndarray
+        Array with shape (time, series) or dataframe with the time in the
+        index and the series as columns. If groupby is defined, it is a
+        long dataframe with the groups one after the other.
+
+    columns : Sequence[str] | None = None
+        Columns of the dataframe to interpolate, if it is not defined all
+        numeric columns will be interpolated.
+
+    groupby : str | None = None
+        Column with the groups of a long dataframe, e.g. "Lagoon". Every
+        group is interpolated as its own series.
+
+    period : int = 12
+        Period of the seasonality.
+
+    model : str = "additive"
+        Additive or Multiplicative. The kind of model to decompose the
+        time series.
+
+    cache : bool = True
+        If True, reuse the decompositions already calculated with
+        cached_decompose(). Disable it for series decomposed only once,
+        e.g. the pixels of a cube, to not fill the cache.
+
+    Returns
+    -------
+    data : pd.DataFrame | numpy.ndarray
+        Copy of the data with the NaN values interpolated.
+    """
+    # Arrays are interpolated directly
+    if not isinstance(data, pd.DataFrame):
+        values = np.asarray(data, dtype=float)
+
+        if values.ndim == 1:
+            return _na_seadec_columns(values[:, None], period, model, cache)[:, 0]
+
+        return _na_seadec_columns(values, period, model, cache)
+
+    data = data.copy()
+
+    # If columns is not defined, take all numeric columns
+    if columns is None:
+        columns = [c for c in data.select_dtypes("number").columns if c != groupby]
+
+    columns = list(columns)
+
+    # Define the rows of every group
+    if groupby is None:
+        groups = [np.arange(data.shape[0])]
+    else:
+        groups = [
+            np.flatnonzero(data[groupby].to_numpy() == g)
+            for g in data[groupby].unique()
+        ]
+
+    # Join the groups with the same length to interpolate them together
+    lengths = {}
+    for rows in groups:
+        lengths.setdefault(len(rows), []).append(rows)
+
+    values = data[columns].to_numpy(dtype=float, copy=True)
+
+    for same_length in lengths.values():
+        # Put the columns of every group side by side
+        block = np.hstack([values[rows] for rows in same_length])
+        block = _na_seadec_columns(block, period, model, cache)
+
+        # Restore the columns to their groups
+        for i, rows in enumerate(same_length):
+            values[rows] = block[:, i * len(columns) : (i + 1) * len(columns)]
+
+    data[columns] = values
+
+    return data
+
+
+def _na_seadec_columns(
+    values: np.ndarray, period: int = 12, model: str = "additive", cache: bool = True
+) -> np.ndarray:
+    """
+    Function with the na_seadec() algorithm for every column of a 2-D array.
+    """
+    # Find the NaN values and interpolate the original series
+    mask = np.isnan(values)
+    interpolated = interpolate_columns(values)
+
+    # Decompose the series and remove the seasonality
+    if cache:
+        trend, seasonal, resid = cached_decompose(interpolated, period, model)
+    else:
+        trend, seasonal, resid = decompose_columns(interpolated, period, model)
+
+    if model == "additive":
+        no_seasonal = trend + resid
+    else:
+        no_seasonal = trend / resid
+
+    # Restore the NaN values and interpolate the series without seasonality
+    no_seasonal[mask] = np.nan
+    no_seasonal = interpolate_columns(no_seasonal)
+
+    # Add the seasonality to the interpolated data
+    if model == "additive":
+        no_seasonal += seasonal
+    else:
+        no_seasonal /= seasonal
+
+    # Fill the NaN with the interpolated data
+    values = values.copy()
+    values[mask] = no_seasonal[mask]
+
+    return values
+
+
 def detrend_variables(
-    data: pd.DataFrame, variables: npt.ArrayLike | None = None
+    data: pd.DataFrame,
+    variables: npt.ArrayLike | None = None,
+    groupby: str | None = None,
+    period: int = 12,
 ) -> pd.DataFrame:
     """
     Function to detrend de variables of a dataframe.
 
+    The trend is the centered moving average with the edges extrapolated,
+    like in seasonal_decompose() with extrapolate_trend="freq". All the
+    variables of all the groups with the same length are detrended at once
+    with moving_average_trend(), reusing the trends already calculated with
+    cached_decompose().
+
     Parameters
     ----------
     data : pd.DataFrame
-        Dataframe with the variables to detrend.
+        Dataframe with the variables to detrend, sorted by time. If groupby
+        is defined, it is a long dataframe with the groups one after the
+        other.
 
     variables : ArrayLike | None = None
-        Variables of interest.
+        Variables of interest, if it is not defined all numeric variables
+        will be detrended.
+
+    groupby : str | None = None
+        Column with the groups of a long dataframe, e.g. "Lagoon". Every
+        group is detrended as its own series.
+
+    period : int = 12
+        Period of the moving average.
 
     Returns
     -------
     dat2 : pd.DataFrame
-        Dataframes with the variables detrended.
+        Dataframes with the variables detrended. The variables without
+        data in a group, e.g. the Discharge of a lagoon without river, are
+        kept as NaN.
 
     """
     # Create a copy of the original dataframe
     dat2 = data.copy()
 
-    # If variables is not defined, take all variables in the dataframe
-    if variables == None:
-        variablles = data.columns
+    # If variables is not defined, take all numeric variables in the dataframe
+    if variables is None:
+        variables = [c for c in data.select_dtypes("number").columns if c != groupby]
+
+    variables = list(variables)
+
+    # Define the rows of every group
+    if groupby is None:
+        groups = [np.arange(data.shape[0])]
+    else:
+        groups = [
+            np.flatnonzero(data[groupby].to_numpy() == g)
+            for g in data[groupby].unique()
+        ]
+
+    values = data[variables].to_numpy(dtype=float, copy=True)
+
+    # Like seasonal_decompose(), the series can't have missing values, only
+    # the series without data at all are skipped
+    for rows in groups:
+        invalid = np.isnan(values[rows])
+        partial = invalid.any(axis=0) & ~invalid.all(axis=0)
 
-    # Iterate throught variables
-    for variable in variables:
-        # Decompose the variable
-        components = seasonal_decompose(dat2[variable], extrapolate_trend="freq")
+        if partial.any():
+            raise ValueError(
+                f"{[variables[i] for i in np.flatnonzero(partial)]} have missing values"
+            )
 
-        # Save the detrended data in the second dataframe
-        dat2[variable] = components.observed - components.trend
+    # Join the groups with the same length to detrend them together
+    lengths = {}
+    for rows in groups:
+        lengths.setdefault(len(rows), []).append(rows)
+
+    for same_length in lengths.values():
+        # Put the variables of every group side by side
+        block = np.hstack([values[rows] for rows in same_length])
+        block = block - cached_decompose(block, period)[0]
+
+        # Restore the variables to their groups
+        for i, rows in enumerate(same_length):
+            values[rows] = block[:, i * len(variables) : (i + 1) * len(variables)]
+
+    dat2[variables] = values
 
     return dat2
 
@@ -135,10 +665,14 @@ def corr_matrix(
     half: bool = False,
     hide_insignificants: bool = False,
     singificant_threshold: float = 0.05,
+    pairwise_nan: bool = False,
 ) -> pd.DataFrame:
     """
     Calculate the pearson correlation matrix of the variables in a dataframe.
 
+    All the correlations are calculated with one matrix product of the
+    standardized variables and their p-values with the t distribution.
+
     Parameters
     ----------
     data : pd.DataFrame
@@ -159,387 +693,275 @@ def corr_matrix(
     siginificant_threshold : float = 0.05
         Threshold of significant correlation.
 
+    pairwise_nan : bool = False
+        If True, calculate every correlation with the rows where both
+        variables are valid, else the variables with NaN values get NaN
+        correlations.
+
     returns
     -------
     corr : pd.DataFrame
         Dataframe with the correlation values.
 
     """
-    if variables == None:
+    if variables is None:
         variables = data.columns
 
     reverse = variables[::-1]
 
     N = len(variables)
 
-    corr = np.empty((N, N))
-    pval = np.full((N, N), np.nan)
-    mask = np.full((N, N), np.nan)
+    values = data[list(variables)].to_numpy(dtype=float)
+
+    if pairwise_nan:
+        # Center the variables to reduce the rounding errors
+        valid = np.isfinite(values)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            values = values - np.nanmean(values, axis=0)
+
+        # Sums of every pair of variables using only the rows where both
+        # are valid
+        w = valid.astype(float)
+        x = np.where(valid, values, 0.0)
 
-    for i, iv in enumerate(variables):
-        for j, jv in enumerate(reverse):
-            c, p = pearsonr(data[iv], data[jv])
-            corr[j, i] = c
+        n = w.T @ w
+        sx = x.T @ w
+        sxx = (x**2).T @ w
+        sxy = x.T @ x
 
-            if p <= singificant_threshold:
-                pval[j, i] = 1.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = sxy - sx * sx.T / n
+            var = sxx - sx**2 / n
+            corr = cov / np.sqrt(var * var.T)
 
-        mask[: N - i, i] = 1.0
+    else:
+        # Standardize the variables and get the correlations with their
+        # matrix product
+        n = values.shape[0]
+        z = (values - values.mean(axis=0)) / values.std(axis=0)
+        corr = z.T @ z / n
+
+    corr = np.clip(corr, -1.0, 1.0)
+
+    # Get the p-values with the two-sided t distribution
+    dof = n - 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = corr * np.sqrt(dof / (1.0 - corr**2))
+    p = 2 * stdtr(dof, -np.abs(t))
+
+    # Sort the rows with the reversed variables
+    corr = corr[::-1]
+    p = p[::-1]
 
     if half:
-        corr *= mask
+        # Only keep the first half of the matrix
+        rows, cols = np.indices((N, N))
+        corr = np.where(rows < N - cols, corr, np.nan)
 
     if hide_insignificants:
-        corr *= pval
+        corr = np.where(p <= singificant_threshold, corr, np.nan)
 
     corr = pd.DataFrame(data=corr, index=reverse, columns=variables)
 
     return corr
 
 
-def plot_ts_components(
-    data: pd.DataFrame,
-    figsize: Sequence[float] = (7, 4),
-    ENSO: npt.ArrayLike | None = None,
-    ENSO_keys: Sequence = ["Nina", "Nino"],
-    ENSO_scale: float = 0.05,
-    titles: dict[str, str] | None = None,
-) -> Figure:
+def batch_ccf(
+    x: np.ndarray, y: np.ndarray, nlags: int, adjusted: bool = True
+) -> np.ndarray:
     """
-    Function to plot the time series components of all variables in a dataframe.
+    Function to calculate the cross-correlation of many pairs of series at
+    once with FFT, with the same definition of statsmodels.tsa.stattools.ccf().
+
+    The correlation at lag k is between x at time t + k and y at time t.
 
     Parameters
     ----------
-    data : pandas.DataFrame
-        Dataframe with the variables and time at index
-
-    figsize : Sequence[width, height]
-        Size of the figure.
-
-    ENSO : numpy.ndarray | None = None
-        Array use to plot ENSO phases stripes on time series.
+    x : numpy.ndarray
+        Array with shape (time, pairs) with the first series of every pair.
 
-    ENSO_keys : Sequence = ["Nina", "Nino"]
-        ENSO Keys for La Niña ENSO cold phase and EL Niño ENSO warm phase,
-        respectively.
+    y : numpy.ndarray
+        Array with shape (time, pairs) with the second series of every pair.
 
-    ENSO_scale : float = 0.05
-        Scale to plot the stripes.
+    nlags : int
+        Number of lags to return.
 
-    titles : dict[str, str] | None = None
-        Custom titles for the time series.
+    adjusted : bool = True
+        If True, the denominator of the cross-covariance is n - k, else n.
+        The ACF of statsmodels is the CCF of a series with itself and
+        adjusted False.
 
     Returns
     -------
-    fig : matplotlib.figure.Figure
-        Figure with the TS components.
-
-    """
-    # Dictionary to store decomposed dataframes
-    decomposed_data = {}
-
-    # For all variabels in the dataframe extract all the TS components
-    # and save it in the dictinary
-    for variable in data.columns:
-        try:
-            components = seasonal_decompose(data[variable], extrapolate_trend="freq")
-        except:
-            continue
-
-        decomposed_data[variable] = pd.DataFrame(
-            {
-                "Observed": components.observed,
-                "Trend": components.trend,
-                "Detrended": components.observed - components.trend,
-                "Seasonal": components.seasonal,
-                "Anomalies": components.resid,
-            }
-        )
-
-    # Get the variables to iterate them
-    variables = [k for k in decomposed_data.keys()]
-
-    # Create the figure and the axes
-    fig, axs = plt.subplots(figsize=figsize, nrows=5, ncols=len(variables), sharex=True)
-
-    # Iterate trought variables to plot them by column
-    for i, variable in enumerate(variables):
-        # Get the components
-        components = decomposed_data[variable].columns
-
-        # Iterate the components to plot the by row
-        for j, component in enumerate(components):
-            x = decomposed_data[variable].index
-            y = decomposed_data[variable][component]
-
-            # Plot ENSO Stripes if ENSO is an array
-            try:
-                ENSO.any()
-            except:
-                continue
-            else:
-                # Plot La Niña ENSO Phase stripes
-                axs[j, i].fill_between(
-                    x,
-                    np.min(y) - ENSO_scale * np.max(y),
-                    np.max(y) + ENSO_scale * np.max(y),
-                    where=ENSO == ENSO_keys[0],
-                    color="blue",
-                    alpha=0.2,
-                )
-
-                # Plot El Niño ENSO Phase stripes
-                axs[j, i].fill_between(
-                    x,
-                    np.min(y) - ENSO_scale * np.max(y),
-                    np.max(y) + ENSO_scale * np.max(y),
-                    where=ENSO == ENSO_keys[1],
-                    color="red",
-                    alpha=0.2,
-                )
-
-            # Plot data
-            axs[j, i].plot(x, y, color="black", lw=0.5)
-
-            # In the first row add the variable title
-            if j == 0:
-                if titles != None:
-                    axs[j, i].set_title(titles[variable], fontsize=8)
-                else:
-                    axs[j, i].set_title(variable, fontsize=8)
-
-            # In the first column add the component in the label
-            if i == 0:
-                axs[j, i].set_ylabel(component)
-
-            # In the last row add the time label
-            if j == 4:
-                axs[j, i].set_xlabel("Time [Y]")
-
-            # Set the x-ticks to multiples of 5 years and the minor ticks to 1 year
-            axs[j, i].xaxis.set_major_locator(YearLocator(5))
-            axs[j, i].xaxis.set_minor_locator(YearLocator(1))
-
-    # Align all the y-labels in the first column
-    fig.align_ylabels(axs[:, 0])
-
-    return fig
-
-
-def plot_acf_ccf(
-    data: dict[str, npt.ArrayLike],
-    ci: float,
-    ylims: Sequence[float] = [-1, 1],
-    titles: dict[str, str] | None = None,
-) -> Figure:
-    """
-    Function to plot ACF and CCF data previously calculated.
-
-    Paramters
-    ---------
-    data : dict[str, numpy.ndarray]
-        Dictinary with autocorrelation or cross-correlation data
-
-    ci : float
-        Confidence interval of correlation.
-
-    ylims :  Sequence[bottom, top] = [-1, 1]
-        Limits of correlation for the plot.
-
-    titles : dict[str, str] | None = None
-        Custom titles for the plots.
+    ccf : numpy.ndarray
+        Array with shape (nlags + 1, pairs) with the cross-correlations.
+    """
+    n = x.shape[0]
 
-    Returns
-    -------
-    fig : matplotlib.figure.Figure
-        Figure with the correlations plots.
-
-    """
-    # Get the correlation tests from the data
-    tests = [t for t in data.keys()]
-    # Get how many there are to define the figure dimensions
-    n = len(tests)
-
-    # Show error if ylims is list don't have two elements
-    if len(ylims) != 2:
-        Exception("ylims must have lenght of 2")
-
-    # Create the figure and GridSpec for axes
-    fig = plt.figure()
-    grs = GridSpec(nrows=2, ncols=2, figure=fig)
-
-    # Define the figures axes based on n, where n more than 4 show error
-    match n:
-        case 1:
-            axs = [fig.add_subplot(grs[:, :])]
-            axs[0].set(xlabel="Lags [months]", ylabel="Correlation")
-        case 2:
-            axs = [fig.add_subplot(grs[0, :]), fig.add_subplot(grs[1, :])]
-            axs[0].set(ylabel="Correlation")
-            axs[1].set(xlabel="Lags [months]", ylabel="Correlation")
-        case 3:
-            axs = [
-                fig.add_subplot(grs[0, 0]),
-                fig.add_subplot(grs[1, :]),
-                fig.add_subplot(grs[0, 1]),
-            ]
-            axs[0].set(ylabel="Correlation")
-            axs[1].set(xlabel="Lags [months]", ylabel="Correlation")
-
-        case 4:
-            axs = [
-                fig.add_subplot(grs[0, 0]),
-                fig.add_subplot(grs[1, 0]),
-                fig.add_subplot(grs[0, 1]),
-                fig.add_subplot(grs[1, 1]),
-            ]
-            axs[0].set(ylabel="Correlation")
-            axs[1].set(xlabel="Lags [months]", ylabel="Correlation")
-            axs[3].set(xlabel="Lags [months]")
-
-        case _:
-            Exception("data must have a lenght lower or equal than 4")
-
-    # For loop to plot ACF o CCF by variable
-    for i, (test, ax) in enumerate(zip(tests, axs)):
-        # Plot correlation data as stem
-        ax.stem(data[test], basefmt=" ", markerfmt=" ")
-
-        # Add a line at 0 and the confidence intervals
-        ax.axhline(0, color="black")
-        ax.axhline(ci, color="black", linestyle="--")
-        ax.axhline(-ci, color="black", linestyle="--")
-
-        # If there are custon titles add them to the plot, else
-        # use the  default titles
-        if titles != None:
-            ax.set_title(titles[test], fontsize=8)
-        else:
-            ax.set_title(test, fontsize=8)
-
-        # Set ylims and ticks
-        ax.set_ylim(bottom=ylims[0], top=ylims[1])
-        ax.xaxis.set_major_locator(MultipleLocator(4))
-        ax.xaxis.set_minor_locator(MultipleLocator(1))
-
-    # Share all x and y axis
-    axs[0].get_shared_x_axes().join(*axs)
-    axs[0].get_shared_y_axes().join(*axs)
-
-    return fig
-
-
-def plot_corr_matrix(
+    # Remove the mean of the series
+    xo = x - x.mean(axis=0)
+    yo = y - y.mean(axis=0)
+
+    # Cross-covariances of all pairs with FFT, padding to avoid the
+    # circular overlap
+    size = 2 ** int(np.ceil(np.log2(2 * n - 1)))
+    spectrum = np.fft.rfft(xo, size, axis=0) * np.conj(np.fft.rfft(yo, size, axis=0))
+    ccov = np.fft.irfft(spectrum, size, axis=0)[: nlags + 1]
+
+    if adjusted:
+        ccov /= (n - np.arange(nlags + 1))[:, None]
+    else:
+        ccov /= n
+
+    return ccov / (x.std(axis=0) * y.std(axis=0))
+
+
+def ccf_table(
     data: pd.DataFrame,
-    variables: npt.ArrayLike | None = None,
-    half: bool = False,
-    hide_insignificants: bool = False,
-    singificant_threshold: float = 0.05,
-    show_labels: bool = True,
-    show_colorbar: bool = False,
-    palette: str = "Spectral",
-    text_color: str = "black",
-) -> Figure:
+    pairs: Sequence[tuple[str, str]] | dict[str, Sequence[tuple[str, str]]],
+    nlags: int,
+    groupby: str | None = None,
+    adjusted: bool = True,
+) -> pd.DataFrame:
     """
-    Calculate the pearson correlation matrix of the variables in a dataframe.
+    Function to calculate the cross-correlation of pairs of variables of a
+    dataframe in every group, in one batched pass.
 
     Parameters
     ----------
     data : pd.DataFrame
-        Dataframe with the variables to evaluate their correlation.
+        Dataframe with the variables. If groupby is defined, it is a long
+        dataframe with the groups one after the other.
 
-    variables : ArrayLike | None = None
-        The variables of interest, if it is not defined, all variables in
-        the dataframe will be evaluated.
+    pairs : Sequence[tuple[str, str]] | dict[str, Sequence[tuple[str, str]]]
+        Pairs of (dependent, independent) variables to correlate, the same
+        pairs for all groups or a dictionary with the pairs of every group.
+        The pairs of a variable with itself give its autocorrelation when
+        adjusted is False.
 
-    half : bool = False
-        If True, only show the corerlation of the first half of the matrix,
-        excluding the repeated correlation.
+    nlags : int
+        Number of lags to calculate.
 
-    hide_insignifcants : bool = False
-        If True, hide all the correlation with a p-value greater than the
-        significant threshold.
+    groupby : str | None = None
+        Column with the groups, e.g. "Lagoon".
 
-    siginificant_threshold : float = 0.05
-        Threshold of significant correlation.
+    adjusted : bool = True
+        If True, the denominator of the cross-covariance is n - k, else n.
 
-    show_labels : bool = True
-        Show the correlation value.
+    Returns
+    -------
+    table : pd.DataFrame
+        Tidy dataframe with the columns Group (named as groupby), Pair,
+        Dependent, Independent, Lag and Correlation.
+    """
+    group_name = groupby if groupby is not None else "Group"
 
-    show_colorbar : bool = False
-        Show colorbar.
+    # Define the rows of every group
+    if groupby is None:
+        groups = {None: np.arange(data.shape[0])}
+    else:
+        groups = {
+            g: np.flatnonzero(data[groupby].to_numpy() == g)
+            for g in data[groupby].unique()
+        }
 
-    palette : str = Spectral
-        Color palette for correlation plot.
+    # Define the pairs of every group and join the groups with the same
+    # length to correlate them together
+    lengths = {}
+    for group, rows in groups.items():
+        group_pairs = pairs[group] if isinstance(pairs, dict) else pairs
 
-    text_color : str = black
-        Color of text correlation labels.
+        for d, i in group_pairs:
+            lengths.setdefault(len(rows), []).append((group, rows, d, i))
 
-    returns
-    -------
-    corr : pd.DataFrame
-        Dataframe with the correlation values.
+    tables = []
+    for same_length in lengths.values():
+        # Put the series of every pair side by side
+        x = np.column_stack([data[d].to_numpy(dtype=float)[rows] for _, rows, d, _ in same_length])
+        y = np.column_stack([data[i].to_numpy(dtype=float)[rows] for _, rows, _, i in same_length])
+
+        ccf = batch_ccf(x, y, nlags, adjusted)
 
+        # Create the tidy table of the pairs
+        for k, (group, _, d, i) in enumerate(same_length):
+            tables.append(pd.DataFrame({
+                group_name: group,
+                "Pair": d if d == i else f"{d} ~ {i}",
+                "Dependent": d,
+                "Independent": i,
+                "Lag": np.arange(nlags + 1),
+                "Correlation": ccf[:, k],
+            }))
+
+    table = pd.concat(tables, ignore_index=True)
+
+    if groupby is None:
+        table = table.drop(group_name, axis=1)
+
+    return table
+
+
+def acf_table(
+    data: pd.DataFrame,
+    variables: Sequence[str] | dict[str, Sequence[str]],
+    nlags: int,
+    groupby: str | None = None,
+) -> pd.DataFrame:
     """
+    Function to calculate the autocorrelation of variables of a dataframe
+    in every group, in one batched pass, with the same definition of
+    statsmodels.tsa.stattools.acf().
 
-    # If variables are not defined get all columns from data
-    if variables == None:
-        variables = data.columns
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Dataframe with the variables.
 
-    # Get the number of variables
-    N = len(variables)
+    variables : Sequence[str] | dict[str, Sequence[str]]
+        Variables of interest, the same for all groups or a dictionary with
+        the variables of every group.
 
-    # Reverse variables for plot
-    reverse = variables[::-1]
+    nlags : int
+        Number of lags to calculate.
 
-    # Get the correlation matrix
-    corr = corr_matrix(
-        data, variables, half, hide_insignificants, singificant_threshold
-    )
+    groupby : str | None = None
+        Column with the groups, e.g. "Lagoon".
 
-    if show_colorbar:
-        fs = (4, 3)
+    Returns
+    -------
+    table : pd.DataFrame
+        Tidy dataframe with the columns Group (named as groupby), Pair,
+        Dependent, Independent, Lag and Correlation, where Pair is the
+        variable.
+    """
+    if isinstance(variables, dict):
+        pairs = {g: [(v, v) for v in vs] for g, vs in variables.items()}
     else:
-        fs = (3, 3)
-
-    # Create the figure and the axes
-    fig = plt.figure(figsize=fs)
-    ax1 = plt.subplot(1, 1, 1)
-
-    # Plot matrix with pcolormesh
-    im1 = ax1.pcolormesh(
-        variables, reverse, corr, cmap=palette, edgecolor="w", vmin=-1, vmax=1
-    )
-
-    # Invert y axis
-    ax1.invert_yaxis()
-
-    # Add the colorbar
-    if show_colorbar:
-        cax = ax1.inset_axes([1.04, 0.1, 0.05, 0.8])
-        bar = plt.colorbar(im1, cax=cax, label="Correlation")
-
-    if show_labels:
-        x, y = np.meshgrid(np.arange(N), np.arange(N))
-        x = x.reshape(-1)
-        y = y.reshape(-1)
-        t = corr.values.reshape(-1)
-
-        for xi, yi, ti in zip(x, y, t):
-            if np.isfinite(ti):
-                ax1.text(
-                    xi,
-                    yi,
-                    round(ti, 2),
-                    color=text_color,
-                    size=8,
-                    ha="center",
-                    va="center",
-                )
-
-    # Rotate labels to improve their readability
-    ax1.set_xticklabels(variables, rotation=30)
-    ax1.xaxis.set_minor_locator(NullLocator())
-    ax1.yaxis.set_minor_locator(NullLocator())
-
-    return fig
+        pairs = [(v, v) for v in variables]
+
+    return ccf_table(data, pairs, nlags, groupby, adjusted=False)
+
+
+def max_correlation_lags(table: pd.DataFrame) -> pd.DataFrame:
+    """
+    Function to find the lag with the maximum absolute correlation of every
+    pair in a table from ccf_table() or acf_table().
+
+    Parameters
+    ----------
+    table : pd.DataFrame
+        Tidy dataframe with the correlations.
+
+    Returns
+    -------
+    summary : pd.DataFrame
+        Dataframe with the row of the maximum absolute correlation of every
+        group and pair.
+    """
+    keys = [c for c in table.columns if c not in ("Lag", "Correlation")]
+
+    # Get the first row with the maximum absolute correlation
+    index = table.Correlation.abs().groupby([table[k] for k in keys], sort=False).idxmax()
+
+    return table.loc[index.values].reset_index(drop=True)
@@ -0,0 +1,264 @@
+# %% Imports
+import os
+import glob
+import hashlib
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+from shapely.geometry import MultiPoint
+from shapely.ops import voronoi_diagram
+
+# %% Typing imports
+from typing import Sequence
+
+# %% Constants
+# Station catalogues already loaded, by source files and CRS
+_CATALOGUES = {}
+
+# %% Functions
+def load_station_catalogue(
+    path: str, epsg: int = 32618, cache_dir: str | None = None
+) -> gpd.GeoDataFrame:
+    """
+    Function to load a catalogue of stations, e.g. the CNE of the IDEAM,
+    reprojected to a projected CRS with its spatial index built.
+
+    The reprojected catalogue is kept in memory, and optionally saved on
+    disk by hash of the source files, so it is only read and reprojected
+    again when the files change.
+
+    Parameters
+    ----------
+    path : str
+        Path of the shapefile with the points of the stations.
+
+    epsg : int = 32618
+        EPSG code of the projected CRS, in meters.
+
+    cache_dir : str | None = None
+        Folder to save the reprojected catalogue, if it is not defined the
+        catalogue is only kept in memory.
+
+    Returns
+    -------
+    catalogue : geopandas.GeoDataFrame
+        Reprojected stations, with their spatial index already built.
+    """
+    # Define the key of the catalogue with all files of the shapefile and
+    # the CRS
+    key = hashlib.sha1(str(epsg).encode())
+    for filename in sorted(glob.glob(os.path.splitext(path)[0] + ".*")):
+        with open(filename, "rb") as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                key.update(block)
+    key = key.hexdigest()
+
+    cache_path = None if cache_dir is None else os.path.join(cache_dir, f"{key}.parquet")
+
+    if key not in _CATALOGUES:
+        if cache_path is not None and os.path.isfile(cache_path):
+            catalogue = gpd.read_parquet(cache_path)
+        else:
+            catalogue = gpd.read_file(path).to_crs(epsg=epsg)
+
+            if cache_path is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                catalogue.to_parquet(cache_path)
+
+        # Build the spatial index once
+        catalogue.sindex
+        _CATALOGUES[key] = catalogue
+
+    return _CATALOGUES[key]
+
+
+def stations_within(
+    catalogue: gpd.GeoDataFrame,
+    zones: gpd.GeoSeries,
+    distance: float,
+    categories: Sequence[str] | None = None,
+    zone_col: str = "key",
+    category_col: str = "CATEGORIA",
+) -> gpd.GeoDataFrame:
+    """
+    Function to find the stations within a distance of every zone, e.g. of
+    every mangrove forest, with the spatial index of the catalogue.
+
+    Parameters
+    ----------
+    catalogue : geopandas.GeoDataFrame
+        Stations in a projected CRS, e.g. from load_station_catalogue().
+
+    zones : geopandas.GeoSeries
+        Polygons of the zones with the name of the zones as index, in the
+        same CRS than the catalogue.
+
+    distance : float
+        Maximum distance from the stations to the zones, in the units of
+        the CRS.
+
+    categories : Sequence[str] | None = None
+        Categories of the stations to keep, e.g. ["PM", "CP", "SP"]. If it is
+        not defined all stations are kept.
+
+    zone_col : str = "key"
+        Column to save the zone of the stations.
+
+    category_col : str = "CATEGORIA"
+        Column with the category of the stations.
+
+    Returns
+    -------
+    stations : geopandas.GeoDataFrame
+        Stations within the distance of every zone, a station near many
+        zones is repeated once by zone.
+    """
+    # Find the candidates with the bounds of the zones expanded by the
+    # distance in the spatial index
+    bounds = zones.bounds.values + np.array([-distance, -distance, distance, distance])
+    tree = catalogue.sindex
+
+    rows, names = [], []
+    for name, polygon, box in zip(zones.index, zones.values, bounds):
+        candidates = tree.intersection(box)
+
+        # Keep the candidates within the distance of the polygon
+        near = catalogue.geometry.values[candidates].distance(polygon) <= distance
+        rows.append(np.sort(candidates[near]))
+        names += [name] * int(near.sum())
+
+    stations = catalogue.iloc[np.concatenate(rows).astype(int)].copy()
+    stations[zone_col] = names
+
+    if categories is not None:
+        stations = stations[stations[category_col].isin(categories)]
+
+    return stations
+
+
+def station_weights(
+    stations: gpd.GeoDataFrame,
+    zones: gpd.GeoSeries,
+    method: str = "idw",
+    power: float = 2.0,
+    code_col: str = "CODIGO",
+    zone_col: str = "key",
+) -> pd.DataFrame:
+    """
+    Function to calculate the weights of the stations of every zone, e.g.
+    the stations near every mangrove forest, to average their series.
+
+    Parameters
+    ----------
+    stations : geopandas.GeoDataFrame
+        Points of the stations in a projected CRS, with the code of the
+        station and the zone it belongs to, e.g. the output of
+        A3_select_stations.py. A station could be in more than one zone.
+
+    zones : geopandas.GeoSeries
+        Polygons of the zones with the name of the zones as index, in the
+        same CRS than the stations.
+
+    method : str = "idw"
+        IDW or Area. With IDW the weights are the inverse distance from the
+        station to the centroid of the zone raised to power. With Area the
+        weights are the fraction of the area of the zone inside the Voronoi
+        polygon of every station (Thiessen polygons).
+
+    power : float = 2.0
+        Power of the inverse distance.
+
+    code_col : str = "CODIGO"
+        Column with the code of the stations.
+
+    zone_col : str = "key"
+        Column with the zone of the stations.
+
+    Returns
+    -------
+    weights : pd.DataFrame
+        DataFrame with the stations as index and the zones as columns, the
+        weights of every zone sum 1 and are 0 for the stations outside it.
+    """
+    method = method.lower()
+    if method not in ("idw", "area"):
+        raise ValueError(f"method must be idw or area, not {method}")
+
+    codes = stations[code_col].astype(str).unique()
+    weights = pd.DataFrame(0.0, index=codes, columns=zones.index)
+
+    for zone, polygon in zones.items():
+        subset = stations[stations[zone_col] == zone].drop_duplicates(code_col)
+
+        if len(subset) == 0:
+            continue
+
+        points = subset.geometry.values
+
+        if method == "idw":
+            # Inverse distance to the centroid of the zone, the stations
+            # in the centroid get all the weight
+            distance = np.array([point.distance(polygon.centroid) for point in points])
+            if (distance == 0).any():
+                w = (distance == 0).astype(float)
+            else:
+                w = 1.0 / distance**power
+
+        elif len(subset) == 1:
+            w = np.ones(1)
+
+        else:
+            # Area of the zone inside the Voronoi polygon of every station
+            cells = voronoi_diagram(
+                MultiPoint(list(points)), envelope=polygon.envelope.buffer(polygon.length)
+            ).geoms
+
+            w = np.array([
+                sum(
+                    cell.intersection(polygon).area
+                    for cell in cells if cell.contains(point)
+                )
+                for point in points
+            ])
+
+        weights.loc[subset[code_col].astype(str).values, zone] = w / w.sum()
+
+    return weights
+
+
+def weighted_series(data: pd.DataFrame, weights: pd.DataFrame) -> pd.DataFrame:
+    """
+    Function to average the series of the stations of every zone with their
+    weights. At every time, only the stations with data are averaged and
+    their weights are rescaled.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        DataFrame with the series of the stations as columns.
+
+    weights : pd.DataFrame
+        DataFrame with the weights of the stations (index) by zone
+        (columns), e.g. from station_weights().
+
+    Returns
+    -------
+    series : pd.DataFrame
+        DataFrame with the weighted series of every zone as columns, NaN
+        where none of the stations of the zone have data.
+    """
+    weights = weights.reindex(data.columns.astype(str), fill_value=0.0)
+
+    values = data.to_numpy(dtype=float)
+    valid = np.isfinite(values)
+
+    # Weighted sum of the valid values, divided by the sum of their weights
+    total = np.where(valid, values, 0.0) @ weights.to_numpy()
+    norm = valid.astype(float) @ weights.to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        series = np.where(norm > 0, total / norm, np.nan)
+
+    return pd.DataFrame(series, index=data.index, columns=weights.columns)
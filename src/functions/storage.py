@@ -0,0 +1,100 @@
+# %% Imports
+import os
+import glob
+
+import pandas as pd
+
+# %% Typing imports
+from typing import Sequence
+
+# %% Functions
+def write_table(
+    data: pd.DataFrame,
+    path: str,
+    partition_col: str = "Lagoon",
+    csv: bool = True,
+) -> None:
+    """
+    Function to save a DataFrame as a folder of Parquet files, one by value
+    of the partition column, e.g. one by lagoon, keeping the types of the
+    columns and the index.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        DataFrame to save.
+
+    path : str
+        Path of the folder of the table, without extension.
+
+    partition_col : str = "Lagoon"
+        Column to split the table in files.
+
+    csv : bool = True
+        If True, also save the table as a CSV file in path + ".csv", to
+        consult it easily.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    # Remove the partitions of a previous version of the table
+    for filename in glob.glob(os.path.join(path, "*.parquet")):
+        os.remove(filename)
+
+    # Save every partition with the index, so the rows could be resorted
+    # like in the original DataFrame when read
+    for key, partition in data.groupby(partition_col, sort=False):
+        partition.to_parquet(os.path.join(path, f"{key}.parquet"), index=True)
+
+    if csv:
+        data.to_csv(path + ".csv")
+
+
+def read_table(
+    path: str,
+    partitions: Sequence[str] | None = None,
+    columns: Sequence[str] | None = None,
+    filters: list[tuple] | None = None,
+) -> pd.DataFrame:
+    """
+    Function to read a table saved with write_table(), only reading the
+    partitions and the columns of interest.
+
+    Parameters
+    ----------
+    path : str
+        Path of the folder of the table, without extension.
+
+    partitions : Sequence[str] | None = None
+        Values of the partition column to read, e.g. ["mallorquin"]. If it
+        is not defined all partitions are read.
+
+    columns : Sequence[str] | None = None
+        Columns to read. If it is not defined all columns are read.
+
+    filters : list[tuple] | None = None
+        Filters to skip the rows while they are read, in the pyarrow
+        format, e.g. [("PixelPercentage", ">=", 10.0)].
+
+    Returns
+    -------
+    data : pd.DataFrame
+        DataFrame with the rows in the same order than the saved one.
+    """
+    if partitions is None:
+        filenames = sorted(glob.glob(os.path.join(path, "*.parquet")))
+    else:
+        filenames = [os.path.join(path, f"{key}.parquet") for key in partitions]
+
+    if len(filenames) == 0:
+        raise FileNotFoundError(f"there isn't any partition in {path}")
+
+    data = pd.concat([
+        pd.read_parquet(
+            filename,
+            columns=None if columns is None else list(columns),
+            filters=filters,
+        )
+        for filename in filenames
+    ])
+
+    return data.sort_index(kind="stable")
@@ -0,0 +1,180 @@
+# %% Imports
+import argparse
+
+from functions.pipeline import run_pipeline
+
+# %% Define constants
+state_path = ".pipeline_state.json"
+
+forests = "data/shapefile/mangrove_forests.*"
+stations = "data/shapefile/CNE_IDEAM.*"
+images = "data/raster/*/*.tif"
+cubes = "data/processed/*_ndvi_temperature.nc"
+filled_cubes = "data/processed/*_ndvi_temperature_filled.nc"
+quality = "data/processed/*_quality.nc"
+raw_data = "data/raw/*.csv"
+soi = "data/processed/simple_soi.csv"
+mean_data = "data/processed/hydrological_spectral_mean_data/*.parquet"
+detrended_data = "data/processed/detrended_hydrological_spectral_mean_data/*.parquet"
+lm_data = "data/processed/lm_data_without_interpolations/*.parquet"
+selected_stations = "appendix/gauge_stations/stations_of_interest.*"
+station_precipitation = "data/processed/station_precipitation/*.parquet"
+style = "src/style.mplstyle"
+
+
+def functions(*modules: str) -> list[str]:
+    """
+    Function to get the paths of the modules of functions used by a stage,
+    they must include the modules imported by them, e.g. stat_utils with
+    cube_utils, so only the stages that use a changed function run again.
+    """
+    return [f"src/functions/{module}.py" for module in modules]
+
+
+# Stages of the pipeline, the inputs of a stage that are outputs of another
+# define the order of the stages
+stages = {
+    "1": {
+        "script": "src/1_download_shapefiles.py",
+        "inputs": [],
+        "outputs": [forests],
+        "optional": True,
+    },
+    "2": {
+        "script": "src/2_download_rasters.py",
+        "inputs": [forests, *functions("gee_processing", "gee_export", "spectral_indices")],
+        "outputs": [images],
+        "optional": True,
+    },
+    "3": {
+        "script": "src/3_process_rasters.py",
+        "inputs": [
+            images, forests,
+            *functions("raster_processing", "cube_utils", "stat_utils", "quality", "spectral_indices"),
+        ],
+        "outputs": [cubes, quality],
+    },
+    "4": {
+        "script": "src/4_make_dataframes.py",
+        "inputs": [
+            cubes, quality, forests, raw_data, soi, station_precipitation,
+            *functions("cube_utils", "stat_utils", "spectral_indices", "storage", "ideam", "quality"),
+        ],
+        "outputs": [mean_data, "data/processed/hydrological_spectral_mean_data.csv"],
+    },
+    "5": {
+        "script": "src/5_detrend_data.py",
+        "inputs": [
+            mean_data, style,
+            *functions("stat_utils", "plot_utils", "storage", "rendering"),
+        ],
+        "outputs": [
+            detrended_data,
+            "data/processed/detrended_hydrological_spectral_mean_data.csv",
+            "images/[1-3]_*_time_series_components.svg",
+        ],
+    },
+    "6": {
+        "script": "src/6_acf_and_ccf.py",
+        "inputs": [
+            detrended_data, style,
+            *functions("stat_utils", "plot_utils", "storage", "rendering"),
+        ],
+        "outputs": ["images/[4-9]_*_[ac]cf_plot.svg"],
+    },
+    "7": {
+        "script": "src/7_prepare_lm_data.py",
+        "inputs": [
+            detrended_data, style,
+            *functions("stat_utils", "plot_utils", "storage", "rendering", "quality"),
+        ],
+        "outputs": [
+            lm_data,
+            "data/processed/lm_data_without_interpolations.csv",
+            "data/processed/lm_data_with_interpolations/*.parquet",
+            "data/processed/lm_data_with_interpolations.csv",
+            "images/1[0-2]_corr_matrix_*.svg",
+        ],
+    },
+    "8": {
+        "script": "src/8_linear_regression.py",
+        "inputs": [lm_data, style, *functions("storage")],
+        "outputs": ["images/13_linear_model_scatterplots.svg", "models/*_model.*"],
+    },
+    "9": {
+        "script": "src/9_spatial_variations.py",
+        "inputs": [
+            cubes, forests, style,
+            *functions(
+                "cube_utils", "stat_utils", "spectral_indices", "plot_utils", "rendering"
+            ),
+        ],
+        "outputs": ["images/1[4-9]_*_*.svg"],
+    },
+    "10": {
+        "script": "src/10_impute_cubes.py",
+        "inputs": [cubes, *functions("cube_utils", "stat_utils", "spectral_indices")],
+        "outputs": [filled_cubes],
+    },
+    "11": {
+        "script": "src/11_correlation_maps.py",
+        "inputs": [
+            filled_cubes, mean_data,
+            *functions("cube_utils", "stat_utils", "spectral_indices", "storage"),
+        ],
+        "outputs": ["data/processed/*_ndvi_correlation_maps.nc"],
+    },
+    "12": {
+        "script": "src/12_station_precipitation.py",
+        "inputs": [
+            selected_stations, "data/raw/stations/*.csv", forests,
+            *functions("ideam", "stations", "stat_utils", "storage"),
+        ],
+        "outputs": [station_precipitation, "data/processed/station_precipitation.csv"],
+        "optional": True,
+    },
+    "A1": {
+        "script": "src/A1_plot_images.py",
+        "inputs": functions("gee_processing", "gee_export", "spectral_indices"),
+        "outputs": ["appendix/all_images/*.png"],
+        "optional": True,
+    },
+    "A2": {
+        "script": "src/A2_view_gaps.py",
+        "inputs": [mean_data, quality, style, *functions("storage", "quality")],
+        "outputs": ["appendix/gaps/*.svg"],
+    },
+    "A3": {
+        "script": "src/A3_select_stations.py",
+        "inputs": [forests, stations, *functions("stations")],
+        "outputs": [selected_stations],
+    },
+}
+
+# %% Parse the arguments
+parser = argparse.ArgumentParser(
+    description="Run the stages of the pipeline that are out of date."
+)
+parser.add_argument(
+    "stages", nargs="*",
+    help="stages to run with the stages they depend on, e.g. 4 6 A2 "
+         "(default: all except the downloads 1, 2 and A1, and 12)",
+)
+parser.add_argument("-j", "--jobs", type=int, default=2, help="stages running at the same time")
+parser.add_argument("-f", "--force", action="store_true", help="run the stages even if they are up to date")
+parser.add_argument("-n", "--dry-run", action="store_true", help="only show the stages out of date")
+
+args = parser.parse_args()
+
+# %% Run the pipeline
+status = run_pipeline(
+    stages,
+    targets=args.stages or None,
+    state_path=state_path,
+    max_workers=args.jobs,
+    force=args.force,
+    dry_run=args.dry_run,
+)
+
+if "failed" in status.values():
+    raise SystemExit(1)
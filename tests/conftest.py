@@ -0,0 +1,22 @@
+# %% Imports
+import os
+import sys
+
+import pytest
+
+# The scripts import the functions as the functions package of src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+import fake_ee
+
+# %% Fixtures
+@pytest.fixture
+def ee(monkeypatch, tmp_path):
+    """
+    Fixture to replace the ee and geemap modules with the local stand-in.
+    """
+    monkeypatch.setitem(sys.modules, "ee", fake_ee)
+    monkeypatch.setitem(sys.modules, "geemap", fake_ee.geemap)
+    fake_ee.reset(str(tmp_path))
+
+    return fake_ee
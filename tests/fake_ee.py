@@ -0,0 +1,129 @@
+# %% Imports
+import os
+import types
+import struct
+import zlib
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+# %% Typing imports
+from typing import Sequence
+
+# %% Constants
+# Calls to the stand-in of every image, by name
+calls = {}
+
+# Folder of the thumbnails served by getThumbURL()
+options = {"folder": "."}
+
+# %% Functions
+def reset(folder: str = ".") -> None:
+    """
+    Function to forget the calls of the previous tests and define the
+    folder of the thumbnails.
+    """
+    calls.clear()
+    options["folder"] = folder
+
+
+def png_bytes(width: int = 4, height: int = 3) -> bytes:
+    """
+    Function to create a small gray PNG.
+    """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    rows = b"".join(b"\x00" + bytes([128] * width) for _ in range(height))
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows))
+        + chunk(b"IEND", b"")
+    )
+
+
+class Image:
+    """
+    Stand-in of an ee.Image with the data of its bands, that fails the
+    first requests.
+
+    Parameters
+    ----------
+    name : str
+        Name of the image to count its calls.
+
+    data : numpy.ndarray | None = None
+        Bands of the image with shape (bands, rows, columns).
+
+    fails : int = 0
+        Number of requests that fail before the first one that works.
+
+    broken : int = 0
+        Number of requests that return a broken file, after the failed ones.
+    """
+    def __init__(
+        self, name: str, data: np.ndarray | None = None, fails: int = 0, broken: int = 0
+    ):
+        self.name = name
+        self.data = np.zeros((2, 3, 4)) if data is None else data
+        self.fails = fails
+        self.broken = broken
+
+    def _request(self) -> str:
+        # Count the request and define its result
+        n = calls.get(self.name, 0)
+        calls[self.name] = n + 1
+
+        if n < self.fails:
+            raise RuntimeError(f"Earth Engine request of {self.name} failed")
+        if n < self.fails + self.broken:
+            return "broken"
+        return "ok"
+
+    def getThumbURL(self, params: dict) -> str:
+        result = self._request()
+
+        # Save the thumbnail in a temporal file and return its URL
+        path = os.path.join(options["folder"], f"{self.name}_{calls[self.name]}.png")
+        with open(path, "wb") as f:
+            f.write(png_bytes() if result == "ok" else b"<html>error</html>")
+
+        return "file://" + os.path.abspath(path)
+
+
+def ee_export_image(
+    img: Image,
+    filename: str,
+    scale: float | None = None,
+    region: Sequence | None = None,
+    unmask_value: float | None = None,
+) -> None:
+    """
+    Stand-in of geemap.ee_export_image, it saves the bands of the image as
+    a GeoTIFF without descriptions. Like geemap, the failed requests don't
+    raise errors, so only the file is missing, and the broken ones leave an
+    empty file.
+    """
+    try:
+        result = img._request()
+    except RuntimeError:
+        return
+
+    if result == "broken":
+        open(filename, "wb").close()
+        return
+
+    count, height, width = img.data.shape
+    with rasterio.open(
+        filename, "w", driver="GTiff", count=count, height=height, width=width,
+        dtype=img.data.dtype, crs="EPSG:4326",
+        transform=from_origin(-75.0, 11.0, 0.0003, 0.0003),
+    ) as dst:
+        dst.write(img.data)
+
+
+geemap = types.SimpleNamespace(ee_export_image=ee_export_image)
@@ -0,0 +1,171 @@
+# %% Imports
+import os
+import json
+
+import numpy as np
+import rasterio
+
+from functions.gee_export import (
+    export_images, export_thumbnails, is_valid_png, is_valid_raster, split_stack
+)
+
+# %% Helpers
+def export_stack(task: tuple, filename: str) -> None:
+    """
+    Function to export a stack like 2_download_rasters.py, with the geemap
+    stand-in.
+    """
+    import geemap
+
+    img, filenames, names = task
+    geemap.ee_export_image(img, filename=filename, scale=30, region=None, unmask_value=-3e5)
+    split_stack(filename, filenames, names=names)
+
+
+def stack_tasks(ee, folder, fails: dict[str, int] | None = None, broken: dict[str, int] | None = None):
+    """
+    Function to define the tasks of two yearly stacks of two months with
+    the TEMPERATURE and the NDVI.
+    """
+    fails, broken = fails or {}, broken or {}
+    names = ["TEMPERATURE", "NDVI"]
+
+    tasks = {}
+    for year in (2000, 2001):
+        data = np.arange(2 * 2 * 3 * 4, dtype="float32").reshape(4, 3, 4) + year
+        img = ee.Image(str(year), data, fails.get(str(year), 0), broken.get(str(year), 0))
+        filenames = [os.path.join(folder, f"{year}-{m:02d}-01.tif") for m in (1, 2)]
+        tasks[os.path.join(folder, f"stack_{year}.tif")] = (img, filenames, names)
+
+    def validator(filename: str) -> bool:
+        return all(is_valid_raster(f, names=names) for f in tasks[filename][1])
+
+    return tasks, validator
+
+
+def thumbnail_images(ee, fails: dict[str, int] | None = None, broken: dict[str, int] | None = None):
+    """
+    Function to define the images of two thumbnails of one region.
+    """
+    fails, broken = fails or {}, broken or {}
+
+    return {
+        ("mallorquin", date): ee.Image(date, None, fails.get(date, 0), broken.get(date, 0))
+        for date in ("01-01-2000", "01-02-2000")
+    }
+
+
+# %% Tests
+def test_export_images_retries_and_manifest(ee, tmp_path):
+    tasks, validator = stack_tasks(ee, tmp_path, fails={"2000": 1}, broken={"2001": 1})
+    manifest_path = str(tmp_path / "manifest.json")
+
+    manifest = export_images(
+        tasks, export_stack, manifest_path, max_workers=2, backoff=0, validator=validator
+    )
+
+    # The failed and the broken exports are retried once
+    assert ee.calls == {"2000": 2, "2001": 2}
+    assert all(m["status"] == "done" and m["attempts"] == 2 for m in manifest.values())
+
+    with open(manifest_path) as f:
+        assert json.load(f) == manifest
+
+    # The months are split from the stacks with the names of the bands
+    with rasterio.open(tmp_path / "2001-02-01.tif") as src:
+        assert src.descriptions == ("TEMPERATURE", "NDVI")
+        assert src.read(1)[0, 0] == 2001 + 24
+
+
+def test_export_images_skips_valid_files(ee, tmp_path):
+    tasks, validator = stack_tasks(ee, tmp_path)
+    manifest_path = str(tmp_path / "manifest.json")
+
+    export_images(tasks, export_stack, manifest_path, backoff=0, validator=validator)
+
+    # Remove one month, only its stack is exported again
+    os.remove(tmp_path / "2001-01-01.tif")
+    ee.reset(str(tmp_path))
+
+    manifest = export_images(tasks, export_stack, manifest_path, backoff=0, validator=validator)
+
+    assert ee.calls == {"2001": 1}
+    assert manifest[str(tmp_path / "stack_2000.tif")]["status"] == "done"
+
+
+def test_export_images_records_failures(ee, tmp_path):
+    tasks, validator = stack_tasks(ee, tmp_path, fails={"2001": 10})
+    manifest_path = str(tmp_path / "manifest.json")
+
+    manifest = export_images(
+        tasks, export_stack, manifest_path, retries=2, backoff=0, validator=validator
+    )
+
+    failed = manifest[str(tmp_path / "stack_2001.tif")]
+    assert failed["status"] == "failed"
+    assert failed["attempts"] == 3
+    assert ee.calls["2001"] == 3
+
+    # The failed exports could be skipped in the next run
+    ee.reset(str(tmp_path))
+    export_images(
+        tasks, export_stack, manifest_path, backoff=0, validator=validator, retry_failed=False
+    )
+
+    assert ee.calls == {}
+
+
+def test_export_thumbnails_retries_and_cache(ee, tmp_path):
+    images = thumbnail_images(ee, fails={"01-01-2000": 1}, broken={"01-02-2000": 1})
+    regions = {"mallorquin": [-74.8, 10.9, -74.9, 11.0]}
+    path = str(tmp_path / "figures" / "{} {}.png")
+    cache_dir = tmp_path / "cache"
+
+    manifest = export_thumbnails(
+        images, regions, {"min": 0, "max": 1}, path, str(tmp_path / "manifest.json"),
+        cache_dir=str(cache_dir), backoff=0,
+    )
+
+    # The failed request and the error page are retried once, only the
+    # PNGs are saved
+    assert ee.calls == {"01-01-2000": 2, "01-02-2000": 2}
+    assert all(m["status"] == "done" and m["attempts"] == 2 for m in manifest.values())
+    assert all(is_valid_png(path.format(*key)) for key in images)
+
+    cached = sorted(cache_dir.iterdir())
+    assert len(cached) == 2
+    assert all(is_valid_png(str(p)) for p in cached)
+
+    # The saved figures are skipped, and the deleted ones are plotted again
+    # from the downloaded thumbnails
+    os.remove(path.format("mallorquin", "01-02-2000"))
+    ee.reset(str(tmp_path))
+
+    export_thumbnails(
+        images, regions, {"min": 0, "max": 1}, path, str(tmp_path / "manifest.json"),
+        cache_dir=str(cache_dir), backoff=0,
+    )
+
+    assert ee.calls == {}
+    assert is_valid_png(path.format("mallorquin", "01-02-2000"))
+
+
+def test_export_thumbnails_records_broken_responses(ee, tmp_path):
+    images = thumbnail_images(ee, broken={"01-01-2000": 10})
+    regions = {"mallorquin": [-74.8, 10.9, -74.9, 11.0]}
+    path = str(tmp_path / "figures" / "{} {}.png")
+    cache_dir = tmp_path / "cache"
+
+    manifest = export_thumbnails(
+        images, regions, {"min": 0, "max": 1}, path, str(tmp_path / "manifest.json"),
+        cache_dir=str(cache_dir), retries=1, backoff=0,
+    )
+
+    failed = manifest[path.format("mallorquin", "01-01-2000")]
+    assert failed["status"] == "failed"
+    assert "isn't a PNG" in failed["error"]
+    assert ee.calls["01-01-2000"] == 2
+
+    # The error pages are neither plotted nor cached
+    assert not os.path.exists(path.format("mallorquin", "01-01-2000"))
+    assert [p.name.split("_")[1] for p in cache_dir.iterdir()] == ["01-02-2000"]
@@ -0,0 +1,77 @@
+# %% Imports
+import numpy as np
+import pandas as pd
+
+import functions.stat_utils as stat_utils
+from functions.stat_utils import (
+    cached_decompose, clear_decomposition_cache, detrend_variables, set_decomposition_cache
+)
+
+# %% Helpers
+def count_decompositions(monkeypatch) -> list[int]:
+    """
+    Function to count the columns decomposed by decompose_columns().
+    """
+    counts = []
+    decompose_columns = stat_utils.decompose_columns
+
+    def counted(values, *args, **kwargs):
+        counts.append(values.shape[1])
+        return decompose_columns(values, *args, **kwargs)
+
+    monkeypatch.setattr(stat_utils, "decompose_columns", counted)
+
+    return counts
+
+
+def lagoon_data() -> pd.DataFrame:
+    """
+    Function to define a long dataframe with two lagoons of ten years.
+    """
+    rng = np.random.default_rng(0)
+    time = np.arange(120)
+
+    return pd.DataFrame({
+        "Lagoon": np.repeat(["a", "b"], 120),
+        "NDVI": np.tile(0.6 + 0.1 * np.sin(time / 12 * 2 * np.pi), 2) + rng.random(240) / 10,
+        "Temperature": np.tile(30 + np.cos(time / 12 * 2 * np.pi), 2) + rng.random(240),
+    })
+
+
+# %% Tests
+def test_plots_reuse_the_detrended_decompositions(monkeypatch):
+    clear_decomposition_cache()
+    counts = count_decompositions(monkeypatch)
+    data = lagoon_data()
+
+    detrended = detrend_variables(data, ["NDVI", "Temperature"], groupby="Lagoon")
+
+    # The series of one lagoon, like in plot_ts_components()
+    subset = data[data.Lagoon == "b"][["NDVI", "Temperature"]].to_numpy(dtype=float)
+    trend, _, _ = cached_decompose(subset)
+
+    assert counts == [4]
+    np.testing.assert_allclose(
+        subset - trend, detrended[data.Lagoon == "b"][["NDVI", "Temperature"]].to_numpy()
+    )
+
+
+def test_decompositions_are_reused_from_disk(monkeypatch, tmp_path):
+    clear_decomposition_cache()
+    counts = count_decompositions(monkeypatch)
+    values = lagoon_data()[["NDVI", "Temperature"]].to_numpy(dtype=float)
+
+    try:
+        set_decomposition_cache(cache_dir=str(tmp_path))
+        first = cached_decompose(values)
+
+        # Like a new run, without the decompositions in memory
+        clear_decomposition_cache()
+        second = cached_decompose(values)
+    finally:
+        set_decomposition_cache(cache_dir=None)
+
+    assert counts == [2]
+    assert len(list(tmp_path.glob("*.npy"))) == 2
+    for a, b in zip(first, second):
+        np.testing.assert_array_equal(a, b)